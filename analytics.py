@@ -0,0 +1,228 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Analítica reproductiva del hato con NumPy
+Carga fechas de cattle y events en arreglos y calcula todo vectorizado
+"""
+
+import sqlite3
+from datetime import datetime
+
+from database import GESTATION_DAYS
+
+try:
+    import numpy as np
+except ImportError:
+    np = None
+
+# Fechas ausentes o mal formadas se leen como esta marca (-> -1)
+_NO_DATE = '0000-00-00'
+
+
+def _dates_to_days(blob):
+    """'YYYY-MM-DD' concatenadas -> días desde 1970-01-01 (-1 si falta)"""
+    digits = np.frombuffer(blob.encode('ascii'), dtype=np.uint8).reshape(-1, 10).astype(np.int64) - 48
+    years = digits[:, 0:4] @ np.array([1000, 100, 10, 1])
+    months = digits[:, 5] * 10 + digits[:, 6]
+    days = digits[:, 8] * 10 + digits[:, 9]
+    missing = years == 0
+    months[missing] = 1
+    result = ((years - 1970) * 12 + months - 1).astype('datetime64[M]').astype('datetime64[D]').astype(np.int64) + days - 1
+    result[missing] = -1
+    return result
+
+
+def _ints(blob):
+    return np.fromstring(blob, dtype=np.int64, sep=' ') if blob else np.zeros(0, dtype=np.int64)
+
+
+def _date_column(column):
+    # Solo fechas ISO válidas: '+0 days' normaliza, así '15/01/2020' y '2024-02-30' no coinciden
+    return f"group_concat(CASE WHEN date({column}, '+0 days') = {column} THEN {column} ELSE '{_NO_DATE}' END, '')"
+
+
+def load_herd(db_path, conn=None):
+    """Lectura masiva de cattle y partos en arreglos NumPy (conn: leer de esa conexión, p. ej. una foto)"""
+    if np is None:
+        raise RuntimeError("numpy no está instalado: pip install numpy")
+    own = conn is None
+    if own:
+        conn = sqlite3.connect(db_path)
+    try:
+        cursor = conn.cursor()
+        cursor.execute("SELECT DISTINCT COALESCE(category, '') FROM cattle ORDER BY 1")
+        names = [row[0] for row in cursor.fetchall()]
+        # Categoría como código entero (posición en names), calculado en SQL
+        codes = ' '.join(f'WHEN ? THEN {i}' for i in range(len(names)))
+        category_code = f"CASE COALESCE(category, '') {codes} ELSE 0 END" if names else '0'
+        # Cada columna llega como un solo texto concatenado: sin crear una tupla por fila
+        cursor.execute(f'''
+            SELECT group_concat(id, ' '),
+                   group_concat(COALESCE(is_pregnant, 0), ' '),
+                   {_date_column('birth_date')},
+                   {_date_column('pregnancy_date')},
+                   {_date_column('last_birth_date')},
+                   group_concat({category_code}, ' ')
+            FROM (SELECT * FROM cattle ORDER BY id)
+        ''', names)
+        ids, pregnant, born, pregnancy, last_birth, categories = cursor.fetchone()
+        # Recorre idx_events_type_cattle_date: normalmente ya sale por vaca y fecha.
+        # group_concat omite los NULL: sin cattle_id nulo las dos listas quedan alineadas
+        cursor.execute('''
+            SELECT group_concat(cattle_id, ' '), group_concat(event_date, '')
+            FROM events
+            WHERE event_type = 'birth' AND cattle_id IS NOT NULL AND date(event_date, '+0 days') = event_date
+        ''')
+        birth_cattle, birth_days = cursor.fetchone()
+    finally:
+        if own:
+            conn.close()
+
+    herd = {
+        'id': _ints(ids),
+        'category': _ints(categories).astype(np.int16),
+        'category_names': [name or 'Sin categoría' for name in names],
+        'is_pregnant': _ints(pregnant).astype(bool),
+        'birth_date': _dates_to_days(born or ''),
+        'pregnancy_date': _dates_to_days(pregnancy or ''),
+        'last_birth_date': _dates_to_days(last_birth or ''),
+        'birth_cattle': _ints(birth_cattle),
+        'birth_day': _dates_to_days(birth_days or ''),
+    }
+    # group_concat no garantiza orden: reordenar solo si hace falta
+    if np.any(np.diff(herd['id']) < 0):
+        order = np.argsort(herd['id'], kind='stable')
+        for key in ('id', 'category', 'is_pregnant', 'birth_date', 'pregnancy_date', 'last_birth_date'):
+            herd[key] = herd[key][order]
+    cattle, days = herd['birth_cattle'], herd['birth_day']
+    step = np.diff(cattle)
+    if np.any((step < 0) | ((step == 0) & (np.diff(days) < 0))):
+        order = np.lexsort((days, cattle))
+        herd['birth_cattle'], herd['birth_day'] = cattle[order], days[order]
+    return herd
+
+
+def calving_intervals(herd):
+    """Intervalo entre partos consecutivos de la misma vaca (cattle_id, días)"""
+    cattle = herd['birth_cattle']
+    days = herd['birth_day']
+    same = cattle[1:] == cattle[:-1]
+    return cattle[1:][same], (days[1:] - days[:-1])[same]
+
+
+def days_open(herd):
+    """Días abiertos: del parto a la concepción siguiente (histórico + preñez actual)"""
+    ids, intervals = calving_intervals(herd)
+    historic = intervals - GESTATION_DAYS
+    current = herd['is_pregnant'] & (herd['pregnancy_date'] >= 0) & (herd['last_birth_date'] >= 0)
+    current_open = herd['pregnancy_date'][current] - herd['last_birth_date'][current]
+    ids = np.concatenate([ids, herd['id'][current]])
+    values = np.concatenate([historic, current_open])
+    valid = values >= 0
+    return ids[valid], values[valid]
+
+
+def age_at_first_calving(herd):
+    """Edad (días) al primer parto por vaca"""
+    cattle = herd['birth_cattle']
+    if cattle.size == 0:
+        return cattle, cattle
+    first = np.ones(cattle.size, dtype=bool)
+    first[1:] = cattle[1:] != cattle[:-1]
+    first_ids = cattle[first]
+    first_days = herd['birth_day'][first]
+    # Unir con la fecha de nacimiento por id (herd['id'] viene ordenado)
+    if herd['id'].size == 0:
+        return first_ids[:0], first_days[:0]
+    pos = np.clip(np.searchsorted(herd['id'], first_ids), 0, herd['id'].size - 1)
+    match = herd['id'][pos] == first_ids
+    born = herd['birth_date'][pos]
+    valid = match & (born >= 0) & (first_days > born)
+    return first_ids[valid], (first_days - born)[valid]
+
+
+def pregnancy_rate_by_cohort(herd):
+    """% de preñadas por año de nacimiento -> {año: (total, preñadas, %)}"""
+    known = herd['birth_date'] >= 0
+    years = herd['birth_date'][known].astype('datetime64[D]').astype('datetime64[Y]').astype(int) + 1970
+    pregnant = herd['is_pregnant'][known]
+    if years.size == 0:
+        return {}
+    cohorts, inverse = np.unique(years, return_inverse=True)
+    totals = np.bincount(inverse)
+    preg = np.bincount(inverse, weights=pregnant.astype(float)).astype(int)
+    rates = np.round(preg / totals * 100, 1)
+    return {int(y): (int(t), int(p), float(r)) for y, t, p, r in zip(cohorts, totals, preg, rates)}
+
+
+def _summary(values):
+    if values.size == 0:
+        return {'count': 0}
+    p25, p50, p75 = np.percentile(values, [25, 50, 75])
+    return {
+        'count': int(values.size),
+        'mean': round(float(values.mean()), 1),
+        'p25': float(p25),
+        'median': float(p50),
+        'p75': float(p75),
+    }
+
+
+def _by_category(herd, ids, values):
+    # Categoría de cada valor vía búsqueda ordenada de su cattle_id
+    if herd['id'].size == 0 or ids.size == 0:
+        return {}
+    pos = np.clip(np.searchsorted(herd['id'], ids), 0, herd['id'].size - 1)
+    match = herd['id'][pos] == ids
+    codes = herd['category'][pos[match]]
+    values = values[match]
+    # Un solo ordenamiento por categoría y cortes por grupo
+    order = np.argsort(codes, kind='stable')
+    codes, values = codes[order], values[order]
+    bounds = np.searchsorted(codes, np.arange(len(herd['category_names']) + 1))
+    return {
+        name: _summary(values[bounds[i]:bounds[i + 1]])
+        for i, name in enumerate(herd['category_names'])
+        if bounds[i + 1] > bounds[i]
+    }
+
+
+def reproductive_report(db_path, conn=None):
+    """KPIs reproductivos del hato completo"""
+    herd = load_herd(db_path, conn)
+    ci_ids, ci = calving_intervals(herd)
+    do_ids, do = days_open(herd)
+    afc_ids, afc = age_at_first_calving(herd)
+    return {
+        'generated_at': datetime.now().strftime('%Y-%m-%d %H:%M:%S'),
+        'calving_interval': _summary(ci),
+        'days_open': _summary(do),
+        'age_first_calving': _summary(afc),
+        'pregnancy_rate_by_cohort': pregnancy_rate_by_cohort(herd),
+        'by_category': {
+            'calving_interval': _by_category(herd, ci_ids, ci),
+            'days_open': _by_category(herd, do_ids, do),
+            'age_first_calving': _by_category(herd, afc_ids, afc),
+        },
+    }
+
+
+if __name__ == '__main__':
+    import argparse
+    import time
+
+    from database import DEFAULT_RANCH, ranch_db_path
+
+    parser = argparse.ArgumentParser(description='KPIs reproductivos del hato')
+    parser.add_argument('file', nargs='?', help='base a analizar (por defecto la del rancho)')
+    parser.add_argument('--ranch', default=DEFAULT_RANCH)
+    args = parser.parse_args()
+
+    path = args.file or ranch_db_path(args.ranch)
+    start = time.perf_counter()
+    report = reproductive_report(path)
+    elapsed = time.perf_counter() - start
+    for key in ('calving_interval', 'days_open', 'age_first_calving'):
+        print(f"{key}: {report[key]}")
+    print(f"cohortes: {report['pregnancy_rate_by_cohort']}")
+    print(f"✓ Calculado en {elapsed * 1000:.0f} ms")
@@ -0,0 +1,66 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Prueba de carga de api_server.py: clientes keep-alive concurrentes
+
+Uso: python3 api_loadtest.py [url] [--clients 20] [--seconds 10] [--etag]
+"""
+
+import argparse
+import asyncio
+import random
+import time
+from urllib.parse import urlparse
+
+PATHS = ['/stats', '/agenda', '/cattle?limit=50', '/search?q=1', '/cattle/1/events', '/cattle/1/vaccinations']
+
+
+async def client(host, port, deadline, latencies, statuses, use_etag):
+    reader, writer = await asyncio.open_connection(host, port)
+    etags = {}
+    try:
+        while time.perf_counter() < deadline:
+            path = random.choice(PATHS)
+            extra = f'If-None-Match: {etags[path]}\r\n' if use_etag and path in etags else ''
+            start = time.perf_counter()
+            writer.write(f'GET {path} HTTP/1.1\r\nHost: {host}\r\n{extra}\r\n'.encode('latin-1'))
+            head = (await reader.readuntil(b'\r\n\r\n')).decode('latin-1').split('\r\n')
+            headers = dict(line.split(': ', 1) for line in head[1:] if ': ' in line)
+            await reader.readexactly(int(headers.get('Content-Length', 0)))
+            latencies.append(time.perf_counter() - start)
+            status = int(head[0].split(' ')[1])
+            statuses[status] = statuses.get(status, 0) + 1
+            if 'ETag' in headers:
+                etags[path] = headers['ETag']
+    finally:
+        writer.close()
+
+
+async def run(url, clients, seconds, use_etag):
+    parsed = urlparse(url)
+    latencies = []
+    statuses = {}
+    deadline = time.perf_counter() + seconds
+    start = time.perf_counter()
+    await asyncio.gather(*(client(parsed.hostname, parsed.port or 80, deadline, latencies, statuses, use_etag)
+                           for _ in range(clients)))
+    elapsed = time.perf_counter() - start
+    latencies.sort()
+
+    def pct(p):
+        return latencies[min(len(latencies) - 1, int(len(latencies) * p))] * 1000 if latencies else 0.0
+
+    print(f"✓ {len(latencies)} peticiones en {elapsed:.1f} s: {len(latencies) / elapsed:.0f} req/s "
+          f"({clients} clientes)")
+    print(f"  p50 {pct(0.50):.1f} ms  p95 {pct(0.95):.1f} ms  p99 {pct(0.99):.1f} ms  máx {pct(1):.1f} ms")
+    print(f"  estados: {dict(sorted(statuses.items()))}")
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Prueba de carga de la API de solo lectura')
+    parser.add_argument('url', nargs='?', default='http://127.0.0.1:8080')
+    parser.add_argument('--clients', type=int, default=20)
+    parser.add_argument('--seconds', type=float, default=10)
+    parser.add_argument('--etag', action='store_true', help='reenviar If-None-Match (respuestas 304)')
+    args = parser.parse_args()
+    asyncio.run(run(args.url, args.clients, args.seconds, args.etag))
@@ -0,0 +1,173 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+API JSON de solo lectura para la oficina y el veterinario (asyncio, sin dependencias)
+
+Uso: python3 api_server.py [puerto] [--ranch RANCHO]
+
+GET /stats                          estadísticas
+GET /agenda?limit=50                agenda (máx. por sección)
+GET /search?q=12                    búsqueda por arete o nombre
+GET /cattle?after=<arete>&limit=50  lista paginada
+GET /cattle/<id>                    una vaca
+GET /cattle/<id>/events?before_date=...&before_id=...&limit=50
+GET /cattle/<id>/vaccinations?...   historial paginado
+GET /cattle/<id>/timeline?before_date=...&before_kind=...&before_id=...
+
+Las respuestas llevan ETag = versión de datos; If-None-Match -> 304.
+"""
+
+import asyncio
+import json
+import sqlite3
+import sys
+import threading
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+from urllib.parse import parse_qs, urlparse
+
+from database import DEFAULT_RANCH, ReadOnlyDatabase
+
+MAX_LIMIT = 500
+
+
+class ApiServer:
+    def __init__(self, db, workers=4, cache_size=256):
+        self.db = db
+        self.executor = ThreadPoolExecutor(max_workers=workers)
+        self.cache = OrderedDict()
+        self.cache_size = cache_size
+        self.cache_lock = threading.Lock()
+        self.in_flight = {}
+
+    def route(self, path, params):
+        def one(name, default=None):
+            return params.get(name, [default])[0]
+
+        limit = max(1, min(int(one('limit', 50)), MAX_LIMIT))
+        parts = [p for p in path.split('/') if p]
+        if parts == ['stats']:
+            return self.db.get_statistics()
+        if parts == ['agenda']:
+            return self.db.get_agenda_items(limit)
+        if parts == ['search']:
+            return self.db.search_cattle(one('q', ''), limit)
+        if parts == ['cattle']:
+            rows = self.db.get_cattle_page(one('after'), limit)
+            return {'items': rows, 'next': rows[-1]['tag_number'] if len(rows) == limit else None}
+        if len(parts) == 2 and parts[0] == 'cattle' and parts[1].isdigit():
+            return self.db.get_cattle_by_id(int(parts[1]))
+        if len(parts) == 3 and parts[0] == 'cattle' and parts[1].isdigit() and parts[2] in ('events', 'vaccinations'):
+            before = None
+            if one('before_date') is not None:
+                before = (one('before_date'), int(one('before_id', 2 ** 62)))
+            rows = self.db.get_history_page(int(parts[1]), parts[2], before, limit)
+            date_key = 'event_date' if parts[2] == 'events' else 'vaccination_date'
+            last = rows[-1] if len(rows) == limit else None
+            return {'items': rows, 'next': {'before_date': last[date_key], 'before_id': last['id']} if last else None}
+        if len(parts) == 3 and parts[0] == 'cattle' and parts[1].isdigit() and parts[2] == 'timeline':
+            before = None
+            if one('before_date') is not None:
+                before = (one('before_date'), one('before_kind', 'vaccination'), int(one('before_id', 2 ** 62)))
+            items = self.db.get_timeline(int(parts[1]), before, limit)
+            last = items[-1] if len(items) == limit else None
+            return {'items': items, 'next': {'before_date': last['date'], 'before_kind': last['kind'],
+                                             'before_id': last['id']} if last else None}
+        raise KeyError(path)
+
+    def respond(self, target, etag_in):
+        """(status, etag, body) — se ejecuta en el pool de hilos"""
+        try:
+            version = self.db.get_data_version()
+        except Exception as e:
+            print(f"[ERROR] api {target}: {e!r}")
+            return 500, None, b'{"error": "internal"}'
+        etag = f'"{version}"'
+        if etag_in == etag:
+            return 304, etag, b''
+        key = (target, version)
+        with self.cache_lock:
+            body = self.cache.get(key)
+            if body is not None:
+                self.cache.move_to_end(key)
+                return 200, etag, body
+            # Un solo hilo calcula cada respuesta; los demás esperan su resultado
+            waiting = self.in_flight.get(key)
+            if waiting is None:
+                self.in_flight[key] = threading.Event()
+        if waiting is not None:
+            waiting.wait()
+            return self.respond(target, etag_in)
+        try:
+            url = urlparse(target)
+            try:
+                data = self.route(url.path, parse_qs(url.query))
+                body = json.dumps(data, ensure_ascii=False).encode('utf-8')
+            except (KeyError, ValueError):
+                return 404, None, b'{"error": "not found"}'
+            except sqlite3.Error as e:
+                print(f"[ERROR] api {target}: {e}")
+                return 500, None, b'{"error": "database"}'
+            except Exception as e:
+                # Cualquier otro fallo también responde: la conexión keep-alive sigue abierta
+                print(f"[ERROR] api {target}: {e!r}")
+                return 500, None, b'{"error": "internal"}'
+            with self.cache_lock:
+                self.cache[key] = body
+                while len(self.cache) > self.cache_size:
+                    self.cache.popitem(last=False)
+        finally:
+            with self.cache_lock:
+                self.in_flight.pop(key).set()
+        return 200, etag, body
+
+    async def handle(self, reader, writer):
+        loop = asyncio.get_running_loop()
+        try:
+            while True:
+                head = await reader.readuntil(b'\r\n\r\n')
+                lines = head.decode('latin-1').split('\r\n')
+                method, target, _ = lines[0].split(' ', 2)
+                headers = {}
+                for line in lines[1:]:
+                    if ':' in line:
+                        name, value = line.split(':', 1)
+                        headers[name.strip().lower()] = value.strip()
+                if method != 'GET':
+                    status, etag, body = 405, None, b'{"error": "method"}'
+                else:
+                    status, etag, body = await loop.run_in_executor(
+                        self.executor, self.respond, target, headers.get('if-none-match'))
+                keep_alive = headers.get('connection', '').lower() != 'close'
+                reason = {200: 'OK', 304: 'Not Modified', 404: 'Not Found', 500: 'Internal Server Error', 405: 'Method Not Allowed'}[status]
+                out = [f'HTTP/1.1 {status} {reason}',
+                       'Content-Type: application/json; charset=utf-8',
+                       f'Content-Length: {len(body)}',
+                       'Connection: keep-alive' if keep_alive else 'Connection: close']
+                if etag:
+                    out.append(f'ETag: {etag}')
+                writer.write(('\r\n'.join(out) + '\r\n\r\n').encode('latin-1') + body)
+                await writer.drain()
+                if not keep_alive:
+                    break
+        except (asyncio.IncompleteReadError, ConnectionResetError, ValueError):
+            pass
+        finally:
+            writer.close()
+
+    async def serve(self, host='0.0.0.0', port=8080):
+        server = await asyncio.start_server(self.handle, host, port)
+        async with server:
+            await server.serve_forever()
+
+
+if __name__ == '__main__':
+    args = sys.argv[1:]
+    ranch = DEFAULT_RANCH
+    if '--ranch' in args:
+        i = args.index('--ranch')
+        ranch = args[i + 1]
+        del args[i:i + 2]
+    port = int(args[0]) if args else 8080
+    print(f"✓ API de solo lectura en el puerto {port} (rancho {ranch})")
+    asyncio.run(ApiServer(ReadOnlyDatabase(ranch)).serve(port=port))
@@ -0,0 +1,210 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Respaldos en caliente con la API de backup de SQLite
+Copia N páginas por paso en un hilo aparte, rota, comprime y verifica
+
+Uso: python3 backup.py [backup|bench] [archivo.db] [--ranch R]
+     python3 backup.py restore [archivo.db] respaldo [--ranch R]
+"""
+
+import gzip
+import os
+import re
+import shutil
+import sqlite3
+import threading
+import time
+from datetime import datetime
+
+# Si la base cambia durante la copia, SQLite reinicia el respaldo;
+# tras este número de reinicios se copia todo en un solo paso
+MAX_RESTARTS = 3
+
+
+class _TooManyRestarts(Exception):
+    pass
+
+
+def check_integrity(db_path):
+    conn = sqlite3.connect(db_path)
+    try:
+        result = conn.execute('PRAGMA integrity_check').fetchone()[0]
+        tables = {row[0] for row in conn.execute("SELECT name FROM sqlite_master WHERE type = 'table'")}
+    finally:
+        conn.close()
+    return result == 'ok' and 'cattle' in tables
+
+
+class BackupManager:
+    def __init__(self, db_path, backup_dir=None, keep=7, pages=256, compress=True):
+        self.db_path = db_path
+        self.backup_dir = backup_dir or os.path.join(os.path.dirname(db_path), 'backups')
+        self.keep = keep
+        self.pages = pages
+        self.compress = compress
+        self.thread = None
+        self.last_result = None
+        self.progress = 0.0
+
+    def _name(self):
+        base = os.path.splitext(os.path.basename(self.db_path))[0]
+        return f"{base}_{datetime.now().strftime('%Y%m%d_%H%M%S')}.db"
+
+    def list_backups(self):
+        if not os.path.isdir(self.backup_dir):
+            return []
+        # Solo los de esta base (cattle_manager_ no debe incluir otros ranchos)
+        base = re.escape(os.path.splitext(os.path.basename(self.db_path))[0])
+        pattern = re.compile(base + r'_\d{8}_\d{6}\.db(\.gz)?$')
+        files = [f for f in os.listdir(self.backup_dir) if pattern.match(f)]
+        return sorted((os.path.join(self.backup_dir, f) for f in files), reverse=True)
+
+    def is_due(self, max_age_hours=24):
+        backups = self.list_backups()
+        if not backups:
+            return True
+        return time.time() - os.path.getmtime(backups[0]) > max_age_hours * 3600
+
+    def backup(self):
+        """Respaldo completo (bloqueante): usar start() desde la interfaz"""
+        os.makedirs(self.backup_dir, exist_ok=True)
+        target = os.path.join(self.backup_dir, self._name())
+        partial = target + '.partial'
+        restarts = [0, None]
+
+        def on_progress(status, remaining, total):
+            # remaining sube = SQLite reinició la copia por una escritura
+            if restarts[1] is not None and remaining > restarts[1]:
+                restarts[0] += 1
+                if restarts[0] > MAX_RESTARTS:
+                    raise _TooManyRestarts()
+            restarts[1] = remaining
+            self.progress = 1 - remaining / total if total else 1.0
+
+        src = sqlite3.connect(self.db_path)
+        dst = sqlite3.connect(partial)
+        try:
+            try:
+                src.backup(dst, pages=self.pages, progress=on_progress, sleep=0.005)
+            except _TooManyRestarts:
+                src.backup(dst, pages=-1)
+        finally:
+            dst.close()
+            src.close()
+
+        if not check_integrity(partial):
+            os.remove(partial)
+            raise RuntimeError('El respaldo no pasó la verificación de integridad')
+
+        if self.compress:
+            with open(partial, 'rb') as f_in, gzip.open(target + '.gz', 'wb', compresslevel=6) as f_out:
+                shutil.copyfileobj(f_in, f_out, 1024 * 1024)
+            os.remove(partial)
+            target += '.gz'
+        else:
+            os.replace(partial, target)
+
+        self.rotate()
+        self.progress = 1.0
+        return target
+
+    def rotate(self):
+        for old in self.list_backups()[self.keep:]:
+            os.remove(old)
+
+    def is_running(self):
+        return self.thread is not None and self.thread.is_alive()
+
+    def start(self, on_done=None):
+        """Respaldo en un hilo aparte; on_done(ruta o None, error o None)"""
+        if self.is_running():
+            return False
+
+        def run():
+            try:
+                self.last_result = (self.backup(), None)
+            except Exception as e:
+                print(f"[ERROR] backup: {e}")
+                self.last_result = (None, e)
+            if on_done:
+                on_done(*self.last_result)
+
+        self.thread = threading.Thread(target=run, daemon=True)
+        self.thread.start()
+        return True
+
+    def restore(self, backup_file, db=None):
+        """Restaura un respaldo verificado sobre la base en uso
+
+        db: Database abierta sobre este archivo; su cola se guarda antes de
+        copiar y su caché de fichas e índice de aretes se vacían después.
+        """
+        temp = self.db_path + '.restore'
+        if backup_file.endswith('.gz'):
+            with gzip.open(backup_file, 'rb') as f_in, open(temp, 'wb') as f_out:
+                shutil.copyfileobj(f_in, f_out, 1024 * 1024)
+        else:
+            shutil.copyfile(backup_file, temp)
+        try:
+            if not check_integrity(temp):
+                raise RuntimeError('El respaldo está dañado; no se restauró')
+            if db is not None:
+                db.flush_writes()
+            # Copia a través de SQLite: respeta los bloqueos de otras conexiones
+            src = sqlite3.connect(temp)
+            dst = sqlite3.connect(self.db_path)
+            try:
+                src.backup(dst)
+            finally:
+                dst.close()
+                src.close()
+            if db is not None:
+                db.invalidate_caches()
+        finally:
+            os.remove(temp)
+        return check_integrity(self.db_path)
+
+
+def benchmark(db_path, pages=256):
+    """Mide la latencia del hilo principal (ticks de 16 ms) durante un respaldo"""
+    manager = BackupManager(db_path, pages=pages, compress=False, keep=1)
+    done = threading.Event()
+    start = time.perf_counter()
+    manager.start(on_done=lambda path, error: done.set())
+    worst = 0.0
+    ticks = 0
+    while not done.is_set():
+        t = time.perf_counter()
+        time.sleep(0.016)
+        worst = max(worst, time.perf_counter() - t - 0.016)
+        ticks += 1
+    elapsed = time.perf_counter() - start
+    size = os.path.getsize(db_path) / 1024 / 1024
+    print(f"✓ Respaldo de {size:.0f} MB en {elapsed:.1f} s ({pages} páginas/paso)")
+    print(f"✓ {ticks} ticks de 16 ms; peor retraso del hilo principal: {worst * 1000:.1f} ms")
+    return worst
+
+
+if __name__ == '__main__':
+    import argparse
+
+    from database import DEFAULT_RANCH, ranch_db_path
+
+    parser = argparse.ArgumentParser(description='Respaldos en caliente de la base del rancho')
+    parser.add_argument('action', nargs='?', default='backup', choices=('backup', 'restore', 'bench'))
+    parser.add_argument('files', nargs='*', help='[archivo.db] (por defecto el del rancho); restore: y el respaldo')
+    parser.add_argument('--ranch', default=DEFAULT_RANCH)
+    args = parser.parse_args()
+
+    wanted = 2 if args.action == 'restore' else 1
+    if not wanted - 1 <= len(args.files) <= wanted:
+        parser.error('restore necesita el respaldo' if args.action == 'restore' else 'sobran argumentos')
+    path = args.files[0] if len(args.files) == wanted else ranch_db_path(args.ranch)
+    if args.action == 'bench':
+        benchmark(path)
+    elif args.action == 'restore':
+        ok = BackupManager(path).restore(args.files[-1])
+        print("✓ Restaurado" if ok else "✗ Falló la verificación")
+    else:
+        print(f"✓ Respaldo: {BackupManager(path).backup()}")
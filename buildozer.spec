@@ -7,7 +7,7 @@ source.include_exts = py,png,jpg,kv,atlas
 version = 1.1
 
 # CORRECCIÓN IMPORTANTE: agregar pyjnius para Android
-requirements = python3,kivy==2.1.0,android,pyjnius
+requirements = python3,kivy==2.1.0,android,pyjnius,numpy
 
 orientation = portrait
 fullscreen = 0
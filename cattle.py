@@ -0,0 +1,258 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Línea de comandos del hato (sin Kivy, para cron y trabajo por lotes)
+
+Ejemplos:
+    python3 cattle.py stats
+    python3 cattle.py agenda
+    python3 cattle.py cmd "vacuné 123"
+    python3 cattle.py import ganado.csv
+    python3 cattle.py export ganado.csv
+    python3 cattle.py export eventos.csv --table events
+    python3 cattle.py weights bascula.csv
+    python3 cattle.py trend --from 2025-01-01 --points 12
+    python3 cattle.py maintain
+    python3 cattle.py report --month 2025-03 --format pdf
+    python3 cattle.py history --on 2025-03-01
+    python3 cattle.py --ranch rancho_2 stats --json
+"""
+
+import argparse
+import csv
+import itertools
+import json
+import shutil
+import sys
+from datetime import datetime, timedelta
+
+from database import Database, DEFAULT_RANCH, calculate_days_to_birth
+from reports import FORMATS, ReportService
+
+EXPORT_COLUMNS = ['tag_number', 'name', 'birth_date', 'weight', 'category', 'is_pregnant',
+                  'pregnancy_date', 'expected_birth_date', 'last_birth_date', 'notes']
+
+AGENDA_TITLES = [
+    ('overdue', '⏰ PARTOS ATRASADOS'),
+    ('near_birth', '⚠️ PRÓXIMAS A PARIR'),
+    ('to_dry', '🚫 PARA SECAR'),
+    ('need_vaccine', '💉 VACUNAS PENDIENTES'),
+    ('recent_births', '👶 PARTOS RECIENTES'),
+]
+
+
+def cmd_stats(db, args):
+    stats = db.get_statistics()
+    if args.json:
+        print(json.dumps(stats, ensure_ascii=False))
+        return 0
+    for key, value in stats.items():
+        print(f"{key:20} {value}")
+    return 0
+
+
+def cmd_agenda(db, args):
+    if args.json:
+        print(json.dumps(db.get_agenda_items(), ensure_ascii=False))
+        return 0
+    empty = True
+    for key, title in AGENDA_TITLES:
+        # Cada sección se imprime mientras se lee (memoria acotada)
+        for i, c in enumerate(db.iter_agenda(key)):
+            if i == 0:
+                print(title)
+                empty = False
+            if key == 'need_vaccine':
+                detail = f"{c['vaccine_name']} ({c['next_vaccination_date']})"
+            elif key in ('near_birth', 'to_dry', 'overdue'):
+                detail = f"parto {c['expected_birth_date']} ({calculate_days_to_birth(c['expected_birth_date'])}d)"
+            else:
+                detail = f"parió {c['last_birth_date']}"
+            print(f"  {c['tag_number']:>8}  {detail}")
+    if empty:
+        print('Sin eventos')
+    return 0
+
+
+def cmd_quick(db, args):
+    result = db.apply_quick_command(' '.join(args.command))
+    if result is None:
+        print('✗ Comando no reconocido o arete inexistente', file=sys.stderr)
+        return 1
+    print(f"✓ {result}")
+    return 0
+
+
+def cmd_import(db, args):
+    with open(args.file, newline='', encoding='utf-8') as f:
+        inserted, skipped, invalid = db.import_cattle(csv.DictReader(f))
+    print(f"✓ {inserted} vacas importadas, {skipped} omitidas (arete repetido)")
+    if invalid:
+        print(f"✗ {invalid} filas con fecha o preñez inválida omitidas", file=sys.stderr)
+    return 0
+
+
+def cmd_export(db, args):
+    # Se escribe fila por fila desde los iteradores: no se carga la tabla completa
+    if args.table == 'cattle':
+        rows, columns = db.iter_cattle(), EXPORT_COLUMNS
+    else:
+        rows = db.iter_events() if args.table == 'events' else db.iter_vaccinations()
+        first = next(rows, None)
+        columns = list(first) if first else []
+        rows = itertools.chain([first], rows) if first else rows
+    out = open(args.file, 'w', newline='', encoding='utf-8') if args.file else sys.stdout
+    try:
+        writer = csv.DictWriter(out, fieldnames=columns, extrasaction='ignore')
+        writer.writeheader()
+        writer.writerows(rows)
+    finally:
+        if out is not sys.stdout:
+            out.close()
+    return 0
+
+
+def cmd_weights(db, args):
+    with open(args.file, newline='', encoding='utf-8') as f:
+        saved, unknown = db.import_weights(csv.DictReader(f))
+    print(f"✓ {saved} pesajes guardados, {unknown} omitidos (arete desconocido)")
+    return 0
+
+
+def cmd_trend(db, args):
+    cattle_id = None
+    if args.tag:
+        found = [c for c in db.search_cattle(args.tag) if c['tag_number'] == args.tag]
+        if not found:
+            print('✗ Arete inexistente', file=sys.stderr)
+            return 1
+        cattle_id = found[0]['id']
+    end = args.to or datetime.now().strftime('%Y-%m-%d')
+    start = args.start or (datetime.now() - timedelta(days=365)).strftime('%Y-%m-%d')
+    trend = db.get_weight_trend(start, end, args.bucket, args.points, cattle_id)
+    if args.json:
+        print(json.dumps(trend, ensure_ascii=False))
+        return 0
+    for point in trend:
+        print(f"{point['date']}  {point['avg_kg']:>7} kg  ({point['weighings']} pesajes)")
+    return 0
+
+
+def cmd_history(db, args):
+    db.update_snapshots()
+    if args.on:
+        snapshot = db.get_snapshot(args.on)
+        rows = [snapshot] if snapshot else []
+    else:
+        end = args.to or datetime.now().strftime('%Y-%m-%d')
+        start = args.start or (datetime.now() - timedelta(days=30)).strftime('%Y-%m-%d')
+        rows = db.get_herd_snapshots(start, end)
+    if args.json:
+        print(json.dumps(rows, ensure_ascii=False))
+        return 0
+    if not rows:
+        print('✗ Sin fotos del hato para esas fechas', file=sys.stderr)
+        return 1
+    print(f"{'día':10}  {'total':>7} {'preñadas':>8} {'parto60':>7} {'secar':>6} {'partos':>6}")
+    for r in rows:
+        print(f"{r['day']}  {r['total']:>7} {r['pregnant']:>8} {r['near_calving']:>7} {r['to_dry']:>6} {r['births']:>6}")
+    return 0
+
+
+def cmd_maintain(db, args):
+    result = db.maintain(full=args.full)
+    if args.json:
+        print(json.dumps(result, ensure_ascii=False))
+        return 1 if result['problems'] else 0
+    orphans = ', '.join(f"{table} {count}" for table, count in result['orphans'].items()) or 'ninguna'
+    print(f"✓ Huérfanas borradas: {orphans}")
+    print(f"✓ Estadísticas {'recalculadas' if result['analyzed'] else 'al día (PRAGMA optimize)'}")
+    for problem in result['problems']:
+        print(f"✗ {problem}", file=sys.stderr)
+    return 1 if result['problems'] else 0
+
+
+def cmd_report(db, args):
+    service = ReportService(workers=1)
+    try:
+        path = service.request(db, args.month, args.format).result()
+    except ValueError:
+        print('✗ Mes inválido (AAAA-MM)', file=sys.stderr)
+        return 1
+    finally:
+        service.close()
+    if args.output:
+        shutil.copyfile(path, args.output)
+        path = args.output
+    print(f"✓ Informe: {path}")
+    return 0
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(prog='cattle', description='Gestión Ganadera desde la terminal')
+    parser.add_argument('--ranch', default=DEFAULT_RANCH, help='rancho (archivo) a usar')
+    sub = parser.add_subparsers(dest='action', required=True)
+
+    p = sub.add_parser('stats', help='estadísticas del hato')
+    p.add_argument('--json', action='store_true')
+    p.set_defaults(func=cmd_stats)
+
+    p = sub.add_parser('agenda', help='secados, partos y vacunas pendientes')
+    p.add_argument('--json', action='store_true')
+    p.set_defaults(func=cmd_agenda)
+
+    p = sub.add_parser('cmd', help='comando rápido, p. ej. "vacuné 123"')
+    p.add_argument('command', nargs='+')
+    p.set_defaults(func=cmd_quick)
+
+    p = sub.add_parser('import', help='importar vacas desde CSV')
+    p.add_argument('file')
+    p.set_defaults(func=cmd_import)
+
+    p = sub.add_parser('export', help='exportar vacas a CSV (stdout si no hay archivo)')
+    p.add_argument('file', nargs='?')
+    p.add_argument('--table', choices=('cattle', 'events', 'vaccinations'), default='cattle',
+                   help='qué exportar (eventos y vacunas de todo el hato)')
+    p.set_defaults(func=cmd_export)
+
+    p = sub.add_parser('weights', help='importar pesajes de la báscula (CSV: arete, fecha, peso)')
+    p.add_argument('file')
+    p.set_defaults(func=cmd_weights)
+
+    p = sub.add_parser('trend', help='peso promedio por periodo')
+    p.add_argument('--from', dest='start', help='fecha inicial (un año atrás si se omite)')
+    p.add_argument('--to', help='fecha final (hoy si se omite)')
+    p.add_argument('--bucket', type=int, help='días por punto')
+    p.add_argument('--points', type=int, default=60, help='máximo de puntos si no se da --bucket')
+    p.add_argument('--tag', help='solo esta vaca')
+    p.add_argument('--json', action='store_true')
+    p.set_defaults(func=cmd_trend)
+
+    p = sub.add_parser('history', help='estado del hato por día (fotos diarias)')
+    p.add_argument('--on', help='estado al cierre de esta fecha')
+    p.add_argument('--from', dest='start', help='fecha inicial (30 días atrás si se omite)')
+    p.add_argument('--to', help='fecha final (hoy si se omite)')
+    p.add_argument('--json', action='store_true')
+    p.set_defaults(func=cmd_history)
+
+    p = sub.add_parser('maintain', help='borrar huérfanas, revisar integridad y actualizar estadísticas')
+    p.add_argument('--full', action='store_true', help='ANALYZE completo')
+    p.add_argument('--json', action='store_true')
+    p.set_defaults(func=cmd_maintain)
+
+    p = sub.add_parser('report', help='informe mensual: inventario, partos, vacunas y KPIs reproductivos')
+    p.add_argument('--month', help='AAAA-MM (mes actual si se omite)')
+    p.add_argument('--format', choices=FORMATS, default='html')
+    p.add_argument('-o', '--output', help='copiar el informe a este archivo')
+    p.set_defaults(func=cmd_report)
+
+    args = parser.parse_args(argv)
+    db = Database(args.ranch)
+    try:
+        return args.func(db, args)
+    finally:
+        db.close()
+
+
+if __name__ == '__main__':
+    sys.exit(main())
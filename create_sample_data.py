@@ -10,11 +10,14 @@ import os
 from datetime import datetime, timedelta
 import random
 
-# Ruta de la base de datos
-db_path = os.path.join(os.path.expanduser('~'), 'cattle_manager.db')
+from database import Database, ranch_db_path
+
+# Ruta de la base de datos (rancho principal)
+db_path = ranch_db_path()
 
 def create_sample_data():
     """Crear datos de ejemplo"""
+    db = Database()
     conn = sqlite3.connect(db_path)
     cursor = conn.cursor()
     
@@ -26,7 +29,6 @@ def create_sample_data():
         cursor.execute('DELETE FROM vaccination_history')
         cursor.execute('DELETE FROM events')
         cursor.execute('DELETE FROM activity_log')
-        cursor.execute('DELETE FROM vaccination_config')
         print("✓ Base de datos limpiada")
     
     print("\nAgregando datos de ejemplo...")
@@ -120,8 +122,12 @@ def create_sample_data():
             VALUES (?, ?, ?)
         ''', (cattle_id, 'registration', f'Vaca {tag_number} agregada al sistema'))
     
+    # Calendario (partos, secados, vacunas) de todo el hato en una pasada
+    db.refresh_calendar(cursor)
+    
     conn.commit()
     conn.close()
+    db.close()
     
     print(f"\n✓ {len(cattle_ids)} vacas de ejemplo agregadas exitosamente!")
     print(f"✓ Base de datos: {db_path}")
@@ -0,0 +1,2023 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Base de datos del hato (sin Kivy)
+La usan la app, la línea de comandos (cattle.py) y los scripts
+"""
+
+import os
+import re
+import glob
+import time
+import bisect
+import random
+import sqlite3
+import functools
+import threading
+import uuid
+from collections import OrderedDict
+from datetime import date, datetime, timedelta, timezone
+from urllib.parse import quote
+
+# Calendario reproductivo (días)
+GESTATION_DAYS = 283
+DRY_OFF_DAYS = 60          # secar a más tardar 60 días antes del parto (ventana 60-90)
+POSTPARTUM_CHECK_DAYS = 30
+
+# Protocolos de vacunación por defecto:
+# (vacuna, categoría o None = todas, edad mínima, edad máxima, intervalo; días)
+# Intervalo None = dosis única
+DEFAULT_VACCINE_PROTOCOLS = [
+    ('Clostridiosis', None, 90, None, 365),
+    ('Rabia', None, 90, None, 365),
+    ('Aftosa', None, 120, None, 180),
+    ('IBR', 'Vaca', 180, None, 365),
+    ('IBR', 'Vaquilla', 180, None, 365),
+    ('Brucelosis', 'Becerra', 90, 240, None),
+]
+GENERAL_VACCINE = 'Vacuna general'
+
+# Tablas sincronizadas entre dispositivos y su clave global
+# (cattle por arete; el resto por un uid aleatorio)
+SYNC_TABLES = {
+    'cattle': 'tag_number',
+    'events': 'uid',
+    'vaccination_history': 'uid',
+    'activity_log': 'uid',
+}
+
+# Caché de fichas (vaca + primera página del historial) y tamaño de página
+DETAIL_CACHE_SIZE = 64
+TIMELINE_PAGE = 30
+
+# Iteradores: filas por fetchmany y secciones de la agenda
+STREAM_BATCH = 500
+AGENDA_SECTIONS = ('to_dry', 'near_birth', 'need_vaccine', 'recent_births', 'overdue')
+
+# Clave de orden natural del arete ("200" antes que "1000"): el prefijo numérico
+# rellenado a 20 dígitos + el resto del texto. natural_tag_key() es su gemela en Python
+_TAG_DIGITS = "length(tag_number) - length(ltrim(tag_number, '0123456789'))"
+TAG_SORT_SQL = f'''CASE WHEN {_TAG_DIGITS} > 0
+    THEN substr('00000000000000000000' || ltrim(substr(tag_number, 1, {_TAG_DIGITS}), '0'), -20)
+         || ltrim(tag_number, '0123456789')
+    ELSE tag_number END'''
+
+# Pesajes: día = días desde 1970-01-01; ganancia diaria sobre estas ventanas
+EPOCH_DAY_SQL = "CAST(julianday({}) - 2440587.5 AS INTEGER)"
+GAIN_WINDOWS = (30, 90)
+
+# Tablas con cattle_id (huérfanas si la vaca ya no existe) y filas que lee ANALYZE por índice
+ORPHAN_TABLES = ('events', 'vaccination_history', 'activity_log', 'calendar', 'weights', 'weight_gain')
+ANALYSIS_LIMIT = 1000
+
+# Fotos diarias del hato: cuántos días hacia atrás se reconstruyen la primera vez
+SNAPSHOT_HISTORY_DAYS = 3650
+
+# Comandos rápidos: palabra clave -> acción (también activity_type)
+QUICK_ACTIONS = (('vacun', 'vaccination'), ('sec', 'drying'), ('pari', 'birth'), ('carg', 'pregnancy'))
+
+# Varios procesos (app, cron, api_server, sync) escriben la misma base:
+# espera por el candado (s) y reintentos con espera aleatoria creciente (s)
+BUSY_TIMEOUT = 5.0
+WRITE_RETRIES = 4
+RETRY_BASE_DELAY = 0.05
+
+# Un archivo SQLite por rancho; el principal conserva el nombre original
+DEFAULT_RANCH = 'principal'
+
+
+def is_android():
+    # Igual que kivy.utils.platform, sin importar Kivy
+    return 'ANDROID_ARGUMENT' in os.environ or 'ANDROID_PRIVATE' in os.environ
+
+
+def get_storage_dir():
+    try:
+        if is_android():
+            from android.storage import app_storage_path
+            return app_storage_path()
+    except:
+        pass
+    return os.path.expanduser('~')
+
+
+def ranch_slug(name):
+    slug = re.sub(r'[^a-z0-9]+', '_', (name or '').strip().lower()).strip('_')
+    return slug or DEFAULT_RANCH
+
+
+def ranch_db_path(ranch=DEFAULT_RANCH):
+    slug = ranch_slug(ranch)
+    if slug == DEFAULT_RANCH:
+        return os.path.join(get_storage_dir(), 'cattle_manager.db')
+    return os.path.join(get_storage_dir(), f'cattle_manager_{slug}.db')
+
+
+def list_ranches():
+    # El principal siempre existe; los demás se descubren por nombre de archivo
+    pattern = os.path.join(get_storage_dir(), 'cattle_manager_*.db')
+    others = sorted(os.path.basename(p)[len('cattle_manager_'):-3] for p in glob.glob(pattern))
+    return [DEFAULT_RANCH] + [r for r in others if r != DEFAULT_RANCH]
+
+
+def ranch_label(ranch):
+    return ranch_slug(ranch).replace('_', ' ').title()
+
+
+def connect(db_path):
+    """Conexión de escritura: espera el candado y toma la escritura al empezar"""
+    # IMMEDIATE: el BEGIN implícito antes de INSERT/UPDATE/DELETE reserva la escritura;
+    # con DEFERRED una lectura que luego escribe choca con otro escritor sin esperar
+    conn = sqlite3.connect(db_path, timeout=BUSY_TIMEOUT, isolation_level='IMMEDIATE')
+    # Sin esto SQLite ignora las FOREIGN KEY ... ON DELETE CASCADE del esquema
+    conn.execute('PRAGMA foreign_keys = ON')
+    return conn
+
+
+def is_locked_error(error):
+    message = str(error).lower()
+    return isinstance(error, sqlite3.OperationalError) and ('locked' in message or 'busy' in message)
+
+
+def retry_locked(func):
+    """Reintenta la escritura si la base sigue ocupada tras BUSY_TIMEOUT"""
+    @functools.wraps(func)
+    def wrapper(*args, **kwargs):
+        for attempt in range(WRITE_RETRIES):
+            try:
+                return func(*args, **kwargs)
+            except sqlite3.OperationalError as e:
+                if not is_locked_error(e) or attempt == WRITE_RETRIES - 1:
+                    raise
+            # Fuera del except: la conexión fallida ya se cerró y deshizo su transacción.
+            # Espera aleatoria para que los escritores no vuelvan a chocar a la vez
+            time.sleep(random.uniform(0, RETRY_BASE_DELAY * 2 ** attempt))
+    return wrapper
+
+
+class WriteQueue:
+    """Cola de escritura en memoria: agrupa inserts y los guarda en una sola transacción"""
+    
+    def __init__(self, db, flush_interval=0.5, max_rows=50):
+        self.db = db
+        self.flush_interval = flush_interval
+        self.max_rows = max_rows
+        self.pending = []
+        self.flushing = []
+        self.lock = threading.Lock()
+        self.flush_lock = threading.Lock()
+        self.wakeup = threading.Event()
+        self.running = True
+        self.thread = threading.Thread(target=self._run, daemon=True)
+        self.thread.start()
+    
+    def put(self, table, columns, values):
+        # uid fijado al encolar: quien mezcla cola y base reconoce la fila ya guardada
+        if SYNC_TABLES.get(table) == 'uid' and 'uid' not in columns:
+            columns, values = tuple(columns) + ('uid',), tuple(values) + (uuid.uuid4().hex,)
+        with self.lock:
+            self.pending.append((table, tuple(columns), tuple(values)))
+            full = len(self.pending) >= self.max_rows
+        if not self.running:
+            # Cola ya cerrada (cambio de rancho, salida): un hilo rezagado guarda directo
+            self.flush()
+        elif full:
+            self.wakeup.set()
+    
+    def pending_rows(self, table):
+        # Filas aún no guardadas, como diccionarios (para leer lo propio)
+        with self.lock:
+            return [dict(zip(cols, vals)) for t, cols, vals in self.flushing + self.pending if t == table]
+    
+    def pending_count(self):
+        with self.lock:
+            return len(self.flushing) + len(self.pending)
+    
+    def _run(self):
+        while self.running:
+            self.wakeup.wait(self.flush_interval)
+            self.wakeup.clear()
+            try:
+                self.flush()
+            except Exception as e:
+                print(f"[ERROR] WriteQueue.flush: {e}")
+    
+    @retry_locked
+    def flush(self):
+        with self.flush_lock:
+            # El lote sale de la cola antes de guardarse; hasta el commit sigue visible
+            # en pending_rows (flushing) y si falla vuelve al frente de la cola
+            with self.lock:
+                batch, self.pending = self.pending, []
+                self.flushing = batch
+            if not batch:
+                return 0
+            # Agrupar por tabla/columnas conservando el orden de llegada
+            groups = []
+            for table, cols, vals in batch:
+                if groups and groups[-1][0] == (table, cols):
+                    groups[-1][1].append(vals)
+                else:
+                    groups.append(((table, cols), [vals]))
+            try:
+                conn = self.db.get_connection()
+                try:
+                    cursor = conn.cursor()
+                    try:
+                        self._insert(cursor, groups, batch)
+                    except sqlite3.IntegrityError:
+                        # Vaca borrada con filas aún en cola: esas filas se descartan
+                        conn.rollback()
+                        ids = sorted({vals[0] for table, cols, vals in batch})
+                        cursor.execute(f"SELECT id FROM cattle WHERE id IN ({', '.join('?' * len(ids))})", ids)
+                        alive = {row[0] for row in cursor.fetchall()}
+                        print(f"[ERROR] WriteQueue: filas de vacas borradas descartadas {sorted(set(ids) - alive)}")
+                        groups = [(key, [vals for vals in rows if vals[0] in alive]) for key, rows in groups]
+                        self._insert(cursor, groups, [item for item in batch if item[2][0] in alive])
+                    conn.commit()
+                finally:
+                    conn.close()
+            except Exception:
+                with self.lock:
+                    self.pending[:0] = batch
+                    self.flushing = []
+                raise
+            with self.lock:
+                self.flushing = []
+            self.db.invalidate_detail({vals[0] for table, cols, vals in batch})
+            return len(batch)
+    
+    def _insert(self, cursor, groups, batch):
+        for (table, cols), rows in groups:
+            marks = ', '.join('?' * len(cols))
+            cursor.executemany(f"INSERT INTO {table} ({', '.join(cols)}) VALUES ({marks})", rows)
+        self.db.on_flush(cursor, batch)
+    
+    def close(self):
+        self.running = False
+        self.wakeup.set()
+        self.thread.join(timeout=2)
+        self.flush()
+
+
+class NoWrites:
+    """Cola vacía para lectores que nunca escriben (API, informes)"""
+    pending = ()
+    
+    def pending_rows(self, table):
+        return []
+    
+    def pending_count(self):
+        return 0
+    
+    def flush(self):
+        return 0
+    
+    def close(self):
+        pass
+
+
+class Database:
+    def __init__(self, ranch=DEFAULT_RANCH):
+        self.ranch = ranch_slug(ranch)
+        self.db_path = ranch_db_path(self.ranch)
+        self._init_caches()
+        self.init_database()
+        self.write_queue = WriteQueue(self)
+    
+    def _init_caches(self):
+        # Caché LRU de fichas e índice de aretes (también en las subclases de solo lectura)
+        self.detail_cache = OrderedDict()
+        self.detail_lock = threading.Lock()
+        self.detail_generation = 0
+        self.tag_lock = threading.Lock()
+        self.tags = None
+        self.tag_ids = None
+        self.tag_keys = None
+    
+    def flush_writes(self):
+        return self.write_queue.flush()
+    
+    def close(self):
+        self.write_queue.close()
+    
+    def get_connection(self):
+        return connect(self.db_path)
+    
+    @retry_locked
+    def init_database(self):
+        conn = self.get_connection()
+        cursor = conn.cursor()
+        # WAL: los lectores (exportaciones, reportes, api_server) no bloquean al escritor
+        # ni al revés; queda guardado en el archivo
+        cursor.execute('PRAGMA journal_mode = WAL')
+        cursor.execute('''
+            CREATE TABLE IF NOT EXISTS cattle (
+                id INTEGER PRIMARY KEY AUTOINCREMENT,
+                tag_number TEXT UNIQUE NOT NULL,
+                name TEXT,
+                birth_date TEXT,
+                weight REAL,
+                category TEXT,
+                is_pregnant INTEGER DEFAULT 0,
+                pregnancy_date TEXT,
+                expected_birth_date TEXT,
+                last_birth_date TEXT,
+                notes TEXT,
+                created_at TEXT DEFAULT CURRENT_TIMESTAMP
+            )
+        ''')
+        # Columna calculada + índice: las listas salen ya en orden natural
+        cursor.execute('PRAGMA table_xinfo(cattle)')
+        if 'tag_sort' not in [col[1] for col in cursor.fetchall()]:
+            cursor.execute(f'ALTER TABLE cattle ADD COLUMN tag_sort TEXT GENERATED ALWAYS AS ({TAG_SORT_SQL}) VIRTUAL')
+        cursor.execute('CREATE INDEX IF NOT EXISTS idx_cattle_tag_sort ON cattle (tag_sort, tag_number)')
+        cursor.execute('''
+            CREATE TABLE IF NOT EXISTS vaccination_history (
+                id INTEGER PRIMARY KEY AUTOINCREMENT,
+                cattle_id INTEGER,
+                vaccine_name TEXT,
+                vaccination_date TEXT,
+                next_vaccination_date TEXT,
+                notes TEXT,
+                FOREIGN KEY (cattle_id) REFERENCES cattle (id) ON DELETE CASCADE
+            )
+        ''')
+        cursor.execute('''
+            CREATE TABLE IF NOT EXISTS events (
+                id INTEGER PRIMARY KEY AUTOINCREMENT,
+                cattle_id INTEGER,
+                event_type TEXT,
+                event_date TEXT,
+                notes TEXT,
+                FOREIGN KEY (cattle_id) REFERENCES cattle (id) ON DELETE CASCADE
+            )
+        ''')
+        cursor.execute('''
+            CREATE TABLE IF NOT EXISTS activity_log (
+                id INTEGER PRIMARY KEY AUTOINCREMENT,
+                cattle_id INTEGER,
+                activity_type TEXT,
+                description TEXT,
+                activity_date TEXT DEFAULT CURRENT_TIMESTAMP,
+                FOREIGN KEY (cattle_id) REFERENCES cattle (id) ON DELETE CASCADE
+            )
+        ''')
+        # Índice cubriente: partos por vaca en orden (analytics.py)
+        cursor.execute('''
+            CREATE INDEX IF NOT EXISTS idx_events_type_cattle_date
+            ON events (event_type, cattle_id, event_date)
+        ''')
+        # Partos por rango de fechas (estadísticas y tendencias)
+        cursor.execute('CREATE INDEX IF NOT EXISTS idx_events_type_date ON events (event_type, event_date)')
+        # Calendario de tareas proyectadas (secado, parto, revisión, vacuna)
+        cursor.execute("SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = 'calendar'")
+        new_calendar = cursor.fetchone() is None
+        cursor.execute('''
+            CREATE TABLE IF NOT EXISTS calendar (
+                id INTEGER PRIMARY KEY AUTOINCREMENT,
+                cattle_id INTEGER,
+                task_type TEXT,
+                task_date TEXT,
+                detail TEXT,
+                FOREIGN KEY (cattle_id) REFERENCES cattle (id) ON DELETE CASCADE
+            )
+        ''')
+        cursor.execute('''
+            CREATE INDEX IF NOT EXISTS idx_calendar_type_date
+            ON calendar (task_type, task_date)
+        ''')
+        cursor.execute('CREATE INDEX IF NOT EXISTS idx_calendar_cattle ON calendar (cattle_id)')
+        # Protocolos de vacunación (intervalos por categoría y edad)
+        cursor.execute("SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = 'vaccination_config'")
+        new_config = cursor.fetchone() is None
+        cursor.execute('''
+            CREATE TABLE IF NOT EXISTS vaccination_config (
+                id INTEGER PRIMARY KEY AUTOINCREMENT,
+                vaccine_name TEXT NOT NULL,
+                category TEXT,
+                min_age_days INTEGER DEFAULT 0,
+                max_age_days INTEGER,
+                interval_days INTEGER,
+                UNIQUE (vaccine_name, category)
+            )
+        ''')
+        if new_config:
+            cursor.executemany('''
+                INSERT INTO vaccination_config (vaccine_name, category, min_age_days,
+                                                max_age_days, interval_days)
+                VALUES (?, ?, ?, ?, ?)
+            ''', DEFAULT_VACCINE_PROTOCOLS)
+        cursor.execute('''
+            CREATE INDEX IF NOT EXISTS idx_vaccination_cattle_name_date
+            ON vaccination_history (cattle_id, vaccine_name, vaccination_date)
+        ''')
+        # Historial por vaca en orden de fecha (línea de tiempo paginada)
+        cursor.execute('CREATE INDEX IF NOT EXISTS idx_events_cattle_date ON events (cattle_id, event_date)')
+        cursor.execute('''
+            CREATE INDEX IF NOT EXISTS idx_vaccination_cattle_date
+            ON vaccination_history (cattle_id, vaccination_date)
+        ''')
+        cursor.execute('''
+            CREATE INDEX IF NOT EXISTS idx_activity_cattle_date
+            ON activity_log (cattle_id, activity_date)
+        ''')
+        # Registro reciente de todo el hato (get_activity_log): sin ordenar la tabla completa
+        cursor.execute('CREATE INDEX IF NOT EXISTS idx_activity_date ON activity_log (activity_date)')
+        if new_calendar or new_config:
+            self.refresh_calendar(cursor)
+        self.init_weights(cursor)
+        self.init_change_log(cursor)
+        self.init_snapshots(cursor)
+        # Una sola vez: filas que quedaron de vacas borradas sin cascada
+        cursor.execute("SELECT 1 FROM sync_state WHERE key = 'orphans_removed'")
+        if cursor.fetchone() is None:
+            self.remove_orphans(cursor)
+            cursor.execute("INSERT INTO sync_state (key, value) VALUES ('orphans_removed', 1)")
+        conn.commit()
+        conn.close()
+    
+    def init_weights(self, cursor):
+        # Serie de pesajes compacta: un registro por vaca y día, sin rowid
+        cursor.execute('''
+            CREATE TABLE IF NOT EXISTS weights (
+                cattle_id INTEGER NOT NULL,
+                day INTEGER NOT NULL,
+                kg REAL NOT NULL,
+                PRIMARY KEY (cattle_id, day)
+            ) WITHOUT ROWID
+        ''')
+        # Tendencias del hato: recorre solo el rango de días pedido
+        cursor.execute('CREATE INDEX IF NOT EXISTS idx_weights_day ON weights (day, kg)')
+        # Último peso y ganancia diaria por vaca, recalculados al registrar pesajes
+        cursor.execute('''
+            CREATE TABLE IF NOT EXISTS weight_gain (
+                cattle_id INTEGER PRIMARY KEY,
+                last_day INTEGER,
+                last_kg REAL,
+                adg_30 REAL,
+                adg_90 REAL
+            )
+        ''')
+        # Ganancia promedio de los pesados recientemente (get_statistics)
+        cursor.execute('CREATE INDEX IF NOT EXISTS idx_weight_gain_day ON weight_gain (last_day, adg_30)')
+    
+    def init_snapshots(self, cursor):
+        # Estado del hato al cierre de cada día: tendencias y consultas a una fecha por rango
+        cursor.execute('''
+            CREATE TABLE IF NOT EXISTS herd_snapshots (
+                day TEXT PRIMARY KEY,
+                total INTEGER NOT NULL,
+                pregnant INTEGER NOT NULL,
+                near_calving INTEGER NOT NULL,
+                to_dry INTEGER NOT NULL,
+                births INTEGER NOT NULL
+            ) WITHOUT ROWID
+        ''')
+    
+    def init_change_log(self, cursor):
+        # Bitácora de cambios para sincronizar (sync.py), llenada por triggers
+        cursor.execute('''
+            CREATE TABLE IF NOT EXISTS change_log (
+                seq INTEGER PRIMARY KEY AUTOINCREMENT,
+                table_name TEXT NOT NULL,
+                row_key TEXT NOT NULL,
+                row_id INTEGER,
+                op TEXT NOT NULL,
+                changed_at TEXT NOT NULL
+            )
+        ''')
+        cursor.execute('CREATE INDEX IF NOT EXISTS idx_change_log_key ON change_log (table_name, row_key)')
+        cursor.execute('''
+            CREATE TABLE IF NOT EXISTS sync_state (
+                key TEXT PRIMARY KEY,
+                value TEXT
+            )
+        ''')
+        now = "strftime('%Y-%m-%d %H:%M:%f', 'now')"
+        # Mientras sync.py aplica cambios remotos no se vuelven a registrar
+        not_applying = "NOT EXISTS (SELECT 1 FROM sync_state WHERE key = 'applying')"
+        for table, key in SYNC_TABLES.items():
+            if key == 'uid':
+                cursor.execute(f'PRAGMA table_info({table})')
+                if 'uid' not in [col[1] for col in cursor.fetchall()]:
+                    cursor.execute(f'ALTER TABLE {table} ADD COLUMN uid TEXT')
+                    cursor.execute(f'UPDATE {table} SET uid = lower(hex(randomblob(16))) WHERE uid IS NULL')
+                cursor.execute(f'CREATE UNIQUE INDEX IF NOT EXISTS idx_{table}_uid ON {table} (uid)')
+                cursor.execute(f'''
+                    CREATE TRIGGER IF NOT EXISTS trg_{table}_insert AFTER INSERT ON {table}
+                    BEGIN
+                        UPDATE {table} SET uid = lower(hex(randomblob(16)))
+                        WHERE id = NEW.id AND NEW.uid IS NULL;
+                        INSERT INTO change_log (table_name, row_key, row_id, op, changed_at)
+                        SELECT '{table}', uid, id, 'upsert', {now} FROM {table}
+                        WHERE id = NEW.id AND {not_applying};
+                    END
+                ''')
+                update_when = 'OLD.uid IS NOT NULL'
+            else:
+                cursor.execute(f'''
+                    CREATE TRIGGER IF NOT EXISTS trg_{table}_insert AFTER INSERT ON {table}
+                    WHEN {not_applying}
+                    BEGIN
+                        INSERT INTO change_log (table_name, row_key, row_id, op, changed_at)
+                        VALUES ('{table}', NEW.{key}, NEW.id, 'upsert', {now});
+                    END
+                ''')
+                update_when = '1'
+            cursor.execute(f'''
+                CREATE TRIGGER IF NOT EXISTS trg_{table}_update AFTER UPDATE ON {table}
+                WHEN {update_when} AND {not_applying}
+                BEGIN
+                    INSERT INTO change_log (table_name, row_key, row_id, op, changed_at)
+                    SELECT '{table}', OLD.{key}, NULL, 'delete', {now}
+                    WHERE OLD.{key} IS NOT NEW.{key};
+                    INSERT INTO change_log (table_name, row_key, row_id, op, changed_at)
+                    VALUES ('{table}', NEW.{key}, NEW.id, 'upsert', {now});
+                END
+            ''')
+            cursor.execute(f'''
+                CREATE TRIGGER IF NOT EXISTS trg_{table}_delete AFTER DELETE ON {table}
+                WHEN {not_applying}
+                BEGIN
+                    INSERT INTO change_log (table_name, row_key, row_id, op, changed_at)
+                    VALUES ('{table}', OLD.{key}, NULL, 'delete', {now});
+                END
+            ''')
+    
+    def remove_orphans(self, cursor):
+        """Borra en bloque las filas cuya vaca ya no existe -> {tabla: filas}"""
+        removed = {}
+        # Limpieza local: no se registra en change_log (no hay nada que sincronizar)
+        cursor.execute("INSERT OR REPLACE INTO sync_state (key, value) VALUES ('applying', 1)")
+        for table in ORPHAN_TABLES:
+            cursor.execute(f'DELETE FROM {table} WHERE cattle_id NOT IN (SELECT id FROM cattle)')
+            if cursor.rowcount:
+                removed[table] = cursor.rowcount
+        cursor.execute("DELETE FROM sync_state WHERE key = 'applying'")
+        if removed:
+            self.bump_data_version(cursor)
+        return removed
+    
+    def bump_data_version(self, cursor):
+        # Escrituras sin change_log (cambios recibidos, limpieza) también cambian la versión
+        cursor.execute('''
+            INSERT INTO sync_state (key, value) VALUES ('data_version', 1)
+            ON CONFLICT (key) DO UPDATE SET value = value + 1
+        ''')
+    
+    def maintenance_due(self, every_hours=168):
+        conn = self.get_connection()
+        row = conn.execute("SELECT value FROM sync_state WHERE key = 'maintenance_at'").fetchone()
+        conn.close()
+        if row is None:
+            return True
+        last = datetime.strptime(row[0], '%Y-%m-%d %H:%M:%S')
+        return datetime.now() - last > timedelta(hours=every_hours)
+    
+    @retry_locked
+    def maintain(self, full=False):
+        """Mantenimiento periódico: huérfanas, integridad y estadísticas del planificador
+        
+        full=True recalcula todas las estadísticas (ANALYZE completo); si no, solo
+        cuando faltan y con analysis_limit, más PRAGMA optimize.
+        """
+        self.flush_writes()
+        conn = self.get_connection()
+        cursor = conn.cursor()
+        try:
+            removed = self.remove_orphans(cursor)
+            cursor.execute('PRAGMA quick_check')
+            problems = [row[0] for row in cursor.fetchall() if row[0] != 'ok']
+            cursor.execute("SELECT 1 FROM sqlite_master WHERE name = 'sqlite_stat1'")
+            analyzed = full or cursor.fetchone() is None
+            if analyzed:
+                if not full:
+                    cursor.execute(f'PRAGMA analysis_limit = {ANALYSIS_LIMIT}')
+                cursor.execute('ANALYZE')
+            cursor.execute('PRAGMA optimize')
+            cursor.execute('INSERT OR REPLACE INTO sync_state (key, value) VALUES (?, ?)',
+                           ('maintenance_at', datetime.now().strftime('%Y-%m-%d %H:%M:%S')))
+            conn.commit()
+        finally:
+            conn.close()
+        if removed:
+            self.invalidate_caches()
+        return {'orphans': removed, 'problems': problems, 'analyzed': analyzed}
+    
+    def refresh_calendar(self, cursor, cattle_ids=None):
+        # Regenera las tareas solo de las vacas indicadas (None = todo el hato)
+        if cattle_ids is None:
+            chunks = [None]
+        else:
+            ids = sorted(set(cattle_ids))
+            chunks = [ids[i:i + 500] for i in range(0, len(ids), 500)]
+        for chunk in chunks:
+            if chunk is None:
+                cond, params = '', []
+            else:
+                cond, params = f"AND {{col}} IN ({', '.join('?' * len(chunk))})", chunk
+            cursor.execute(f'DELETE FROM calendar WHERE 1 {cond.format(col="cattle_id")}', params)
+            cursor.execute(f'''
+                INSERT INTO calendar (cattle_id, task_type, task_date, detail)
+                SELECT id, 'dry_off', date(expected_birth_date, '-{DRY_OFF_DAYS} days'), NULL
+                FROM cattle
+                WHERE is_pregnant = 1 AND expected_birth_date IS NOT NULL {cond.format(col="id")}
+                UNION ALL
+                SELECT id, 'calving', expected_birth_date, NULL
+                FROM cattle
+                WHERE is_pregnant = 1 AND expected_birth_date IS NOT NULL {cond.format(col="id")}
+                UNION ALL
+                SELECT id, 'postpartum_check', date(last_birth_date, '+{POSTPARTUM_CHECK_DAYS} days'), NULL
+                FROM cattle
+                WHERE last_birth_date IS NOT NULL {cond.format(col="id")}
+                UNION ALL
+                SELECT id, 'vaccination',
+                       CASE WHEN last_date IS NULL
+                            -- Nunca vacunada: al cumplir la edad mínima (o desde su alta)
+                            THEN MAX(COALESCE(date(birth_date, '+' || min_age_days || ' days'), ''),
+                                     COALESCE(date(created_at), date('now')))
+                            ELSE date(last_date, '+' || interval_days || ' days')
+                       END,
+                       vaccine_name
+                FROM (
+                    SELECT c.id, c.birth_date, c.created_at, p.vaccine_name,
+                           p.min_age_days, p.max_age_days, p.interval_days,
+                           (SELECT MAX(vh.vaccination_date) FROM vaccination_history vh
+                            WHERE vh.cattle_id = c.id AND vh.vaccine_name = p.vaccine_name) AS last_date
+                    FROM cattle c
+                    JOIN vaccination_config p ON p.category IS NULL OR p.category = c.category
+                    WHERE 1 {cond.format(col="c.id")}
+                )
+                WHERE (last_date IS NULL OR interval_days IS NOT NULL)
+                  AND (last_date IS NOT NULL OR max_age_days IS NULL OR birth_date IS NULL
+                       OR julianday('now') - julianday(birth_date) <= max_age_days)
+                UNION ALL
+                -- Vacunas sin protocolo: la próxima fecha registrada a mano
+                SELECT cattle_id, 'vaccination', MAX(next_vaccination_date), vaccine_name
+                FROM vaccination_history
+                WHERE next_vaccination_date IS NOT NULL {cond.format(col="cattle_id")}
+                  AND vaccine_name NOT IN (SELECT vaccine_name FROM vaccination_config)
+                GROUP BY cattle_id, vaccine_name
+            ''', params * 5)
+    
+    def get_vaccine_protocols(self):
+        conn = self.get_connection()
+        cursor = conn.cursor()
+        cursor.execute('SELECT * FROM vaccination_config ORDER BY vaccine_name, category')
+        columns = [desc[0] for desc in cursor.description]
+        protocols = [dict(zip(columns, row)) for row in cursor.fetchall()]
+        conn.close()
+        return protocols
+    
+    @retry_locked
+    def set_vaccine_protocol(self, vaccine_name, category=None, min_age_days=0,
+                             max_age_days=None, interval_days=None):
+        # Alta/cambio de protocolo y recálculo de todo el hato en una pasada
+        self.flush_writes()
+        conn = self.get_connection()
+        cursor = conn.cursor()
+        cursor.execute('''
+            DELETE FROM vaccination_config
+            WHERE vaccine_name = ? AND category IS ?
+        ''', (vaccine_name, category))
+        cursor.execute('''
+            INSERT INTO vaccination_config (vaccine_name, category, min_age_days,
+                                            max_age_days, interval_days)
+            VALUES (?, ?, ?, ?, ?)
+        ''', (vaccine_name, category, min_age_days, max_age_days, interval_days))
+        self.refresh_calendar(cursor)
+        conn.commit()
+        conn.close()
+    
+    def get_vaccines_due(self, until_date, cattle_id=None):
+        # Lista de vacunas pendientes (vencidas incluidas) hasta until_date
+        return list(self.iter_vaccines_due(until_date, cattle_id))
+    
+    def iter_vaccines_due(self, until_date, cattle_id=None):
+        """Vacunas pendientes hasta until_date como iterador (más atrasadas primero)"""
+        self.flush_writes()
+        return self._iter_rows(f'''
+            SELECT c.*, k.detail AS vaccine_name, k.task_date AS next_vaccination_date
+            FROM calendar k
+            JOIN cattle c ON c.id = k.cattle_id
+            WHERE k.task_type = 'vaccination' AND k.task_date <= ?
+            {'AND k.cattle_id = ?' if cattle_id is not None else ''}
+            ORDER BY k.task_date
+        ''', (until_date,) if cattle_id is None else (until_date, cattle_id))
+    
+    def due_vaccines(self, cursor, cattle_ids):
+        """{cattle_id: vacuna pendiente más atrasada} sin vaciar la cola de escritura
+        
+        Una vacuna que todavía espera en la cola ya cuenta como aplicada.
+        """
+        queued = {(v['cattle_id'], v['vaccine_name'])
+                  for v in self.write_queue.pending_rows('vaccination_history')}
+        due = {}
+        for start in range(0, len(cattle_ids), 500):
+            chunk = cattle_ids[start:start + 500]
+            cursor.execute(f'''
+                SELECT cattle_id, detail FROM calendar
+                WHERE task_type = 'vaccination' AND cattle_id IN ({', '.join('?' * len(chunk))})
+                ORDER BY task_date
+            ''', chunk)
+            for cattle_id, vaccine_name in cursor.fetchall():
+                if cattle_id not in due and (cattle_id, vaccine_name) not in queued:
+                    due[cattle_id] = vaccine_name
+        return due
+    
+    def vaccinate(self, cattle_id, vaccine_name=None, vaccination_date=None):
+        # Sin vacuna indicada se aplica la más atrasada según protocolo
+        vaccination_date = vaccination_date or datetime.now().strftime('%Y-%m-%d')
+        conn = self.get_connection()
+        cursor = conn.cursor()
+        if vaccine_name is None:
+            vaccine_name = self.due_vaccines(cursor, [cattle_id]).get(cattle_id, GENERAL_VACCINE)
+        cursor.execute('''
+            SELECT p.interval_days FROM vaccination_config p
+            JOIN cattle c ON p.category IS NULL OR p.category = c.category
+            WHERE c.id = ? AND p.vaccine_name = ?
+            ORDER BY p.category IS NULL
+            LIMIT 1
+        ''', (cattle_id, vaccine_name))
+        row = cursor.fetchone()
+        conn.close()
+        next_date = None
+        if row and row[0]:
+            next_date = (datetime.strptime(vaccination_date, '%Y-%m-%d')
+                         + timedelta(days=row[0])).strftime('%Y-%m-%d')
+        self.add_vaccination(cattle_id, vaccine_name, vaccination_date, next_date)
+        return vaccine_name
+    
+    def on_flush(self, cursor, batch):
+        # Llamado por WriteQueue dentro de la misma transacción
+        vaccinated = [vals[0] for table, cols, vals in batch if table == 'vaccination_history']
+        if vaccinated:
+            self.refresh_calendar(cursor, vaccinated)
+    
+    def get_calendar(self, start_date, end_date, task_type=None):
+        self.flush_writes()
+        conn = self.get_connection()
+        cursor = conn.cursor()
+        query = '''
+            SELECT k.task_type, k.task_date, k.detail, c.*
+            FROM calendar k
+            JOIN cattle c ON c.id = k.cattle_id
+            WHERE k.task_type = ? AND k.task_date BETWEEN ? AND ?
+            ORDER BY k.task_date
+        '''
+        types = [task_type] if task_type else ['dry_off', 'calving', 'postpartum_check', 'vaccination']
+        tasks = []
+        for t in types:
+            cursor.execute(query, (t, start_date, end_date))
+            columns = [desc[0] for desc in cursor.description]
+            tasks.extend(dict(zip(columns, row)) for row in cursor.fetchall())
+        conn.close()
+        tasks.sort(key=lambda k: k['task_date'])
+        return tasks
+    
+    @retry_locked
+    def add_cattle(self, data):
+        conn = self.get_connection()
+        cursor = conn.cursor()
+        try:
+            cursor.execute('''
+                INSERT INTO cattle (tag_number, name, birth_date, weight, category,
+                                    is_pregnant, pregnancy_date, expected_birth_date,
+                                    last_birth_date, notes)
+                VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
+            ''', (data.get('tag_number'), data.get('name'), data.get('birth_date'),
+                  data.get('weight'), data.get('category'), data.get('is_pregnant', 0),
+                  data.get('pregnancy_date'), data.get('expected_birth_date'),
+                  data.get('last_birth_date'), data.get('notes')))
+            cattle_id = cursor.lastrowid
+            self.refresh_calendar(cursor, [cattle_id])
+            if data.get('weight'):
+                self._record_weight(cursor, cattle_id, data['weight'])
+            conn.commit()
+            self._tag_index_add(data.get('tag_number'), cattle_id)
+            return cattle_id
+        except sqlite3.IntegrityError:
+            return None
+        finally:
+            conn.close()
+    
+    @retry_locked
+    def update_cattle(self, cattle_id, data):
+        conn = self.get_connection()
+        cursor = conn.cursor()
+        fields = []
+        values = []
+        for key, value in data.items():
+            if key != 'id':
+                fields.append(f"{key} = ?")
+                values.append(value)
+        values.append(cattle_id)
+        query = f"UPDATE cattle SET {', '.join(fields)} WHERE id = ?"
+        cursor.execute(query, values)
+        self.refresh_calendar(cursor, [cattle_id])
+        # Un peso nuevo queda también en la serie de pesajes
+        if data.get('weight'):
+            self._record_weight(cursor, cattle_id, data['weight'])
+        conn.commit()
+        conn.close()
+        self.invalidate_detail([cattle_id])
+        if 'tag_number' in data:
+            self._tag_index_remove(cattle_id)
+            self._tag_index_add(data['tag_number'], cattle_id)
+    
+    def get_all_cattle(self):
+        return list(self.iter_cattle())
+    
+    # --- Lectura por lotes (memoria acotada) ---
+    
+    def _iter_rows(self, query, params=()):
+        # Genera diccionarios trayendo STREAM_BATCH filas a la vez
+        conn = self.get_connection()
+        try:
+            cursor = conn.execute(query, params)
+            columns = [desc[0] for desc in cursor.description]
+            while True:
+                rows = cursor.fetchmany(STREAM_BATCH)
+                if not rows:
+                    return
+                for row in rows:
+                    yield dict(zip(columns, row))
+        finally:
+            conn.close()
+    
+    def iter_cattle(self):
+        """Todo el hato en orden natural de arete, sin cargarlo en memoria"""
+        return self._iter_rows('SELECT * FROM cattle ORDER BY tag_sort, tag_number')
+    
+    def iter_events(self, cattle_id=None):
+        """Eventos de una vaca (más nuevos primero) o de todo el hato (por id)"""
+        self.flush_writes()
+        if cattle_id is None:
+            return self._iter_rows('SELECT * FROM events ORDER BY id')
+        return self._iter_rows('''
+            SELECT * FROM events WHERE cattle_id = ? ORDER BY event_date DESC, id DESC
+        ''', (cattle_id,))
+    
+    def iter_vaccinations(self, cattle_id=None):
+        """Vacunas de una vaca (más nuevas primero) o de todo el hato (por id)"""
+        self.flush_writes()
+        if cattle_id is None:
+            return self._iter_rows('SELECT * FROM vaccination_history ORDER BY id')
+        return self._iter_rows('''
+            SELECT * FROM vaccination_history WHERE cattle_id = ?
+            ORDER BY vaccination_date DESC, id DESC
+        ''', (cattle_id,))
+    
+    def iter_births(self, start_date, end_date):
+        """Partos entre dos fechas (idx_events_type_date) con los datos de la vaca"""
+        self.flush_writes()
+        return self._iter_rows('''
+            SELECT e.event_date, e.notes, c.id AS cattle_id, c.tag_number, c.name, c.category
+            FROM events e JOIN cattle c ON c.id = e.cattle_id
+            WHERE e.event_type = 'birth' AND e.event_date BETWEEN ? AND ?
+            ORDER BY e.event_date, e.id
+        ''', (start_date, end_date))
+    
+    def iter_agenda(self, section, limit=None):
+        """Una sección de la agenda (AGENDA_SECTIONS) como iterador"""
+        self.flush_writes()
+        now = datetime.now()
+        today = now.strftime('%Y-%m-%d')
+        future_30 = (now + timedelta(days=30)).strftime('%Y-%m-%d')
+        future_60 = (now + timedelta(days=60)).strftime('%Y-%m-%d')
+        # Cada sección es un rango sobre idx_calendar_type_date
+        columns, task_type, condition, order, params = {
+            'to_dry': ('c.*', 'dry_off', 'k.task_date BETWEEN ? AND ?', 'k.task_date', (today, future_30)),
+            'near_birth': ('c.*', 'calving', 'k.task_date BETWEEN ? AND ?', 'k.task_date', (today, future_60)),
+            'overdue': ('c.*', 'calving', 'k.task_date < ?', 'k.task_date', (today,)),
+            'recent_births': ('c.*', 'postpartum_check', 'k.task_date >= ?', 'k.task_date DESC', (today,)),
+            # Vacunas por protocolo: incluye las ya vencidas
+            'need_vaccine': ('c.*, k.detail AS vaccine_name, k.task_date AS next_vaccination_date',
+                             'vaccination', 'k.task_date <= ?', 'k.task_date', (future_30,)),
+        }[section]
+        return self._iter_rows(f'''
+            SELECT {columns} FROM calendar k
+            JOIN cattle c ON c.id = k.cattle_id
+            WHERE k.task_type = ? AND {condition}
+            ORDER BY {order}
+            LIMIT ?
+        ''', (task_type,) + params + (-1 if limit is None else limit,))
+    
+    def get_cattle_by_id(self, cattle_id):
+        conn = self.get_connection()
+        cursor = conn.cursor()
+        cursor.execute('SELECT * FROM cattle WHERE id = ?', (cattle_id,))
+        columns = [desc[0] for desc in cursor.description]
+        row = cursor.fetchone()
+        conn.close()
+        return dict(zip(columns, row)) if row else None
+    
+    def get_cattle_detail(self, cattle_id):
+        """Ficha de la pantalla de detalle: {'cattle', 'timeline'} (caché LRU)
+        
+        Cada ficha guarda la versión de datos con que se leyó: lo que escriben
+        otros procesos (cron, rfid, cattle.py, sync) cambia la versión y se relee.
+        """
+        version = self.get_data_version()
+        with self.detail_lock:
+            entry = self.detail_cache.get(cattle_id)
+            if entry is not None:
+                if entry[0] == version:
+                    self.detail_cache.move_to_end(cattle_id)
+                    return entry[1]
+                del self.detail_cache[cattle_id]
+        return self._load_detail(cattle_id, version)
+    
+    def _load_detail(self, cattle_id, version):
+        generation = self.detail_generation
+        cattle = self.get_cattle_by_id(cattle_id)
+        if cattle is None:
+            return None
+        detail = {'cattle': cattle, 'timeline': self.get_timeline(cattle_id, None, TIMELINE_PAGE)}
+        with self.detail_lock:
+            # Si hubo una escritura mientras se leía, el resultado no se guarda
+            if generation == self.detail_generation:
+                self.detail_cache[cattle_id] = (version, detail)
+                self.detail_cache.move_to_end(cattle_id)
+                while len(self.detail_cache) > DETAIL_CACHE_SIZE:
+                    self.detail_cache.popitem(last=False)
+        return detail
+    
+    def invalidate_detail(self, cattle_ids=None):
+        # Llamado por cada escritura; None = vaciar toda la caché
+        with self.detail_lock:
+            self.detail_generation += 1
+            if cattle_ids is None:
+                self.detail_cache.clear()
+            else:
+                for cattle_id in cattle_ids:
+                    self.detail_cache.pop(cattle_id, None)
+    
+    def invalidate_caches(self):
+        # Cambios masivos (importación, sincronización): todo se recarga
+        self.invalidate_detail()
+        with self.tag_lock:
+            self.tags = None
+            self.tag_ids = None
+            self.tag_keys = None
+    
+    # --- Índice de aretes en memoria (búsqueda mientras se escribe) ---
+    
+    def _load_tag_index(self):
+        # Se llama con tag_lock tomado; orden BINARY de SQLite = orden de str (cada
+        # prefijo queda contiguo para bisect); tag_keys guarda el orden natural (tag_sort)
+        if self.tags is None:
+            conn = self.get_connection()
+            rows = conn.execute('SELECT tag_number, id, tag_sort FROM cattle ORDER BY tag_number').fetchall()
+            conn.close()
+            self.tags = [row[0] for row in rows]
+            self.tag_ids = [row[1] for row in rows]
+            self.tag_keys = [row[2] for row in rows]
+    
+    def warm_tag_index(self):
+        # Construye el índice en segundo plano antes de la primera tecla
+        if self.tags is None:
+            threading.Thread(target=self.find_tags, args=('',), daemon=True).start()
+    
+    def _tag_index_add(self, tag_number, cattle_id):
+        with self.tag_lock:
+            if self.tags is not None:
+                pos = bisect.bisect_left(self.tags, tag_number)
+                self.tags.insert(pos, tag_number)
+                self.tag_ids.insert(pos, cattle_id)
+                self.tag_keys.insert(pos, natural_tag_key(tag_number))
+    
+    def _tag_index_remove(self, cattle_id):
+        with self.tag_lock:
+            if self.tags is not None and cattle_id in self.tag_ids:
+                pos = self.tag_ids.index(cattle_id)
+                del self.tags[pos]
+                del self.tag_ids[pos]
+                del self.tag_keys[pos]
+    
+    def find_tags(self, prefix, limit=None):
+        """ids de las vacas cuyo arete empieza con prefix, en orden natural (como la lista)"""
+        with self.tag_lock:
+            self._load_tag_index()
+            start = bisect.bisect_left(self.tags, prefix)
+            end = bisect.bisect_left(self.tags, prefix + '\U0010ffff', start)
+            # Mismo orden que ORDER BY tag_sort, tag_number: "200" antes que "1000"
+            order = sorted(range(start, end), key=lambda i: (self.tag_keys[i], self.tags[i]))
+            return [self.tag_ids[i] for i in order[:limit]]
+    
+    def prefetch_details(self, cattle_ids):
+        # Carga en segundo plano las fichas vecinas de la lista
+        version = self.get_data_version()
+        with self.detail_lock:
+            missing = [cid for cid in cattle_ids
+                       if self.detail_cache.get(cid, (None,))[0] != version]
+        if missing:
+            threading.Thread(target=self._prefetch, args=(missing, version), daemon=True).start()
+    
+    def _prefetch(self, cattle_ids, version):
+        for cattle_id in cattle_ids:
+            try:
+                self._load_detail(cattle_id, version)
+            except Exception as e:
+                print(f"[ERROR] prefetch_details: {e}")
+    
+    def get_cattle_page(self, after_tag=None, limit=50):
+        # Paginación por llave en orden natural (idx_cattle_tag_sort): sin OFFSET
+        after = (natural_tag_key(after_tag), after_tag) if after_tag is not None else ('', '')
+        conn = self.get_connection()
+        cursor = conn.cursor()
+        cursor.execute('''
+            SELECT * FROM cattle
+            WHERE tag_sort >= ? AND (tag_sort > ? OR tag_number > ?)
+            ORDER BY tag_sort, tag_number
+            LIMIT ?
+        ''', (after[0], after[0], after[1], limit))
+        columns = [desc[0] for desc in cursor.description]
+        cattle_list = [dict(zip(columns, row)) for row in cursor.fetchall()]
+        conn.close()
+        return cattle_list
+    
+    def get_history_page(self, cattle_id, kind='events', before=None, limit=50):
+        # Historial de una vaca por páginas: before = (fecha, id) del último recibido
+        table, date_col = {
+            'events': ('events', 'event_date'),
+            'vaccinations': ('vaccination_history', 'vaccination_date'),
+        }[kind]
+        before_date, before_id = before or ('9999-12-31', 2 ** 62)
+        conn = self.get_connection()
+        cursor = conn.cursor()
+        cursor.execute(f'''
+            SELECT * FROM {table}
+            WHERE cattle_id = ?
+            AND {date_col} <= ? AND ({date_col} < ? OR id < ?)
+            ORDER BY {date_col} DESC, id DESC
+            LIMIT ?
+        ''', (cattle_id, before_date, before_date, before_id, limit))
+        columns = [desc[0] for desc in cursor.description]
+        rows = [dict(zip(columns, row)) for row in cursor.fetchall()]
+        conn.close()
+        return rows
+    
+    def get_timeline(self, cattle_id, before=None, limit=30):
+        """Eventos, vacunas y actividad de una vaca, de lo más nuevo a lo más viejo
+        
+        before = (fecha, tipo, id) del último elemento recibido; cada rama
+        recorre su índice (cattle_id, fecha) y solo lee limit filas.
+        """
+        branches = [
+            ('vaccination', 'vaccination_history', 'vaccination_date', 'vaccine_name', 'next_vaccination_date'),
+            ('event', 'events', 'event_date', 'event_type', 'notes'),
+            ('activity', 'activity_log', 'activity_date', 'activity_type', 'description'),
+        ]
+        selects = []
+        params = []
+        for kind, table, date_col, title_col, detail_col in branches:
+            where = 'cattle_id = ?'
+            branch_params = [cattle_id]
+            if before is not None:
+                before_date, before_kind, before_id = before
+                # Orden total: fecha DESC, tipo DESC, id DESC
+                if kind > before_kind:
+                    where += f' AND {date_col} < ?'
+                    branch_params.append(before_date)
+                elif kind < before_kind:
+                    where += f' AND {date_col} <= ?'
+                    branch_params.append(before_date)
+                else:
+                    where += f' AND {date_col} <= ? AND ({date_col} < ? OR id < ?)'
+                    branch_params += [before_date, before_date, before_id]
+            selects.append(f'''
+                SELECT * FROM (
+                    SELECT '{kind}' AS kind, id, {date_col} AS date,
+                           {title_col} AS title, {detail_col} AS detail, uid
+                    FROM {table}
+                    WHERE {where}
+                    ORDER BY {date_col} DESC, id DESC
+                    LIMIT ?
+                )
+            ''')
+            params += branch_params + [limit]
+        # La cola se lee antes que la base: una fila guardada entre ambas lecturas
+        # aparece en las dos (se descarta por uid) y nunca en ninguna
+        queued = {}
+        if before is None:
+            queued = {table: self.write_queue.pending_rows(table) for kind, table, *cols in branches}
+        conn = self.get_connection()
+        cursor = conn.cursor()
+        cursor.execute(' UNION ALL '.join(selects) + ' ORDER BY date DESC, kind DESC, id DESC LIMIT ?',
+                       params + [limit])
+        columns = [desc[0] for desc in cursor.description]
+        items = [dict(zip(columns, row)) for row in cursor.fetchall()]
+        conn.close()
+        if before is None:
+            # Lo que sigue en la cola de escritura es lo más reciente
+            pending = []
+            saved = {item['uid'] for item in items}
+            for kind, table, date_col, title_col, detail_col in branches:
+                for row in queued[table]:
+                    if row['cattle_id'] == cattle_id and row['uid'] not in saved:
+                        pending.append({'kind': kind, 'id': None, 'date': row.get(date_col),
+                                        'title': row.get(title_col), 'detail': row.get(detail_col),
+                                        'uid': row['uid']})
+            pending.sort(key=lambda r: r['date'] or '', reverse=True)
+            items = pending + items
+        return items
+    
+    def get_data_version(self):
+        # Sube con cada escritura sincronizable (change_log) o cambio de protocolo;
+        # incluye la fecha porque agenda y estadísticas dependen de "hoy"
+        conn = self.get_connection()
+        cursor = conn.cursor()
+        cursor.execute('''
+            SELECT name, seq FROM sqlite_sequence
+            WHERE name IN ('change_log', 'vaccination_config')
+        ''')
+        seqs = dict(cursor.fetchall())
+        # Los pesajes y lo que se escribe sin change_log (sync, limpieza) llevan
+        # su propio contador; las fotos diarias cuentan por su último día
+        cursor.execute('''
+            SELECT (SELECT value FROM sync_state WHERE key = 'weights_version'),
+                   (SELECT value FROM sync_state WHERE key = 'data_version'),
+                   (SELECT MAX(day) FROM herd_snapshots)
+        ''')
+        weights, unlogged, snapshot_day = cursor.fetchone()
+        conn.close()
+        pending = self.write_queue.pending_count()
+        return (f"{seqs.get('change_log', 0)}.{seqs.get('vaccination_config', 0)}.{weights or 0}."
+                f"{unlogged or 0}.{pending}.{(snapshot_day or '0').replace('-', '')}."
+                f"{datetime.now().strftime('%Y%m%d')}")
+    
+    def search_cattle(self, query, limit=None):
+        conn = self.get_connection()
+        cursor = conn.cursor()
+        search_term = f"%{query}%"
+        cursor.execute('''
+            SELECT * FROM cattle 
+            WHERE tag_number LIKE ? OR name LIKE ?
+            ORDER BY tag_sort, tag_number
+            LIMIT ?
+        ''', (search_term, search_term, -1 if limit is None else limit))
+        columns = [desc[0] for desc in cursor.description]
+        cattle_list = [dict(zip(columns, row)) for row in cursor.fetchall()]
+        conn.close()
+        return cattle_list
+    
+    @retry_locked
+    def delete_cattle(self, cattle_id):
+        self.flush_writes()
+        conn = self.get_connection()
+        cursor = conn.cursor()
+        # Historial, vacunas, actividad y calendario se borran en cascada
+        cursor.execute('DELETE FROM cattle WHERE id = ?', (cattle_id,))
+        cursor.execute('DELETE FROM weights WHERE cattle_id = ?', (cattle_id,))
+        cursor.execute('DELETE FROM weight_gain WHERE cattle_id = ?', (cattle_id,))
+        conn.commit()
+        conn.close()
+        self.invalidate_detail([cattle_id])
+        self._tag_index_remove(cattle_id)
+    
+    def add_vaccination(self, cattle_id, vaccine_name, vaccination_date, next_date, notes=''):
+        # Se encola; WriteQueue lo guarda junto con las demás escrituras
+        self.write_queue.put('vaccination_history',
+                             ('cattle_id', 'vaccine_name', 'vaccination_date',
+                              'next_vaccination_date', 'notes'),
+                             (cattle_id, vaccine_name, vaccination_date, next_date, notes))
+        self.invalidate_detail([cattle_id])
+    
+    def get_vaccinations(self, cattle_id):
+        pending = [v for v in self.write_queue.pending_rows('vaccination_history')
+                   if v['cattle_id'] == cattle_id]
+        conn = self.get_connection()
+        cursor = conn.cursor()
+        cursor.execute('''
+            SELECT * FROM vaccination_history 
+            WHERE cattle_id = ?
+            ORDER BY vaccination_date DESC
+        ''', (cattle_id,))
+        columns = [desc[0] for desc in cursor.description]
+        vaccinations = [dict(zip(columns, row)) for row in cursor.fetchall()]
+        conn.close()
+        return self._merge_pending(vaccinations, pending, 'vaccination_date')
+    
+    def add_event(self, cattle_id, event_type, event_date, notes=''):
+        self.write_queue.put('events',
+                             ('cattle_id', 'event_type', 'event_date', 'notes'),
+                             (cattle_id, event_type, event_date, notes))
+        self.invalidate_detail([cattle_id])
+    
+    def get_events(self, cattle_id):
+        pending = [e for e in self.write_queue.pending_rows('events')
+                   if e['cattle_id'] == cattle_id]
+        conn = self.get_connection()
+        cursor = conn.cursor()
+        cursor.execute('''
+            SELECT * FROM events 
+            WHERE cattle_id = ?
+            ORDER BY event_date DESC
+        ''', (cattle_id,))
+        columns = [desc[0] for desc in cursor.description]
+        events = [dict(zip(columns, row)) for row in cursor.fetchall()]
+        conn.close()
+        return self._merge_pending(events, pending, 'event_date')
+    
+    def add_activity_log(self, cattle_id, activity_type, description):
+        # La fecha se fija al encolar (UTC, igual que CURRENT_TIMESTAMP)
+        activity_date = datetime.now(timezone.utc).strftime('%Y-%m-%d %H:%M:%S')
+        self.write_queue.put('activity_log',
+                             ('cattle_id', 'activity_type', 'description', 'activity_date'),
+                             (cattle_id, activity_type, description, activity_date))
+        self.invalidate_detail([cattle_id])
+    
+    def get_activity_log(self, limit=50):
+        pending = self.write_queue.pending_rows('activity_log')
+        conn = self.get_connection()
+        cursor = conn.cursor()
+        cursor.execute('''
+            SELECT al.*, c.tag_number, c.name
+            FROM activity_log al
+            CROSS JOIN cattle c ON al.cattle_id = c.id   -- CROSS: siempre desde idx_activity_date
+            ORDER BY al.activity_date DESC, al.id DESC
+            LIMIT ?
+        ''', (limit,))
+        columns = [desc[0] for desc in cursor.description]
+        activities = [dict(zip(columns, row)) for row in cursor.fetchall()]
+        if pending:
+            ids = sorted({p['cattle_id'] for p in pending})
+            cursor.execute(f'''
+                SELECT id, tag_number, name FROM cattle
+                WHERE id IN ({', '.join('?' * len(ids))})
+            ''', ids)
+            known = {row[0]: row[1:] for row in cursor.fetchall()}
+            for p in pending:
+                if p['cattle_id'] in known:
+                    p['id'] = None
+                    p['tag_number'], p['name'] = known[p['cattle_id']]
+            pending = [p for p in pending if 'tag_number' in p]
+        conn.close()
+        return self._merge_pending(activities, pending, 'activity_date')[:limit]
+    
+    def _merge_pending(self, rows, pending, date_key):
+        # Una fila del lote que se guardaba mientras se leía puede venir ya en rows
+        saved = {r.get('uid') for r in rows}
+        pending = [p for p in pending if p['uid'] not in saved]
+        if not pending:
+            return rows
+        # Las pendientes son las más nuevas; orden estable por fecha descendente
+        merged = list(reversed(pending)) + rows
+        merged.sort(key=lambda r: r.get(date_key) or '', reverse=True)
+        return merged
+    
+    def find_tag(self, tag_number):
+        """id de la vaca con ese arete exacto (índice en memoria) o None"""
+        with self.tag_lock:
+            self._load_tag_index()
+            pos = bisect.bisect_left(self.tags, tag_number)
+            if pos < len(self.tags) and self.tags[pos] == tag_number:
+                return self.tag_ids[pos]
+        return None
+    
+    def apply_quick_command(self, command):
+        # "vacuné 123", "secé 456", "parió 789", "cargué 101" -> descripción o None
+        command = (command or '').strip().lower()
+        arete_match = re.search(r'(\d+)', command)
+        if not arete_match:
+            return None
+        action = next((action for word, action in QUICK_ACTIONS if word in command), None)
+        if action is None:
+            return None
+        
+        arete = arete_match.group(1)
+        cattle_id = self.find_tag(arete)
+        if cattle_id is None:
+            cattle_list = self.search_cattle(arete, 1)
+            if not cattle_list:
+                return None
+            cattle_id, arete = cattle_list[0]['id'], cattle_list[0]['tag_number']
+        
+        return f"{arete} - {self.apply_action(cattle_id, action)}"
+    
+    def apply_action(self, cattle_id, action):
+        """Aplica una acción rápida (QUICK_ACTIONS) a una vaca; devuelve la descripción"""
+        today = datetime.now().strftime('%Y-%m-%d')
+        
+        if action == 'vaccination':
+            vaccine_name = self.vaccinate(cattle_id, vaccination_date=today)
+            description = f'Vacunación: {vaccine_name}'
+        
+        elif action == 'drying':
+            description = 'Secado'
+            self.add_event(cattle_id, 'drying', today, 'Secado')
+        
+        elif action == 'birth':
+            description = 'Parto'
+            self.update_cattle(cattle_id, {
+                'is_pregnant': 0,
+                'last_birth_date': today,
+                'pregnancy_date': None,
+                'expected_birth_date': None
+            })
+            self.add_event(cattle_id, 'birth', today, 'Parto')
+        
+        elif action == 'pregnancy':
+            expected_date = calculate_expected_birth(today)
+            description = f'Preñada ({expected_date})'
+            self.update_cattle(cattle_id, {
+                'is_pregnant': 1,
+                'pregnancy_date': today,
+                'expected_birth_date': expected_date
+            })
+        
+        else:
+            raise ValueError(action)
+        
+        self.add_activity_log(cattle_id, action, description)
+        return description
+    
+    @retry_locked
+    def apply_batch(self, action, reads, vaccine_name=GENERAL_VACCINE, day=None, describe=False):
+        """Aplica una acción a muchas vacas en una sola transacción
+        
+        reads: [(cattle_id, kg)] (kg solo para 'weight'); vaccine_name=None aplica a
+        cada vaca su vacuna más atrasada (como vaccinate). Devuelve cuántas se
+        guardaron, o {cattle_id: descripción} con describe=True.
+        """
+        if not reads:
+            return {} if describe else 0
+        day = day or datetime.now().strftime('%Y-%m-%d')
+        stamp = datetime.now(timezone.utc).strftime('%Y-%m-%d %H:%M:%S')
+        ids = [cattle_id for cattle_id, kg in reads]
+        conn = self.get_connection()
+        cursor = conn.cursor()
+        try:
+            # Vacas borradas desde la lectura se descartan: una sola haría fallar el lote (FK)
+            alive = set()
+            for start in range(0, len(ids), 500):
+                chunk = ids[start:start + 500]
+                cursor.execute(f"SELECT id FROM cattle WHERE id IN ({', '.join('?' * len(chunk))})", chunk)
+                alive.update(row[0] for row in cursor.fetchall())
+            if len(alive) < len(set(ids)):
+                print(f"[ERROR] apply_batch: vacas borradas descartadas {sorted(set(ids) - alive)}")
+                reads = [(cattle_id, kg) for cattle_id, kg in reads if cattle_id in alive]
+                ids = [cattle_id for cattle_id, kg in reads]
+            if action == 'vaccination':
+                due = self.due_vaccines(cursor, ids) if vaccine_name is None else {}
+                names = [(cattle_id, due.get(cattle_id, vaccine_name or GENERAL_VACCINE)) for cattle_id in ids]
+                # Próxima fecha según el protocolo de la categoría (igual que vaccinate)
+                cursor.executemany('''
+                    INSERT INTO vaccination_history
+                        (cattle_id, vaccine_name, vaccination_date, next_vaccination_date, notes)
+                    SELECT c.id, ?, ?,
+                           (SELECT date(?, '+' || p.interval_days || ' days') FROM vaccination_config p
+                            WHERE (p.category IS NULL OR p.category = c.category) AND p.vaccine_name = ?
+                            ORDER BY p.category IS NULL LIMIT 1),
+                           ''
+                    FROM cattle c WHERE c.id = ?
+                ''', [(name, day, day, name, cattle_id) for cattle_id, name in names])
+                activity = [(cattle_id, f'Vacunación: {name}') for cattle_id, name in names]
+            elif action == 'weight':
+                reads = [(cattle_id, kg) for cattle_id, kg in reads if kg]
+                cursor.executemany(f'''
+                    INSERT INTO weights (cattle_id, day, kg) VALUES (?, {EPOCH_DAY_SQL.format('?')}, ?)
+                    ON CONFLICT (cattle_id, day) DO UPDATE SET kg = excluded.kg
+                ''', [(cattle_id, day, kg) for cattle_id, kg in reads])
+                ids = [cattle_id for cattle_id, kg in reads]
+                self.refresh_weight_gain(cursor, ids)
+                self._bump_weights_version(cursor)
+                activity = [(cattle_id, f'Pesaje: {kg} kg') for cattle_id, kg in reads]
+            elif action in ('drying', 'birth', 'pregnancy'):
+                for start in range(0, len(ids), 500):
+                    chunk = ids[start:start + 500]
+                    marks = ', '.join('?' * len(chunk))
+                    if action == 'birth':
+                        cursor.execute(f'''
+                            UPDATE cattle SET is_pregnant = 0, last_birth_date = ?,
+                                pregnancy_date = NULL, expected_birth_date = NULL
+                            WHERE id IN ({marks})
+                        ''', [day] + chunk)
+                    elif action == 'pregnancy':
+                        cursor.execute(f'''
+                            UPDATE cattle SET is_pregnant = 1, pregnancy_date = ?, expected_birth_date = ?
+                            WHERE id IN ({marks})
+                        ''', [day, calculate_expected_birth(day)] + chunk)
+                if action != 'pregnancy':
+                    note = 'Secado' if action == 'drying' else 'Parto'
+                    cursor.executemany('''
+                        INSERT INTO events (cattle_id, event_type, event_date, notes) VALUES (?, ?, ?, ?)
+                    ''', [(cattle_id, action, day, note) for cattle_id in ids])
+                    description = note
+                else:
+                    description = f'Preñada ({calculate_expected_birth(day)})'
+                activity = [(cattle_id, description) for cattle_id in ids]
+            else:
+                raise ValueError(action)
+            cursor.executemany('''
+                INSERT INTO activity_log (cattle_id, activity_type, description, activity_date)
+                VALUES (?, ?, ?, ?)
+            ''', [(cattle_id, action, description, stamp) for cattle_id, description in activity])
+            if action in ('vaccination', 'birth', 'pregnancy'):
+                self.refresh_calendar(cursor, ids)
+            conn.commit()
+        except Exception:
+            conn.rollback()
+            raise
+        finally:
+            conn.close()
+        self.invalidate_detail(ids)
+        return dict(activity) if describe else len(activity)
+    
+    def import_cattle(self, rows):
+        """Alta masiva (CSV, otra app) en una transacción -> (altas, aretes repetidos, inválidas)
+        
+        Fechas 'YYYY-MM-DD' o 'DD/MM/YYYY'; una fila con fecha o preñez ilegible se omite.
+        """
+        columns = ('tag_number', 'name', 'birth_date', 'weight', 'category',
+                   'is_pregnant', 'pregnancy_date', 'expected_birth_date',
+                   'last_birth_date', 'notes')
+        dates = ('birth_date', 'pregnancy_date', 'expected_birth_date', 'last_birth_date')
+        values = []
+        invalid = 0
+        for row in rows:
+            if not row.get('tag_number'):
+                continue
+            data = {c: (row.get(c) if row.get(c) not in ('', None) else None) for c in columns}
+            try:
+                for c in dates:
+                    if data[c] is not None:
+                        data[c] = parse_date(data[c])
+                        # parse_date no revisa el calendario: 2024-02-30 falla aquí
+                        date.fromisoformat(data[c] or '')
+                data['is_pregnant'] = int(data['is_pregnant'] or 0)
+            except ValueError:
+                invalid += 1
+                continue
+            if data['is_pregnant'] and data['pregnancy_date'] and not data['expected_birth_date']:
+                data['expected_birth_date'] = calculate_expected_birth(data['pregnancy_date'])
+            values.append(tuple(data[c] for c in columns))
+        inserted = self._insert_cattle(columns, values)
+        if inserted:
+            self.invalidate_caches()
+        return inserted, len(values) - inserted, invalid
+    
+    @retry_locked
+    def _insert_cattle(self, columns, values):
+        conn = self.get_connection()
+        cursor = conn.cursor()
+        cursor.execute('SELECT COUNT(*) FROM cattle')
+        before = cursor.fetchone()[0]
+        cursor.execute('SELECT COALESCE(MAX(id), 0) FROM cattle')
+        last_id = cursor.fetchone()[0]
+        cursor.executemany(f'''
+            INSERT OR IGNORE INTO cattle ({', '.join(columns)})
+            VALUES ({', '.join('?' * len(columns))})
+        ''', values)
+        cursor.execute('SELECT id FROM cattle WHERE id > ?', (last_id,))
+        self.refresh_calendar(cursor, [row[0] for row in cursor.fetchall()])
+        cursor.execute('SELECT COUNT(*) FROM cattle')
+        inserted = cursor.fetchone()[0] - before
+        conn.commit()
+        conn.close()
+        return inserted
+    
+    def get_inventory(self):
+        """Existencias por categoría: vacas, preñadas y peso promedio"""
+        self.flush_writes()
+        return list(self._iter_rows('''
+            SELECT COALESCE(category, 'Sin categoría') AS category, COUNT(*) AS total,
+                   SUM(is_pregnant = 1) AS pregnant, ROUND(AVG(weight), 1) AS avg_weight
+            FROM cattle GROUP BY 1 ORDER BY 2 DESC
+        '''))
+    
+    def get_statistics(self):
+        self.flush_writes()
+        conn = self.get_connection()
+        cursor = conn.cursor()
+        stats = {}
+        
+        cursor.execute('SELECT COUNT(*) FROM cattle')
+        stats['total_cattle'] = cursor.fetchone()[0]
+        
+        cursor.execute('SELECT COUNT(*) FROM cattle WHERE is_pregnant = 1')
+        stats['pregnant'] = cursor.fetchone()[0]
+        
+        # Conteos por rango sobre el calendario (idx_calendar_type_date)
+        today = datetime.now().strftime('%Y-%m-%d')
+        future_30 = (datetime.now() + timedelta(days=30)).strftime('%Y-%m-%d')
+        future_60 = (datetime.now() + timedelta(days=60)).strftime('%Y-%m-%d')
+        count_tasks = '''
+            SELECT COUNT(*) FROM calendar
+            WHERE task_type = ? AND task_date BETWEEN ? AND ?
+        '''
+        cursor.execute(count_tasks, ('calving', today, future_60))
+        stats['near_birth_60'] = cursor.fetchone()[0]
+        
+        # Parto en 60-90 días <=> fecha límite de secado en los próximos 30
+        cursor.execute(count_tasks, ('dry_off', today, future_30))
+        stats['to_dry'] = cursor.fetchone()[0]
+        
+        # Parto en los últimos 30 días <=> revisión post-parto de hoy en adelante
+        cursor.execute('''
+            SELECT COUNT(*) FROM calendar
+            WHERE task_type = 'postpartum_check' AND task_date >= ?
+        ''', (today,))
+        stats['recent_births'] = cursor.fetchone()[0]
+        
+        year_start = f"{datetime.now().year}-01-01"
+        cursor.execute('''
+            SELECT COUNT(*) FROM events 
+            WHERE event_type = 'birth' 
+            AND event_date >= ?
+        ''', (year_start,))
+        stats['births_this_year'] = cursor.fetchone()[0]
+        
+        cursor.execute('SELECT AVG(weight) FROM cattle WHERE weight IS NOT NULL')
+        avg_weight = cursor.fetchone()[0]
+        stats['avg_weight'] = round(avg_weight, 1) if avg_weight else 0
+        
+        # Ganancia diaria promedio (kg/día) de las vacas pesadas en los últimos 90 días
+        cursor.execute(f'''
+            SELECT AVG(adg_30) FROM weight_gain
+            WHERE adg_30 IS NOT NULL AND last_day >= {EPOCH_DAY_SQL.format("'now'")} - 90
+        ''')
+        avg_gain = cursor.fetchone()[0]
+        stats['avg_daily_gain'] = round(avg_gain, 2) if avg_gain else 0
+        
+        # % PARTOS/AÑO
+        two_years_ago = (datetime.now() - timedelta(days=730)).strftime('%Y-%m-%d')
+        cursor.execute('SELECT COUNT(*) FROM cattle')
+        total_cows = cursor.fetchone()[0]
+        cursor.execute('''
+            SELECT COUNT(*) FROM events 
+            WHERE event_type = 'birth' 
+            AND event_date >= ?
+        ''', (two_years_ago,))
+        births_2y = cursor.fetchone()[0]
+        
+        if total_cows > 0:
+            births_per_cow = births_2y / total_cows
+            stats['birth_rate_annual'] = round((births_per_cow / 2) * 100, 1)
+        else:
+            stats['birth_rate_annual'] = 0
+        
+        conn.close()
+        return stats
+    
+    # --- Pesajes ----------------------------------------------------------
+    
+    @retry_locked
+    def add_weight(self, cattle_id, kg, weigh_date=None):
+        conn = self.get_connection()
+        cursor = conn.cursor()
+        self._record_weight(cursor, cattle_id, kg, weigh_date)
+        conn.commit()
+        conn.close()
+        self.invalidate_detail([cattle_id])
+    
+    def _record_weight(self, cursor, cattle_id, kg, weigh_date=None):
+        weigh_date = weigh_date or datetime.now().strftime('%Y-%m-%d')
+        cursor.execute(f'''
+            INSERT INTO weights (cattle_id, day, kg) VALUES (?, {EPOCH_DAY_SQL.format('?')}, ?)
+            ON CONFLICT (cattle_id, day) DO UPDATE SET kg = excluded.kg
+        ''', (cattle_id, weigh_date, kg))
+        self.refresh_weight_gain(cursor, [cattle_id])
+        self._bump_weights_version(cursor)
+    
+    def _bump_weights_version(self, cursor):
+        cursor.execute('''
+            INSERT INTO sync_state (key, value) VALUES ('weights_version', 1)
+            ON CONFLICT (key) DO UPDATE SET value = value + 1
+        ''')
+    
+    def import_weights(self, rows):
+        """Carga masiva de la báscula: filas con arete, fecha y peso -> (guardados, desconocidos)"""
+        staged = []
+        for row in rows:
+            tag = row.get('tag_number') or row.get('arete') or row.get('eid')
+            kg = row.get('kg') or row.get('weight') or row.get('peso')
+            day = parse_date(row.get('date') or row.get('fecha'))
+            if not tag or not kg or day is None:
+                continue
+            staged.append((str(tag).strip(), day, float(kg)))
+        saved, touched = self._save_weights(staged)
+        self.invalidate_detail(touched)
+        return saved, len(staged) - saved
+    
+    @retry_locked
+    def _save_weights(self, staged):
+        conn = self.get_connection()
+        cursor = conn.cursor()
+        cursor.execute('CREATE TEMP TABLE IF NOT EXISTS weigh_import (tag_number TEXT, day TEXT, kg REAL)')
+        cursor.execute('DELETE FROM weigh_import')
+        cursor.executemany('INSERT INTO weigh_import VALUES (?, ?, ?)', staged)
+        cursor.execute(f'''
+            INSERT INTO weights (cattle_id, day, kg)
+            SELECT c.id, {EPOCH_DAY_SQL.format('w.day')}, w.kg
+            FROM weigh_import w JOIN cattle c ON c.tag_number = w.tag_number
+            WHERE julianday(w.day) IS NOT NULL
+            ON CONFLICT (cattle_id, day) DO UPDATE SET kg = excluded.kg
+        ''')
+        saved = cursor.rowcount
+        cursor.execute('''
+            SELECT DISTINCT c.id FROM weigh_import w JOIN cattle c ON c.tag_number = w.tag_number
+        ''')
+        touched = [row[0] for row in cursor.fetchall()]
+        self.refresh_weight_gain(cursor, touched)
+        self._bump_weights_version(cursor)
+        cursor.execute('DELETE FROM weigh_import')
+        conn.commit()
+        conn.close()
+        return saved, touched
+    
+    def refresh_weight_gain(self, cursor, cattle_ids=None):
+        # Último peso, ganancia diaria en ventanas de 30 y 90 días y cattle.weight
+        if cattle_ids is None:
+            chunks = [None]
+        else:
+            ids = sorted(set(cattle_ids))
+            chunks = [ids[i:i + 500] for i in range(0, len(ids), 500)]
+        short, long = GAIN_WINDOWS
+        for chunk in chunks:
+            cond = f"WHERE cattle_id IN ({', '.join('?' * len(chunk))})" if chunk else ''
+            params = chunk or []
+            cursor.execute(f'''
+                WITH last AS (
+                    SELECT cattle_id, MAX(day) AS day FROM weights {cond} GROUP BY cattle_id
+                ), base AS (
+                    SELECT l.cattle_id, l.day,
+                           (SELECT MAX(day) FROM weights p
+                            WHERE p.cattle_id = l.cattle_id AND p.day <= l.day - {short}) AS day_short,
+                           (SELECT MAX(day) FROM weights p
+                            WHERE p.cattle_id = l.cattle_id AND p.day <= l.day - {long}) AS day_long
+                    FROM last l
+                )
+                INSERT OR REPLACE INTO weight_gain (cattle_id, last_day, last_kg, adg_30, adg_90)
+                SELECT b.cattle_id, b.day, w.kg,
+                       ROUND((w.kg - ws.kg) / (b.day - b.day_short), 3),
+                       ROUND((w.kg - wl.kg) / (b.day - b.day_long), 3)
+                FROM base b
+                JOIN weights w ON w.cattle_id = b.cattle_id AND w.day = b.day
+                LEFT JOIN weights ws ON ws.cattle_id = b.cattle_id AND ws.day = b.day_short
+                LEFT JOIN weights wl ON wl.cattle_id = b.cattle_id AND wl.day = b.day_long
+            ''', params)
+            # cattle.weight sigue siendo el peso actual (estadísticas, lista)
+            cursor.execute(f'''
+                UPDATE cattle SET weight = (SELECT last_kg FROM weight_gain g WHERE g.cattle_id = cattle.id)
+                WHERE id IN (SELECT cattle_id FROM weight_gain {cond})
+                AND weight IS NOT (SELECT last_kg FROM weight_gain g WHERE g.cattle_id = cattle.id)
+            ''', params)
+    
+    def get_weight_gain(self, cattle_id):
+        conn = self.get_connection()
+        cursor = conn.cursor()
+        cursor.execute('''
+            SELECT date(last_day * 86400, 'unixepoch') AS last_date, last_kg, adg_30, adg_90
+            FROM weight_gain WHERE cattle_id = ?
+        ''', (cattle_id,))
+        columns = [desc[0] for desc in cursor.description]
+        row = cursor.fetchone()
+        conn.close()
+        return dict(zip(columns, row)) if row else None
+    
+    def get_weight_trend(self, start_date, end_date, bucket_days=None, points=60, cattle_id=None):
+        """Peso promedio por periodo: a lo más `points` puntos, agregados en SQL"""
+        start = parse_date(start_date)
+        end = parse_date(end_date)
+        conn = self.get_connection()
+        cursor = conn.cursor()
+        cursor.execute(f'SELECT {EPOCH_DAY_SQL.format("?")}, {EPOCH_DAY_SQL.format("?")}', (start, end))
+        start_day, end_day = cursor.fetchone()
+        if not bucket_days:
+            bucket_days = max(1, -(-(end_day - start_day + 1) // points))
+        where = 'day BETWEEN ? AND ?'
+        params = [start_day, end_day]
+        if cattle_id is not None:
+            where = 'cattle_id = ? AND ' + where
+            params.insert(0, cattle_id)
+        cursor.execute(f'''
+            SELECT date((? + (day - ?) / ? * ?) * 86400, 'unixepoch') AS date,
+                   ROUND(AVG(kg), 1) AS avg_kg, MIN(kg) AS min_kg, MAX(kg) AS max_kg,
+                   COUNT(*) AS weighings
+            FROM weights
+            WHERE {where}
+            GROUP BY (day - ?) / ?
+            ORDER BY 1
+        ''', [start_day, start_day, bucket_days, bucket_days] + params + [start_day, bucket_days])
+        columns = [desc[0] for desc in cursor.description]
+        trend = [dict(zip(columns, row)) for row in cursor.fetchall()]
+        conn.close()
+        return trend
+    
+    def get_herd_trends(self, months=12):
+        """Series mensuales para las gráficas: partos, preñadas y peso promedio"""
+        now = datetime.now()
+        keys = []
+        year, month = now.year, now.month
+        for _ in range(months):
+            keys.append(f"{year}-{month:02d}")
+            year, month = (year, month - 1) if month > 1 else (year - 1, 12)
+        keys.reverse()
+        first_day = f"{keys[0]}-01"
+        conn = self.get_connection()
+        cursor = conn.cursor()
+        
+        cursor.execute('''
+            SELECT substr(event_date, 1, 7), COUNT(*) FROM events
+            WHERE event_type = 'birth' AND event_date >= ?
+            GROUP BY 1
+        ''', (first_day,))
+        births = dict(cursor.fetchall())
+        
+        # Preñadas al cierre de cada mes pasado: la foto diaria (búsqueda por clave);
+        # el mes en curso se cuenta en vivo
+        values = ', '.join("(?, date(? || '-01', '+1 month', '-1 day'))" for _ in keys)
+        cursor.execute(f'''
+            WITH m(month, month_end) AS (VALUES {values})
+            SELECT m.month,
+                   CASE WHEN m.month_end >= ?
+                        THEN (SELECT COUNT(*) FROM cattle WHERE is_pregnant = 1)
+                        ELSE (SELECT s.pregnant FROM herd_snapshots s WHERE s.day <= m.month_end
+                              ORDER BY s.day DESC LIMIT 1)
+                   END
+            FROM m
+        ''', [v for k in keys for v in (k, k)] + [now.strftime('%Y-%m-%d')])
+        pregnant = dict(cursor.fetchall())
+        
+        cursor.execute(f'''
+            SELECT strftime('%Y-%m', day * 86400, 'unixepoch'), ROUND(AVG(kg), 1) FROM weights
+            WHERE day >= {EPOCH_DAY_SQL.format('?')}
+            GROUP BY 1
+        ''', (first_day,))
+        weights = dict(cursor.fetchall())
+        conn.close()
+        return {
+            'months': keys,
+            'births': [births.get(k, 0) for k in keys],
+            'pregnant': [pregnant.get(k) or 0 for k in keys],
+            'avg_weight': [weights.get(k) for k in keys],
+        }
+    
+    @retry_locked
+    def update_snapshots(self):
+        """Agrega las fotos diarias que faltan hasta ayer; devuelve cuántos días agregó
+        
+        La primera vez reconstruye hasta SNAPSHOT_HISTORY_DAYS días desde los partos
+        registrados y la preñez actual (como get_herd_trends). Un día ya guardado
+        no se vuelve a escribir.
+        """
+        self.flush_writes()
+        end = (datetime.now() - timedelta(days=1)).strftime('%Y-%m-%d')
+        conn = self.get_connection()
+        cursor = conn.cursor()
+        try:
+            cursor.execute('SELECT MAX(day) FROM herd_snapshots')
+            last = cursor.fetchone()[0]
+            if last is None:
+                cursor.execute(f'''
+                    SELECT MIN(day) FROM (
+                        SELECT MIN(COALESCE(date(birth_date), date(created_at))) AS day FROM cattle
+                        UNION ALL
+                        SELECT date(MIN(event_date), '-{GESTATION_DAYS} days') FROM events
+                        WHERE event_type = 'birth'
+                    )
+                ''')
+                first = cursor.fetchone()[0]
+                if first is None:
+                    return 0
+                start = max(first, (datetime.now() - timedelta(days=SNAPSHOT_HISTORY_DAYS)).strftime('%Y-%m-%d'))
+            else:
+                start = (datetime.strptime(last, '%Y-%m-%d') + timedelta(days=1)).strftime('%Y-%m-%d')
+            if start > end:
+                return 0
+            # Cada estado es un intervalo [desde, hasta): +n al entrar y -n al salir; la suma
+            # acumulada por fecha da el estado de cada día (incluye lo anterior a :start)
+            before = conn.total_changes
+            cursor.execute(f'''
+                WITH RECURSIVE days(day) AS (
+                    SELECT :start UNION ALL SELECT date(day, '+1 day') FROM days WHERE day < :end
+                ),
+                -- Gestaciones terminadas (partos, agrupados por fecha) y en curso
+                pregnancies(conceived, calving, pregnant_until, calving_until, n) AS (
+                    SELECT date(event_date, '-{GESTATION_DAYS} days'), date(event_date),
+                           date(event_date), date(event_date), COUNT(*)
+                    FROM events WHERE event_type = 'birth'
+                    GROUP BY event_date
+                    UNION ALL
+                    SELECT date(pregnancy_date), date(expected_birth_date),
+                           '9999-12-31', date(expected_birth_date, '+1 day'), 1
+                    FROM cattle WHERE is_pregnant = 1
+                ),
+                windows(conceived, near_from, near_until, dry_from, dry_until, pregnant_until, n) AS (
+                    -- Parto en los próximos 60 días / dentro de 60-90 días (para secar)
+                    SELECT conceived, MAX(conceived, date(calving, '-60 days')), calving_until,
+                           MAX(conceived, date(calving, '-{DRY_OFF_DAYS + 30} days')),
+                           date(calving, '-{DRY_OFF_DAYS - 1} days'), pregnant_until, n
+                    FROM pregnancies WHERE conceived IS NOT NULL
+                ),
+                deltas(day, total, pregnant, near_calving, to_dry) AS (
+                    SELECT COALESCE(date(birth_date), date(created_at)), COUNT(*), 0, 0, 0 FROM cattle GROUP BY 1
+                    UNION ALL SELECT conceived, 0, n, 0, 0 FROM windows
+                    UNION ALL SELECT pregnant_until, 0, -n, 0, 0 FROM windows
+                    UNION ALL SELECT near_from, 0, 0, n, 0 FROM windows WHERE near_from < near_until
+                    UNION ALL SELECT near_until, 0, 0, -n, 0 FROM windows WHERE near_from < near_until
+                    UNION ALL SELECT dry_from, 0, 0, 0, n FROM windows WHERE dry_from < dry_until
+                    UNION ALL SELECT dry_until, 0, 0, 0, -n FROM windows WHERE dry_from < dry_until
+                ),
+                timeline(day, total, pregnant, near_calving, to_dry) AS (
+                    SELECT day, SUM(total), SUM(pregnant), SUM(near_calving), SUM(to_dry) FROM deltas
+                    WHERE day IS NOT NULL AND day <= :end
+                    GROUP BY day
+                    UNION ALL
+                    SELECT day, 0, 0, 0, 0 FROM days
+                ),
+                running AS (
+                    -- Marco RANGE por omisión: las filas del mismo día comparten la suma
+                    SELECT day, SUM(total) OVER w AS total, SUM(pregnant) OVER w AS pregnant,
+                           SUM(near_calving) OVER w AS near_calving, SUM(to_dry) OVER w AS to_dry
+                    FROM timeline
+                    WINDOW w AS (ORDER BY day)
+                ),
+                births(day, births) AS (
+                    SELECT event_date, COUNT(*) FROM events
+                    WHERE event_type = 'birth' AND event_date BETWEEN :start AND :end
+                    GROUP BY event_date
+                )
+                INSERT OR IGNORE INTO herd_snapshots (day, total, pregnant, near_calving, to_dry, births)
+                SELECT DISTINCT r.day, r.total, r.pregnant, r.near_calving, r.to_dry, COALESCE(b.births, 0)
+                FROM running r LEFT JOIN births b ON b.day = r.day
+                WHERE r.day BETWEEN :start AND :end
+            ''', {'start': start, 'end': end})
+            # rowcount no se informa para sentencias que empiezan con WITH
+            added = conn.total_changes - before
+            conn.commit()
+        finally:
+            conn.close()
+        return added
+    
+    def get_herd_snapshots(self, start_date, end_date):
+        """Fotos diarias entre dos fechas (rango sobre la clave primaria)"""
+        return list(self._iter_rows('''
+            SELECT * FROM herd_snapshots WHERE day BETWEEN ? AND ? ORDER BY day
+        ''', (start_date, end_date)))
+    
+    def get_snapshot(self, day):
+        """Estado del hato al cierre de un día (la foto más reciente hasta esa fecha)"""
+        rows = list(self._iter_rows('''
+            SELECT * FROM herd_snapshots WHERE day <= ? ORDER BY day DESC LIMIT 1
+        ''', (day,)))
+        return rows[0] if rows else None
+    
+    def get_reproductive_report(self):
+        # KPIs reproductivos vectorizados (requiere numpy)
+        self.flush_writes()
+        import analytics
+        # Con la conexión de la clase: los informes leen de su foto
+        conn = self.get_connection()
+        try:
+            return analytics.reproductive_report(self.db_path, conn)
+        finally:
+            conn.close()
+    
+    def get_agenda_items(self, limit=None):
+        # limit: máximo de filas por sección (None = todas)
+        return {section: list(self.iter_agenda(section, limit)) for section in AGENDA_SECTIONS}
+
+
+class _PooledConnection(sqlite3.Connection):
+    # Cada hilo reutiliza su conexión: close() no la cierra
+    def close(self):
+        self.rollback()
+
+
+class ReadOnlyDatabase(Database):
+    """Database con una conexión de solo lectura por hilo (sin cola de escritura)"""
+    
+    def __init__(self, ranch=DEFAULT_RANCH):
+        self.ranch = ranch_slug(ranch)
+        self.db_path = ranch_db_path(self.ranch)
+        # Migrar el esquema una vez (igual que la app) y después solo leer
+        Database(ranch).close()
+        self._init_caches()
+        self.write_queue = NoWrites()
+        self.uri = f'file:{quote(self.db_path)}?mode=ro'
+        self.local = threading.local()
+    
+    def get_connection(self):
+        conn = getattr(self.local, 'conn', None)
+        if conn is None:
+            conn = sqlite3.connect(self.uri, uri=True, factory=_PooledConnection)
+            self.local.conn = conn
+        return conn
+
+
+def ranch_rollup(ranches=None):
+    """Resumen de varios ranchos: ATTACH de cada archivo y agregación en SQL"""
+    ranches = [ranch_slug(r) for r in (ranches or list_ranches())]
+    ranches = [r for r in ranches if os.path.exists(ranch_db_path(r))]
+    today = datetime.now().strftime('%Y-%m-%d')
+    future_30 = (datetime.now() + timedelta(days=30)).strftime('%Y-%m-%d')
+    future_60 = (datetime.now() + timedelta(days=60)).strftime('%Y-%m-%d')
+    year_start = f"{datetime.now().year}-01-01"
+    
+    rows = []
+    # SQLite limita los ATTACH por conexión (10 por defecto): lotes de 8
+    for start in range(0, len(ranches), 8):
+        batch = ranches[start:start + 8]
+        # Conexión URI para poder adjuntar cada archivo en solo lectura
+        conn = sqlite3.connect('file::memory:', uri=True)
+        cursor = conn.cursor()
+        parts = []
+        params = []
+        for i, ranch in enumerate(batch):
+            cursor.execute(f'ATTACH DATABASE ? AS r{i}', (f'file:{quote(ranch_db_path(ranch))}?mode=ro',))
+            parts.append(f'''
+                SELECT ? AS ranch,
+                       (SELECT COUNT(*) FROM r{i}.cattle) AS total_cattle,
+                       (SELECT COUNT(*) FROM r{i}.cattle WHERE is_pregnant = 1) AS pregnant,
+                       (SELECT COUNT(*) FROM r{i}.calendar
+                        WHERE task_type = 'calving' AND task_date BETWEEN ? AND ?) AS near_birth_60,
+                       (SELECT COUNT(*) FROM r{i}.calendar
+                        WHERE task_type = 'dry_off' AND task_date BETWEEN ? AND ?) AS to_dry,
+                       (SELECT COUNT(*) FROM r{i}.events
+                        WHERE event_type = 'birth' AND event_date >= ?) AS births_this_year,
+                       (SELECT COUNT(weight) FROM r{i}.cattle) AS weighed,
+                       (SELECT TOTAL(weight) FROM r{i}.cattle) AS weight_sum
+            ''')
+            params += [ranch, today, future_60, today, future_30, year_start]
+        cursor.execute(' UNION ALL '.join(parts), params)
+        columns = [desc[0] for desc in cursor.description]
+        rows += [dict(zip(columns, row)) for row in cursor.fetchall()]
+        conn.close()
+    
+    totals = {'ranch': 'total'}
+    for key in ('total_cattle', 'pregnant', 'near_birth_60', 'to_dry',
+                'births_this_year', 'weighed', 'weight_sum'):
+        totals[key] = sum(r[key] for r in rows)
+    for r in rows + [totals]:
+        r['avg_weight'] = round(r['weight_sum'] / r['weighed'], 1) if r['weighed'] else 0
+    return {'ranches': rows, 'total': totals}
+
+
+_DATE_RE = re.compile(r'(\d{4})-(\d{1,2})-(\d{1,2})|(\d{1,2})[/-](\d{1,2})[/-](\d{4})')
+
+
+def parse_date(value):
+    # 'YYYY-MM-DD' o 'DD/MM/YYYY' (básculas) -> 'YYYY-MM-DD'; None si no se entiende.
+    # Sin strptime (lento en cargas masivas); SQLite descarta fechas imposibles
+    match = _DATE_RE.match((value or '').strip())
+    if not match:
+        return None
+    year, month, day = match.group(1, 2, 3) if match.group(1) else match.group(6, 5, 4)
+    return f"{year}-{int(month):02d}-{int(day):02d}"
+
+
+def natural_tag_key(tag_number):
+    # Igual que TAG_SORT_SQL (la columna cattle.tag_sort)
+    digits = len(tag_number) - len(tag_number.lstrip('0123456789'))
+    if not digits:
+        return tag_number
+    return tag_number[:digits].lstrip('0').rjust(20, '0')[-20:] + tag_number[digits:]
+
+
+def calculate_expected_birth(pregnancy_date):
+    # Fecha probable de parto a partir de la fecha de carga
+    return (datetime.strptime(pregnancy_date, '%Y-%m-%d') + timedelta(days=GESTATION_DAYS)).strftime('%Y-%m-%d')
+
+
+def calculate_age(birth_date):
+    if not birth_date:
+        return "N/A"
+    try:
+        birth = datetime.strptime(birth_date, '%Y-%m-%d')
+        today = datetime.now()
+        years = today.year - birth.year
+        months = today.month - birth.month
+        if months < 0:
+            years -= 1
+            months += 12
+        return f"{years}a {months}m"
+    except:
+        return "N/A"
+
+
+def calculate_days_to_birth(expected_date):
+    if not expected_date:
+        return None
+    try:
+        expected = datetime.strptime(expected_date, '%Y-%m-%d')
+        today = datetime.now()
+        delta = (expected - today).days
+        return delta
+    except:
+        return None
+
+
+def calculate_days_since(date_str):
+    if not date_str:
+        return None
+    try:
+        date = datetime.strptime(date_str, '%Y-%m-%d')
+        today = datetime.now()
+        delta = (today - date).days
+        return delta
+    except:
+        return None
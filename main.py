@@ -5,22 +5,57 @@
 SIN TextInput - Todo con Spinners y Popups
 """
 
-import os
-from datetime import datetime, timedelta
+from collections import OrderedDict
+from datetime import datetime
 from kivy.app import App
 from kivy.uix.screenmanager import ScreenManager, Screen
 from kivy.uix.boxlayout import BoxLayout
 from kivy.uix.gridlayout import GridLayout
 from kivy.uix.scrollview import ScrollView
+from kivy.uix.recycleview import RecycleView
+from kivy.uix.recycleview.views import RecycleDataViewBehavior
+from kivy.uix.recycleboxlayout import RecycleBoxLayout
 from kivy.uix.button import Button
 from kivy.uix.label import Label
 from kivy.uix.spinner import Spinner
 from kivy.uix.popup import Popup
-from kivy.graphics import Color, RoundedRectangle
+from kivy.uix.widget import Widget
+from kivy.graphics import (
+    Color, RoundedRectangle, Rectangle, Line, Fbo, ClearColor, ClearBuffers, InstructionGroup
+)
+from kivy.core.text import Label as CoreLabel
 from kivy.core.window import Window
-from kivy.utils import get_color_from_hex, platform
-import sqlite3
-import re
+from kivy.clock import Clock
+from kivy.utils import get_color_from_hex
+from kivy.metrics import sp
+import queue
+import threading
+import sync
+import backup
+import reports
+from database import (
+    Database, DEFAULT_RANCH, GENERAL_VACCINE, TIMELINE_PAGE, list_ranches, ranch_label, ranch_rollup,
+    calculate_expected_birth, calculate_age, calculate_days_to_birth
+)
+
+# Lista: pausa del filtro al teclear (s)
+SEARCH_DELAY = 0.15
+
+# Filas de la lista y texturas de texto reutilizables
+ROW_HEIGHT = 110
+TEXT_CACHE_SIZE = 512
+
+# Modo manga: acciones fijas y filas visibles del registro
+CHUTE_ACTIONS = [
+    ('vaccination', '💉 Vacuné'),
+    ('drying', '🚫 Secé'),
+    ('birth', '🐄 Parió'),
+    ('pregnancy', '🤰 Cargué'),
+]
+CHUTE_LOG_ROWS = 30
+
+# Línea de tiempo del detalle
+TIMELINE_ICONS = {'vaccination': '💉', 'event': '📌', 'activity': '📝'}
 
 # Colores
 BG = get_color_from_hex('#0f1419')
@@ -66,393 +101,226 @@ class ModernCard(BoxLayout):
         self.rect.size = self.size
 
 
-class Database:
-    def __init__(self):
-        try:
-            if platform == 'android':
-                from android.storage import app_storage_path
-                storage_path = app_storage_path()
-                self.db_path = os.path.join(storage_path, 'cattle_manager.db')
-            else:
-                self.db_path = os.path.expanduser('~/cattle_manager.db')
-        except:
-            self.db_path = os.path.expanduser('~/cattle_manager.db')
-        self.init_database()
-    
-    def get_connection(self):
-        return sqlite3.connect(self.db_path)
-    
-    def init_database(self):
-        conn = self.get_connection()
-        cursor = conn.cursor()
-        cursor.execute('''
-            CREATE TABLE IF NOT EXISTS cattle (
-                id INTEGER PRIMARY KEY AUTOINCREMENT,
-                tag_number TEXT UNIQUE NOT NULL,
-                name TEXT,
-                birth_date TEXT,
-                weight REAL,
-                category TEXT,
-                is_pregnant INTEGER DEFAULT 0,
-                pregnancy_date TEXT,
-                expected_birth_date TEXT,
-                last_birth_date TEXT,
-                notes TEXT,
-                created_at TEXT DEFAULT CURRENT_TIMESTAMP
-            )
-        ''')
-        cursor.execute('''
-            CREATE TABLE IF NOT EXISTS vaccination_history (
-                id INTEGER PRIMARY KEY AUTOINCREMENT,
-                cattle_id INTEGER,
-                vaccine_name TEXT,
-                vaccination_date TEXT,
-                next_vaccination_date TEXT,
-                notes TEXT,
-                FOREIGN KEY (cattle_id) REFERENCES cattle (id) ON DELETE CASCADE
-            )
-        ''')
-        cursor.execute('''
-            CREATE TABLE IF NOT EXISTS events (
-                id INTEGER PRIMARY KEY AUTOINCREMENT,
-                cattle_id INTEGER,
-                event_type TEXT,
-                event_date TEXT,
-                notes TEXT,
-                FOREIGN KEY (cattle_id) REFERENCES cattle (id) ON DELETE CASCADE
-            )
-        ''')
-        cursor.execute('''
-            CREATE TABLE IF NOT EXISTS activity_log (
-                id INTEGER PRIMARY KEY AUTOINCREMENT,
-                cattle_id INTEGER,
-                activity_type TEXT,
-                description TEXT,
-                activity_date TEXT DEFAULT CURRENT_TIMESTAMP,
-                FOREIGN KEY (cattle_id) REFERENCES cattle (id) ON DELETE CASCADE
-            )
-        ''')
-        conn.commit()
-        conn.close()
-    
-    def add_cattle(self, data):
-        conn = self.get_connection()
-        cursor = conn.cursor()
-        try:
-            cursor.execute('''
-                INSERT INTO cattle (tag_number, name, birth_date, weight, category,
-                                    is_pregnant, pregnancy_date, expected_birth_date,
-                                    last_birth_date, notes)
-                VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
-            ''', (data.get('tag_number'), data.get('name'), data.get('birth_date'),
-                  data.get('weight'), data.get('category'), data.get('is_pregnant', 0),
-                  data.get('pregnancy_date'), data.get('expected_birth_date'),
-                  data.get('last_birth_date'), data.get('notes')))
-            conn.commit()
-            return cursor.lastrowid
-        except sqlite3.IntegrityError:
-            return None
-        finally:
-            conn.close()
-    
-    def update_cattle(self, cattle_id, data):
-        conn = self.get_connection()
-        cursor = conn.cursor()
-        fields = []
-        values = []
-        for key, value in data.items():
-            if key != 'id':
-                fields.append(f"{key} = ?")
-                values.append(value)
-        values.append(cattle_id)
-        query = f"UPDATE cattle SET {', '.join(fields)} WHERE id = ?"
-        cursor.execute(query, values)
-        conn.commit()
-        conn.close()
-    
-    def get_all_cattle(self):
-        conn = self.get_connection()
-        cursor = conn.cursor()
-        cursor.execute('SELECT * FROM cattle ORDER BY tag_number')
-        columns = [desc[0] for desc in cursor.description]
-        cattle_list = [dict(zip(columns, row)) for row in cursor.fetchall()]
-        conn.close()
-        return cattle_list
-    
-    def get_cattle_by_id(self, cattle_id):
-        conn = self.get_connection()
-        cursor = conn.cursor()
-        cursor.execute('SELECT * FROM cattle WHERE id = ?', (cattle_id,))
-        columns = [desc[0] for desc in cursor.description]
-        row = cursor.fetchone()
-        conn.close()
-        return dict(zip(columns, row)) if row else None
-    
-    def search_cattle(self, query):
-        conn = self.get_connection()
-        cursor = conn.cursor()
-        search_term = f"%{query}%"
-        cursor.execute('''
-            SELECT * FROM cattle 
-            WHERE tag_number LIKE ? OR name LIKE ?
-            ORDER BY tag_number
-        ''', (search_term, search_term))
-        columns = [desc[0] for desc in cursor.description]
-        cattle_list = [dict(zip(columns, row)) for row in cursor.fetchall()]
-        conn.close()
-        return cattle_list
-    
-    def delete_cattle(self, cattle_id):
-        conn = self.get_connection()
-        cursor = conn.cursor()
-        cursor.execute('DELETE FROM cattle WHERE id = ?', (cattle_id,))
-        conn.commit()
-        conn.close()
-    
-    def add_vaccination(self, cattle_id, vaccine_name, vaccination_date, next_date, notes=''):
-        conn = self.get_connection()
-        cursor = conn.cursor()
-        cursor.execute('''
-            INSERT INTO vaccination_history (cattle_id, vaccine_name, vaccination_date,
-                                             next_vaccination_date, notes)
-            VALUES (?, ?, ?, ?, ?)
-        ''', (cattle_id, vaccine_name, vaccination_date, next_date, notes))
-        conn.commit()
-        conn.close()
-    
-    def get_vaccinations(self, cattle_id):
-        conn = self.get_connection()
-        cursor = conn.cursor()
-        cursor.execute('''
-            SELECT * FROM vaccination_history 
-            WHERE cattle_id = ?
-            ORDER BY vaccination_date DESC
-        ''', (cattle_id,))
-        columns = [desc[0] for desc in cursor.description]
-        vaccinations = [dict(zip(columns, row)) for row in cursor.fetchall()]
-        conn.close()
-        return vaccinations
-    
-    def add_event(self, cattle_id, event_type, event_date, notes=''):
-        conn = self.get_connection()
-        cursor = conn.cursor()
-        cursor.execute('''
-            INSERT INTO events (cattle_id, event_type, event_date, notes)
-            VALUES (?, ?, ?, ?)
-        ''', (cattle_id, event_type, event_date, notes))
-        conn.commit()
-        conn.close()
-    
-    def get_events(self, cattle_id):
-        conn = self.get_connection()
-        cursor = conn.cursor()
-        cursor.execute('''
-            SELECT * FROM events 
-            WHERE cattle_id = ?
-            ORDER BY event_date DESC
-        ''', (cattle_id,))
-        columns = [desc[0] for desc in cursor.description]
-        events = [dict(zip(columns, row)) for row in cursor.fetchall()]
-        conn.close()
-        return events
-    
-    def add_activity_log(self, cattle_id, activity_type, description):
-        conn = self.get_connection()
-        cursor = conn.cursor()
-        cursor.execute('''
-            INSERT INTO activity_log (cattle_id, activity_type, description)
-            VALUES (?, ?, ?)
-        ''', (cattle_id, activity_type, description))
-        conn.commit()
-        conn.close()
-    
-    def get_activity_log(self, limit=50):
-        conn = self.get_connection()
-        cursor = conn.cursor()
-        cursor.execute('''
-            SELECT al.*, c.tag_number, c.name
-            FROM activity_log al
-            JOIN cattle c ON al.cattle_id = c.id
-            ORDER BY al.activity_date DESC
-            LIMIT ?
-        ''', (limit,))
-        columns = [desc[0] for desc in cursor.description]
-        activities = [dict(zip(columns, row)) for row in cursor.fetchall()]
-        conn.close()
-        return activities
-    
-    def get_statistics(self):
-        conn = self.get_connection()
-        cursor = conn.cursor()
-        stats = {}
-        
-        cursor.execute('SELECT COUNT(*) FROM cattle')
-        stats['total_cattle'] = cursor.fetchone()[0]
-        
-        cursor.execute('SELECT COUNT(*) FROM cattle WHERE is_pregnant = 1')
-        stats['pregnant'] = cursor.fetchone()[0]
-        
-        today = datetime.now().strftime('%Y-%m-%d')
-        future_60 = (datetime.now() + timedelta(days=60)).strftime('%Y-%m-%d')
-        cursor.execute('''
-            SELECT COUNT(*) FROM cattle 
-            WHERE is_pregnant = 1 
-            AND expected_birth_date BETWEEN ? AND ?
-        ''', (today, future_60))
-        stats['near_birth_60'] = cursor.fetchone()[0]
-        
-        future_90 = (datetime.now() + timedelta(days=90)).strftime('%Y-%m-%d')
-        cursor.execute('''
-            SELECT COUNT(*) FROM cattle 
-            WHERE is_pregnant = 1 
-            AND expected_birth_date BETWEEN ? AND ?
-        ''', (future_60, future_90))
-        stats['to_dry'] = cursor.fetchone()[0]
-        
-        past_30 = (datetime.now() - timedelta(days=30)).strftime('%Y-%m-%d')
-        cursor.execute('''
-            SELECT COUNT(*) FROM cattle 
-            WHERE last_birth_date >= ?
-        ''', (past_30,))
-        stats['recent_births'] = cursor.fetchone()[0]
-        
-        year_start = f"{datetime.now().year}-01-01"
-        cursor.execute('''
-            SELECT COUNT(*) FROM events 
-            WHERE event_type = 'birth' 
-            AND event_date >= ?
-        ''', (year_start,))
-        stats['births_this_year'] = cursor.fetchone()[0]
-        
-        cursor.execute('SELECT AVG(weight) FROM cattle WHERE weight IS NOT NULL')
-        avg_weight = cursor.fetchone()[0]
-        stats['avg_weight'] = round(avg_weight, 1) if avg_weight else 0
-        
-        # % PARTOS/AÑO
-        two_years_ago = (datetime.now() - timedelta(days=730)).strftime('%Y-%m-%d')
-        cursor.execute('SELECT COUNT(*) FROM cattle')
-        total_cows = cursor.fetchone()[0]
-        cursor.execute('''
-            SELECT COUNT(*) FROM events 
-            WHERE event_type = 'birth' 
-            AND event_date >= ?
-        ''', (two_years_ago,))
-        births_2y = cursor.fetchone()[0]
-        
-        if total_cows > 0:
-            births_per_cow = births_2y / total_cows
-            stats['birth_rate_annual'] = round((births_per_cow / 2) * 100, 1)
-        else:
-            stats['birth_rate_annual'] = 0
-        
-        conn.close()
-        return stats
-    
-    def get_agenda_items(self):
-        conn = self.get_connection()
-        cursor = conn.cursor()
-        today = datetime.now().strftime('%Y-%m-%d')
-        
-        agenda = {
-            'to_dry': [],
-            'near_birth': [],
-            'need_vaccine': [],
-            'recent_births': [],
-            'overdue': []
-        }
-        
-        future_60 = (datetime.now() + timedelta(days=60)).strftime('%Y-%m-%d')
-        future_90 = (datetime.now() + timedelta(days=90)).strftime('%Y-%m-%d')
-        
-        cursor.execute('''
-            SELECT * FROM cattle 
-            WHERE is_pregnant = 1 
-            AND expected_birth_date BETWEEN ? AND ?
-            ORDER BY expected_birth_date
-        ''', (future_60, future_90))
-        columns = [desc[0] for desc in cursor.description]
-        agenda['to_dry'] = [dict(zip(columns, row)) for row in cursor.fetchall()]
-        
-        cursor.execute('''
-            SELECT * FROM cattle 
-            WHERE is_pregnant = 1 
-            AND expected_birth_date BETWEEN ? AND ?
-            ORDER BY expected_birth_date
-        ''', (today, future_60))
-        agenda['near_birth'] = [dict(zip(columns, row)) for row in cursor.fetchall()]
-        
-        cursor.execute('''
-            SELECT * FROM cattle 
-            WHERE is_pregnant = 1 
-            AND expected_birth_date < ?
-            ORDER BY expected_birth_date
-        ''', (today,))
-        agenda['overdue'] = [dict(zip(columns, row)) for row in cursor.fetchall()]
-        
-        past_30 = (datetime.now() - timedelta(days=30)).strftime('%Y-%m-%d')
-        cursor.execute('''
-            SELECT * FROM cattle 
-            WHERE last_birth_date >= ?
-            ORDER BY last_birth_date DESC
-        ''', (past_30,))
-        agenda['recent_births'] = [dict(zip(columns, row)) for row in cursor.fetchall()]
-        
-        future_30 = (datetime.now() + timedelta(days=30)).strftime('%Y-%m-%d')
-        cursor.execute('''
-            SELECT c.*, vh.vaccine_name, vh.next_vaccination_date
-            FROM cattle c
-            JOIN vaccination_history vh ON c.id = vh.cattle_id
-            WHERE vh.next_vaccination_date BETWEEN ? AND ?
-            ORDER BY vh.next_vaccination_date
-        ''', (today, future_30))
-        columns_vacc = [desc[0] for desc in cursor.description]
-        agenda['need_vaccine'] = [dict(zip(columns_vacc, row)) for row in cursor.fetchall()]
-        
-        conn.close()
-        return agenda
+_text_textures = OrderedDict()
 
 
-def calculate_age(birth_date):
-    if not birth_date:
-        return "N/A"
-    try:
-        birth = datetime.strptime(birth_date, '%Y-%m-%d')
-        today = datetime.now()
-        years = today.year - birth.year
-        months = today.month - birth.month
-        if months < 0:
-            years -= 1
-            months += 12
-        return f"{years}a {months}m"
-    except:
-        return "N/A"
+def text_texture(text, font_size, color, bold=False):
+    """Textura de un texto (CoreLabel), compartida entre filas iguales"""
+    key = (text, font_size, tuple(color), bold)
+    texture = _text_textures.get(key)
+    if texture is not None:
+        _text_textures.move_to_end(key)
+        return texture
+    label = CoreLabel(text=text, font_size=sp(font_size), color=color, bold=bold)
+    label.refresh()
+    texture = label.texture
+    _text_textures[key] = texture
+    if len(_text_textures) > TEXT_CACHE_SIZE:
+        _text_textures.popitem(last=False)
+    return texture
 
 
-def calculate_days_to_birth(expected_date):
-    if not expected_date:
-        return None
-    try:
-        expected = datetime.strptime(expected_date, '%Y-%m-%d')
-        today = datetime.now()
-        delta = (expected - today).days
-        return delta
-    except:
-        return None
+class CattleRow(RecycleDataViewBehavior, Widget):
+    """Fila plana de la lista: un solo grupo de instrucciones, sin hijos
+    
+    Reemplaza a ModernCard + 2 Label + ModernButton (4 widgets, 4 fondos y
+    sus bindings por vaca); el toque se resuelve con collide_point. El
+    RecycleView crea solo las filas visibles y las reutiliza al desplazar.
+    """
+    
+    def __init__(self, **kwargs):
+        super().__init__(**kwargs)
+        self.cattle_id = None
+        self.on_select = None
+        self.selected = False
+        arrow = text_texture('›', 40, TEXT_DIM, bold=True)
+        
+        self.name_height = 0
+        self.arrow_size = arrow.size
+        
+        self.group = InstructionGroup()
+        self.bg_color = Color(*CARD)
+        self.bg = RoundedRectangle(radius=[20])
+        self.tag = Rectangle()
+        self.name = Rectangle()
+        self.arrow = Rectangle(texture=arrow, size=arrow.size)
+        for instruction in (self.bg_color, self.bg, Color(1, 1, 1, 1), self.tag, self.name, self.arrow):
+            self.group.add(instruction)
+        self.canvas.add(self.group)
+        self.bind(pos=self.layout_row, size=self.layout_row)
+    
+    def refresh_view_attrs(self, rv, index, data):
+        # La fila recibe otra vaca del RecycleView: solo cambian texturas y color
+        cattle = data['cattle']
+        self.cattle_id = cattle['id']
+        self.on_select = rv.on_select
+        self.selected = self.cattle_id in rv.selected
+        tag = text_texture(cattle['tag_number'], 34, PRIMARY, bold=True)
+        name = text_texture(cattle.get('name') or 'Sin nombre', 22, TEXT)
+        self.tag.texture = tag
+        self.tag.size = tag.size
+        self.name.texture = name
+        self.name.size = name.size
+        self.name_height = name.size[1]
+        self.bg_color.rgba = self.rest_color()
+        self.layout_row()
+    
+    def rest_color(self):
+        return (*SUCCESS[:3], 0.35) if self.selected else CARD
+    
+    def set_selected(self, selected):
+        self.selected = selected
+        self.bg_color.rgba = self.rest_color()
+    
+    def layout_row(self, *args):
+        x, y = self.pos
+        width, height = self.size
+        self.bg.pos = self.pos
+        self.bg.size = self.size
+        self.tag.pos = (x + 25, y + height / 2 + 4)
+        self.name.pos = (x + 25, y + height / 2 - 4 - self.name_height)
+        self.arrow.pos = (x + width - 25 - self.arrow_size[0], y + (height - self.arrow_size[1]) / 2)
+    
+    def on_touch_down(self, touch):
+        if not self.collide_point(*touch.pos):
+            return False
+        touch.ud['cattle_row'] = self
+        self.bg_color.rgba = (*PRIMARY[:3], 0.35)
+        return True
+    
+    def on_touch_up(self, touch):
+        if touch.ud.get('cattle_row') is not self:
+            return False
+        self.bg_color.rgba = self.rest_color()
+        if self.collide_point(*touch.pos):
+            self.on_select(self.cattle_id)
+        return True
 
 
-def calculate_days_since(date_str):
-    if not date_str:
-        return None
-    try:
-        date = datetime.strptime(date_str, '%Y-%m-%d')
-        today = datetime.now()
-        delta = (today - date).days
-        return delta
-    except:
-        return None
+class CattleRecycleView(RecycleView):
+    """Lista virtual de vacas: data = [{'cattle': dict}] en el orden a mostrar"""
+    
+    def __init__(self, on_select, selected, **kwargs):
+        super().__init__(**kwargs)
+        self.on_select = on_select
+        # Conjunto de ids elegidos de la pantalla (el mismo objeto, no una copia)
+        self.selected = selected
+        self.rows_layout = RecycleBoxLayout(
+            orientation='vertical',
+            spacing=15,
+            padding=[10, 10],
+            size_hint_y=None,
+            default_size=(None, ROW_HEIGHT),
+            default_size_hint=(1, None)
+        )
+        self.rows_layout.bind(minimum_height=self.rows_layout.setter('height'))
+        self.add_widget(self.rows_layout)
+        self.viewclass = CattleRow
+    
+    def visible_rows(self):
+        return [row for row in self.rows_layout.children if isinstance(row, CattleRow)]
 
 
 # PANTALLA PRINCIPAL - LISTA SIMPLE SIN CAJAS
+class TrendsPanel(Widget):
+    """Gráficas de tendencia dibujadas una sola vez en una textura (Fbo)
+    
+    Solo se vuelven a dibujar si cambia la versión de los datos o el tamaño;
+    desplazar la pantalla o volver al inicio reutiliza la textura.
+    """
+    
+    def __init__(self, **kwargs):
+        super().__init__(**kwargs)
+        self.version = None
+        self.trends = None
+        self.fbo = None
+        with self.canvas:
+            Color(1, 1, 1, 1)
+            self.rect = Rectangle(pos=self.pos, size=self.size)
+        self.bind(pos=self.update_rect, size=self.on_resize)
+    
+    def update_rect(self, *args):
+        self.rect.pos = self.pos
+    
+    def on_resize(self, *args):
+        self.rect.pos = self.pos
+        self.rect.size = self.size
+        self.render()
+    
+    def refresh(self, db):
+        version = (db.db_path, db.get_data_version())
+        if version == self.version:
+            return False
+        self.trends = db.get_herd_trends()
+        self.version = version
+        self.render()
+        return True
+    
+    def redraw(self):
+        # Tras perder el contexto GL (Android en pausa) basta volver a ejecutar el Fbo
+        if self.fbo is not None:
+            self.fbo.draw()
+    
+    def render(self):
+        width, height = int(self.width), int(self.height)
+        if self.trends is None or width < 50 or height < 50:
+            return
+        if self.fbo is None or tuple(self.fbo.size) != (width, height):
+            self.fbo = Fbo(size=(width, height))
+        self.fbo.clear()
+        charts = [
+            ('Partos/mes', self.trends['births'], SUCCESS, True),
+            ('Preñadas', self.trends['pregnant'], PRIMARY, False),
+            ('Peso prom. kg', self.trends['avg_weight'], WARNING, False),
+        ]
+        chart_width = width / len(charts)
+        with self.fbo:
+            ClearColor(*CARD)
+            ClearBuffers()
+            for i, (title, values, color, bars) in enumerate(charts):
+                self.draw_chart(i * chart_width, chart_width, height, title, values, color, bars)
+        self.fbo.draw()
+        self.rect.texture = self.fbo.texture
+    
+    def draw_text(self, text, x, y, color, font_size):
+        label = CoreLabel(text=text, font_size=font_size, color=color)
+        label.refresh()
+        Color(1, 1, 1, 1)
+        Rectangle(texture=label.texture, size=label.texture.size, pos=(x, y))
+        return label.texture.size
+    
+    def draw_chart(self, x0, width, height, title, values, color, bars):
+        pad = 12
+        _, title_h = self.draw_text(title, x0 + pad, height - pad - 30, TEXT_DIM, 26)
+        known = [v for v in values if v is not None]
+        last = known[-1] if known else '-'
+        self.draw_text(str(last), x0 + pad, pad, color, 30)
+        
+        left, bottom = x0 + pad, pad + 44
+        plot_w, plot_h = width - 2 * pad, height - bottom - title_h - 2 * pad
+        if not known or plot_h <= 0:
+            return
+        step = plot_w / len(values)
+        Color(*color)
+        if bars:
+            top = max(known) or 1
+            for i, v in enumerate(values):
+                if v:
+                    Rectangle(pos=(left + i * step + 2, bottom), size=(step - 4, plot_h * v / top))
+            return
+        low, high = min(known), max(known)
+        span = (high - low) or 1
+        points = []
+        for i, v in enumerate(values):
+            if v is None:
+                continue
+            points += [left + (i + 0.5) * step, bottom + plot_h * (v - low) / span]
+        if len(points) >= 4:
+            Line(points=points, width=2)
+        else:
+            Rectangle(pos=(points[0] - 3, points[1] - 3), size=(6, 6))
+
+
 class HomeScreen(Screen):
     def __init__(self, **kwargs):
         super().__init__(**kwargs)
@@ -469,8 +337,38 @@ class HomeScreen(Screen):
         )
         self.layout.add_widget(header)
         
-        # Stats como LISTA DE LABELS (no cajas)
+        # Selector de rancho (cada rancho es su propio archivo)
+        ranch_bar = BoxLayout(size_hint_y=None, height=70, spacing=10)
+        self.ranch_spinner = Spinner(
+            text=ranch_label(DEFAULT_RANCH),
+            values=(),
+            background_color=CARD,
+            color=TEXT,
+            font_size='22sp'
+        )
+        self.ranch_spinner.bind(text=self.on_ranch_selected)
+        
+        btn_new_ranch = ModernButton(text='➕ Rancho', size_hint_x=0.35, bg_color=CARD, font_size='18sp')
+        btn_new_ranch.bind(on_press=self.create_ranch)
+        
+        btn_rollup = ModernButton(text='🌐 Todos', size_hint_x=0.35, bg_color=CARD, font_size='18sp')
+        btn_rollup.bind(on_press=lambda x: setattr(self.manager, 'current', 'ranches'))
+        
+        btn_report = ModernButton(text='📄 Informe', size_hint_x=0.35, bg_color=CARD, font_size='18sp')
+        btn_report.bind(on_press=self.request_report)
+        
+        ranch_bar.add_widget(self.ranch_spinner)
+        ranch_bar.add_widget(btn_new_ranch)
+        ranch_bar.add_widget(btn_rollup)
+        ranch_bar.add_widget(btn_report)
+        self.layout.add_widget(ranch_bar)
+        
+        # Gráficas de tendencia + stats como LISTA DE LABELS (no cajas)
         scroll = ScrollView()
+        home_content = BoxLayout(orientation='vertical', spacing=8, size_hint_y=None)
+        home_content.bind(minimum_height=home_content.setter('height'))
+        self.trends_panel = TrendsPanel(size_hint_y=None, height=260)
+        home_content.add_widget(self.trends_panel)
         self.stats_layout = BoxLayout(
             orientation='vertical',
             spacing=8,
@@ -478,7 +376,8 @@ class HomeScreen(Screen):
             padding=[15, 10]
         )
         self.stats_layout.bind(minimum_height=self.stats_layout.setter('height'))
-        scroll.add_widget(self.stats_layout)
+        home_content.add_widget(self.stats_layout)
+        scroll.add_widget(home_content)
         self.layout.add_widget(scroll)
         
         # Botones
@@ -505,8 +404,52 @@ class HomeScreen(Screen):
         self.add_widget(self.layout)
     
     def on_enter(self):
+        self.update_ranches()
+        self.update_stats()
+    
+    def update_ranches(self):
+        app = App.get_running_app()
+        self.ranch_labels = {ranch_label(r): r for r in list_ranches()}
+        self.ranch_spinner.values = list(self.ranch_labels)
+        self.ranch_spinner.text = ranch_label(app.db.ranch)
+    
+    def on_ranch_selected(self, spinner, text):
+        ranch = getattr(self, 'ranch_labels', {}).get(text)
+        app = App.get_running_app()
+        if ranch and ranch != app.db.ranch:
+            app.switch_ranch(ranch)
+            self.update_stats()
+    
+    def create_ranch(self, instance):
+        # Sin TextInput: los ranchos nuevos se numeran solos
+        existing = set(list_ranches())
+        n = len(existing) + 1
+        while f'rancho_{n}' in existing:
+            n += 1
+        App.get_running_app().switch_ranch(f'rancho_{n}')
+        self.update_ranches()
         self.update_stats()
     
+    def request_report(self, instance):
+        # Informe del mes en el pool de informes: la interfaz solo muestra el resultado
+        app = App.get_running_app()
+        try:
+            future = app.reports.request(app.db, fmt='pdf')
+        except Exception as e:
+            print(f"[ERROR] request_report: {e}")
+            return
+        future.add_done_callback(lambda f: Clock.schedule_once(lambda dt: self.show_report(f)))
+    
+    def show_report(self, future):
+        try:
+            path = future.result()
+        except Exception as e:
+            print(f"[ERROR] show_report: {e}")
+            return
+        content = Label(text=f'Informe guardado en:\n{path}', font_size='18sp', color=TEXT, halign='center')
+        content.bind(size=content.setter('text_size'))
+        Popup(title='📄 Informe mensual', content=content, size_hint=(0.9, 0.5)).open()
+    
     def update_stats(self):
         self.stats_layout.clear_widgets()
         
@@ -551,6 +494,8 @@ class HomeScreen(Screen):
                 row.add_widget(label_widget)
                 row.add_widget(value_widget)
                 self.stats_layout.add_widget(row)
+            
+            self.trends_panel.refresh(db)
         
         except Exception as e:
             print(f"[ERROR] update_stats: {e}")
@@ -560,6 +505,15 @@ class HomeScreen(Screen):
 class CattleListScreen(Screen):
     def __init__(self, **kwargs):
         super().__init__(**kwargs)
+        self.cattle_ids = []
+        self.cattle_by_id = {}
+        self.search_text = ''
+        # Selección múltiple: ids elegidos (se conservan al cambiar el filtro)
+        self.selecting = False
+        self.selected = set()
+        self.bulk_thread = None
+        # Cada tecla reprograma el filtro: solo corre tras una pausa
+        self.search_trigger = Clock.create_trigger(self.apply_search, SEARCH_DELAY)
         self.layout = BoxLayout(orientation='vertical', padding=20, spacing=12)
         
         # Header simple
@@ -575,90 +529,229 @@ class CattleListScreen(Screen):
             color=TEXT
         )
         
+        self.btn_search = ModernButton(text='🔍', size_hint_x=0.4, bg_color=CARD, font_size='20sp')
+        self.btn_search.bind(on_press=self.show_search_keypad)
+        
+        self.btn_select = ModernButton(text='☑', size_hint_x=0.3, bg_color=CARD, font_size='20sp')
+        self.btn_select.bind(on_press=lambda x: self.set_select_mode(not self.selecting))
+        
         top_bar.add_widget(btn_back)
         top_bar.add_widget(title)
+        top_bar.add_widget(self.btn_search)
+        top_bar.add_widget(self.btn_select)
         self.layout.add_widget(top_bar)
         
-        # Lista
-        self.scroll = ScrollView()
-        self.cattle_container = BoxLayout(
-            orientation='vertical',
-            spacing=15,
-            size_hint_y=None,
-            padding=[10, 10]
-        )
-        self.cattle_container.bind(minimum_height=self.cattle_container.setter('height'))
-        self.scroll.add_widget(self.cattle_container)
-        self.layout.add_widget(self.scroll)
+        # Barra de acciones en lote (solo en modo selección)
+        self.bulk_bar = BoxLayout(size_hint_y=None, height=80, spacing=8)
+        self.btn_all = ModernButton(text='Todas', bg_color=CARD, font_size='18sp')
+        self.btn_all.bind(on_press=self.select_all)
+        self.bulk_bar.add_widget(self.btn_all)
+        for action, label in CHUTE_ACTIONS:
+            btn = ModernButton(text=label, font_size='18sp')
+            btn.bind(on_press=lambda x, a=action: self.bulk_action(a))
+            self.bulk_bar.add_widget(btn)
+        
+        # Lista virtual: solo existen las filas que caben en pantalla
+        self.empty_label = Label(size_hint_y=None, height=100, font_size='22sp', color=TEXT_DIM)
+        self.recycle = CattleRecycleView(self.on_row, self.selected)
+        self.layout.add_widget(self.recycle)
         
         self.add_widget(self.layout)
     
     def on_enter(self):
         self.load_cattle_list()
     
+    def on_leave(self):
+        self.set_select_mode(False)
+    
     def load_cattle_list(self):
-        self.cattle_container.clear_widgets()
-        
         try:
             db = App.get_running_app().db
             cattle_list = db.get_all_cattle()
-            
-            if not cattle_list:
-                no_data = Label(
-                    text='No hay vacas',
-                    size_hint_y=None,
-                    height=100,
-                    font_size='22sp',
-                    color=TEXT_DIM
-                )
-                self.cattle_container.add_widget(no_data)
-                return
-            
-            for cattle in cattle_list:
-                # CARD SIMPLE CON BOTÓN
-                card = ModernCard(
-                    orientation='vertical',
-                    size_hint_y=None,
-                    height=140,
-                    padding=25,
-                    spacing=12
-                )
-                
-                tag = Label(
-                    text=f"[b]{cattle['tag_number']}[/b]",
-                    markup=True,
-                    font_size='38sp',
-                    color=PRIMARY,
-                    size_hint_y=None,
-                    height=50
-                )
-                
-                name = Label(
-                    text=cattle.get('name', 'Sin nombre'),
-                    font_size='24sp',
-                    color=TEXT,
-                    size_hint_y=None,
-                    height=35
-                )
-                
-                btn = ModernButton(
-                    text='Ver Detalles',
-                    size_hint_y=None,
-                    height=55,
-                    font_size='18sp'
-                )
-                btn.bind(on_press=lambda x, cid=cattle['id']: self.view_detail(cid))
-                
-                card.add_widget(tag)
-                card.add_widget(name)
-                card.add_widget(btn)
-                
-                self.cattle_container.add_widget(card)
+            self.cattle_by_id = {c['id']: c for c in cattle_list}
+            db.warm_tag_index()
         except Exception as e:
             print(f"[ERROR] load_cattle_list: {e}")
+            return
+        self.apply_search()
+    
+    def apply_search(self, *args):
+        # Búsqueda por prefijo de arete sobre el índice ordenado (bisect)
+        try:
+            if self.search_text:
+                db = App.get_running_app().db
+                ids = [cid for cid in db.find_tags(self.search_text) if cid in self.cattle_by_id]
+            else:
+                ids = list(self.cattle_by_id)
+        except Exception as e:
+            print(f"[ERROR] apply_search: {e}")
+            return
+        self.btn_search.text = f'🔍 {self.search_text}' if self.search_text else '🔍'
+        self.show_cattle(ids)
+        self.update_counts()
+    
+    def show_cattle(self, cattle_ids):
+        # Todas las coincidencias van al RecycleView de una vez: dibuja solo las visibles
+        self.cattle_ids = cattle_ids
+        self.recycle.data = [{'cattle': self.cattle_by_id[cid]} for cid in cattle_ids]
+        self.recycle.scroll_y = 1
+        
+        if not cattle_ids:
+            self.empty_label.text = 'Sin resultados' if self.search_text else 'No hay vacas'
+            if self.empty_label.parent is None:
+                # Encima de la lista (children va de abajo hacia arriba)
+                self.layout.add_widget(self.empty_label, index=self.layout.children.index(self.recycle) + 1)
+        elif self.empty_label.parent is not None:
+            self.layout.remove_widget(self.empty_label)
+    
+    def on_row(self, cattle_id):
+        if not self.selecting:
+            self.view_detail(cattle_id)
+            return
+        if cattle_id in self.selected:
+            self.selected.discard(cattle_id)
+        else:
+            self.selected.add(cattle_id)
+        self.paint_rows()
+        self.update_counts()
+    
+    def set_select_mode(self, selecting):
+        self.selecting = selecting
+        if self.selected:
+            self.selected.clear()
+            self.paint_rows()
+        self.btn_select.rect_color.rgba = PRIMARY if selecting else CARD
+        if selecting and self.bulk_bar.parent is None:
+            self.layout.add_widget(self.bulk_bar)
+        elif not selecting and self.bulk_bar.parent is not None:
+            self.layout.remove_widget(self.bulk_bar)
+        self.update_counts()
+    
+    def select_all(self, instance):
+        # Todas las que cumplen el filtro actual, no solo las filas visibles
+        if self.selected.issuperset(self.cattle_ids):
+            self.selected.difference_update(self.cattle_ids)
+        else:
+            self.selected.update(self.cattle_ids)
+        self.paint_rows()
+        self.update_counts()
+    
+    def paint_rows(self):
+        # Las demás toman el color al reciclarse (refresh_view_attrs)
+        for row in self.recycle.visible_rows():
+            row.set_selected(row.cattle_id in self.selected)
+    
+    def update_counts(self):
+        self.btn_select.text = f'☑ {len(self.selected)}' if self.selecting else '☑'
+        everything = self.cattle_ids and self.selected.issuperset(self.cattle_ids)
+        self.btn_all.text = 'Ninguna' if everything else f'Todas ({len(self.cattle_ids)})'
+    
+    def bulk_action(self, action):
+        # Solo las que siguen en la lista (una borrada haría fallar todo el lote)
+        ids = sorted(cid for cid in self.selected if cid in self.cattle_by_id)
+        if not ids:
+            return
+        if action == 'vaccination':
+            self.choose_bulk_vaccine(ids)
+            return
+        label = dict(CHUTE_ACTIONS)[action]
+        content = BoxLayout(spacing=10, padding=20)
+        popup = Popup(title=f'{label}: {len(ids)} vacas', content=content, size_hint=(0.9, 0.35))
+        btn_cancel = ModernButton(text='Cancelar', bg_color=CARD, font_size='20sp')
+        btn_cancel.bind(on_press=lambda x: popup.dismiss())
+        btn_ok = ModernButton(text=f'✓ Aplicar a {len(ids)}', bg_color=SUCCESS, font_size='20sp')
+        btn_ok.bind(on_press=lambda x: (popup.dismiss(), self.run_bulk(action, ids)))
+        content.add_widget(btn_cancel)
+        content.add_widget(btn_ok)
+        popup.open()
+    
+    def choose_bulk_vaccine(self, ids):
+        # Elegir la vacuna confirma el lote
+        try:
+            db = App.get_running_app().db
+            names = sorted({p['vaccine_name'] for p in db.get_vaccine_protocols()})
+            names.append(GENERAL_VACCINE)
+        except Exception as e:
+            print(f"[ERROR] choose_bulk_vaccine: {e}")
+            return
+        
+        content = GridLayout(cols=2, spacing=10, padding=20)
+        popup = Popup(title=f'Vacuna aplicada a {len(ids)} vacas', content=content, size_hint=(0.9, 0.7))
+        
+        for name in names:
+            btn = ModernButton(text=name, font_size='18sp')
+            btn.bind(on_press=lambda x, n=name: (popup.dismiss(), self.run_bulk('vaccination', ids, n)))
+            content.add_widget(btn)
+        
+        popup.open()
+    
+    def run_bulk(self, action, ids, vaccine_name=GENERAL_VACCINE):
+        # Una sola transacción (UPDATE ... IN + executemany) fuera del hilo de la interfaz
+        db = App.get_running_app().db
+        reads = [(cattle_id, None) for cattle_id in ids]
+        self.bulk_bar.disabled = True
+        
+        def run():
+            try:
+                saved = db.apply_batch(action, reads, vaccine_name)
+            except Exception as e:
+                print(f"[ERROR] run_bulk {action}: {e}")
+                saved = None
+            Clock.schedule_once(lambda dt: self.bulk_done(saved))
+        
+        self.bulk_thread = threading.Thread(target=run, daemon=True)
+        self.bulk_thread.start()
+    
+    def drain(self):
+        # Espera a que termine el lote en curso (antes de cerrar el rancho)
+        if self.bulk_thread is not None:
+            self.bulk_thread.join()
+    
+    def bulk_done(self, saved):
+        # Un solo refresco de la lista al terminar el lote
+        self.bulk_bar.disabled = False
+        if saved is None:
+            return
+        self.set_select_mode(False)
+        self.load_cattle_list()
+    
+    def show_search_keypad(self, instance):
+        # Teclado abajo: la lista se sigue viendo y se filtra con cada tecla
+        keyboard = GridLayout(cols=3, spacing=10, padding=10)
+        popup = Popup(
+            title='Buscar arete',
+            content=keyboard,
+            size_hint=(1, 0.45),
+            pos_hint={'y': 0},
+            overlay_color=(0, 0, 0, 0)
+        )
+        
+        for key in ['1', '2', '3', '4', '5', '6', '7', '8', '9', '✕', '0', '←']:
+            btn = ModernButton(text=key, font_size='26sp')
+            if key == '✕':
+                btn.bg_color = WARNING
+            elif key == '←':
+                btn.bg_color = DANGER
+            
+            def on_press(x, k=key):
+                if k == '✕':
+                    self.search_text = ''
+                    popup.dismiss()
+                elif k == '←':
+                    self.search_text = self.search_text[:-1]
+                else:
+                    self.search_text += k
+                popup.title = f'Buscar arete: {self.search_text}'
+                self.search_trigger()
+            
+            btn.bind(on_press=on_press)
+            keyboard.add_widget(btn)
+        
+        popup.open()
     
     def view_detail(self, cattle_id):
         detail_screen = self.manager.get_screen('cattle_detail')
+        detail_screen.set_browse_order(self.cattle_ids)
         detail_screen.load_cattle(cattle_id)
         self.manager.current = 'cattle_detail'
 
@@ -877,38 +970,77 @@ class CattleDetailScreen(Screen):
     def __init__(self, **kwargs):
         super().__init__(**kwargs)
         self.cattle_id = None
+        self.browse_order = []
+        self.browse_pos = {}
         self.layout = BoxLayout(orientation='vertical', padding=20, spacing=12)
         
         top_bar = BoxLayout(size_hint_y=None, height=80, spacing=10)
         btn_back = ModernButton(text='← Lista', bg_color=CARD, font_size='20sp')
         btn_back.bind(on_press=lambda x: setattr(self.manager, 'current', 'cattle_list'))
+        btn_prev = ModernButton(text='◀', size_hint_x=0.3, bg_color=CARD, font_size='20sp')
+        btn_prev.bind(on_press=lambda x: self.browse(-1))
         self.title_label = Label(text='Detalle', font_size='26sp', color=TEXT)
+        btn_next = ModernButton(text='▶', size_hint_x=0.3, bg_color=CARD, font_size='20sp')
+        btn_next.bind(on_press=lambda x: self.browse(1))
         btn_delete = ModernButton(text='🗑️', size_hint_x=0.3, bg_color=DANGER, font_size='20sp')
         btn_delete.bind(on_press=self.confirm_delete)
         
         top_bar.add_widget(btn_back)
+        top_bar.add_widget(btn_prev)
         top_bar.add_widget(self.title_label)
+        top_bar.add_widget(btn_next)
         top_bar.add_widget(btn_delete)
         self.layout.add_widget(top_bar)
         
         self.scroll = ScrollView()
+        self.scroll.bind(scroll_y=self.on_scroll)
         self.content = BoxLayout(orientation='vertical', spacing=15, size_hint_y=None, padding=[15, 15])
         self.content.bind(minimum_height=self.content.setter('height'))
         self.scroll.add_widget(self.content)
         self.layout.add_widget(self.scroll)
         
         self.add_widget(self.layout)
+        self.timeline_before = None
+        self.timeline_more = False
+        self.btn_more = None
+        self.timeline_event = None
+        self.first_page = None
+    
+    def set_browse_order(self, cattle_ids):
+        # Orden de la lista, para ◀ ▶ y para precargar las vecinas
+        self.browse_order = cattle_ids
+        self.browse_pos = {cid: i for i, cid in enumerate(cattle_ids)}
+    
+    def browse(self, step):
+        pos = self.browse_pos.get(self.cattle_id)
+        if pos is None or not 0 <= pos + step < len(self.browse_order):
+            return
+        self.load_cattle(self.browse_order[pos + step])
     
     def load_cattle(self, cattle_id):
         self.cattle_id = cattle_id
         self.content.clear_widgets()
+        self.timeline_before = None
+        self.timeline_more = False
+        self.btn_more = None
+        self.scroll.scroll_y = 1
+        if self.timeline_event is not None:
+            self.timeline_event.cancel()
         
         try:
             db = App.get_running_app().db
-            c = db.get_cattle_by_id(cattle_id)
+            detail = db.get_cattle_detail(cattle_id)
             
-            if not c:
+            if not detail:
                 return
+            c = detail['cattle']
+            self.first_page = detail['timeline']
+            self.title_label.text = c['tag_number']
+            
+            pos = self.browse_pos.get(cattle_id)
+            if pos is not None:
+                db.prefetch_details(self.browse_order[max(0, pos - 2):pos] +
+                                    self.browse_order[pos + 1:pos + 3])
             
             # Info como LISTA DE LABELS
             info_lines = [
@@ -968,18 +1100,103 @@ class CattleDetailScreen(Screen):
             
             self.content.add_widget(actions)
             
+            self.content.add_widget(Label(
+                text='[b]📜 Historial[/b]',
+                markup=True,
+                font_size='22sp',
+                color=TEXT,
+                size_hint_y=None,
+                height=50
+            ))
+            # La ficha se muestra ya; el historial llega en el siguiente cuadro
+            self.timeline_event = Clock.schedule_once(self.load_timeline_page, 0)
+            
         except Exception as e:
             print(f"[ERROR] load_cattle: {e}")
     
+    def load_timeline_page(self, *args):
+        self.timeline_event = None
+        if self.btn_more is not None:
+            self.content.remove_widget(self.btn_more)
+            self.btn_more = None
+        
+        try:
+            if self.timeline_before is None and self.first_page is not None:
+                # Primera página: ya viene en la ficha (caché)
+                items = self.first_page
+            else:
+                db = App.get_running_app().db
+                items = db.get_timeline(self.cattle_id, self.timeline_before, TIMELINE_PAGE)
+        except Exception as e:
+            print(f"[ERROR] load_timeline_page: {e}")
+            return
+        
+        saved = [i for i in items if i['id'] is not None]
+        if saved:
+            last = saved[-1]
+            self.timeline_before = (last['date'], last['kind'], last['id'])
+        self.timeline_more = len(saved) == TIMELINE_PAGE
+        
+        if not items and self.timeline_before is None:
+            self.content.add_widget(Label(text='Sin historial', size_hint_y=None, height=50,
+                                          font_size='18sp', color=TEXT_DIM))
+            return
+        
+        for item in items:
+            detail = f" — {item['detail']}" if item['detail'] else ''
+            row = Label(
+                text=f"{(item['date'] or '')[:10]}  {TIMELINE_ICONS[item['kind']]} {item['title'] or ''}{detail}",
+                font_size='17sp',
+                color=TEXT,
+                halign='left',
+                size_hint_y=None,
+                height=44
+            )
+            row.bind(size=row.setter('text_size'))
+            self.content.add_widget(row)
+        
+        if self.timeline_more:
+            self.btn_more = ModernButton(text='Ver más', bg_color=CARD, font_size='18sp',
+                                         size_hint_y=None, height=55)
+            self.btn_more.bind(on_press=lambda x: self.load_timeline_page())
+            self.content.add_widget(self.btn_more)
+    
+    def on_scroll(self, scroll, value):
+        # Al llegar al final se carga la página siguiente
+        if value <= 0.02 and self.btn_more is not None:
+            self.load_timeline_page()
+    
     def add_vaccination(self, instance):
+        # Popup con las vacunas del protocolo (la pendiente más antigua primero)
         try:
             db = App.get_running_app().db
             today = datetime.now().strftime('%Y-%m-%d')
-            db.add_vaccination(self.cattle_id, 'Vacuna general', today, today, '')
-            db.add_activity_log(self.cattle_id, 'vaccination', 'Vacunación')
-            self.load_cattle(self.cattle_id)
+            due = [v['vaccine_name'] for v in db.get_vaccines_due(today, self.cattle_id)]
+            names = due + sorted({p['vaccine_name'] for p in db.get_vaccine_protocols()} - set(due))
+            names.append(GENERAL_VACCINE)
         except Exception as e:
             print(f"[ERROR] add_vaccination: {e}")
+            return
+        
+        content = GridLayout(cols=2, spacing=10, padding=20)
+        popup = Popup(title='Vacuna aplicada', content=content, size_hint=(0.9, 0.7))
+        
+        for name in names:
+            btn = ModernButton(text=name, font_size='18sp',
+                               bg_color=WARNING if name in due else PRIMARY)
+            btn.bind(on_press=lambda x, n=name: (popup.dismiss(), self.apply_vaccine(n)))
+            content.add_widget(btn)
+        
+        popup.open()
+    
+    def apply_vaccine(self, vaccine_name):
+        try:
+            db = App.get_running_app().db
+            db.vaccinate(self.cattle_id, vaccine_name)
+            db.add_activity_log(self.cattle_id, 'vaccination', f'Vacunación: {vaccine_name}')
+            self.load_cattle(self.cattle_id)
+        except Exception as e:
+            print(f"[ERROR] apply_vaccine: {e}")
     
     def register_birth(self, instance):
         try:
@@ -1011,7 +1228,7 @@ class CattleDetailScreen(Screen):
         try:
             db = App.get_running_app().db
             today = datetime.now().strftime('%Y-%m-%d')
-            expected = (datetime.now() + timedelta(days=283)).strftime('%Y-%m-%d')
+            expected = calculate_expected_birth(today)
             db.update_cattle(self.cattle_id, {
                 'is_pregnant': 1,
                 'pregnancy_date': today,
@@ -1109,8 +1326,11 @@ class QuickLogScreen(Screen):
         btn_back = ModernButton(text='← Inicio', bg_color=CARD, font_size='20sp')
         btn_back.bind(on_press=lambda x: setattr(self.manager, 'current', 'home'))
         title = Label(text='[b]⚡ Rápido[/b]', markup=True, font_size='26sp', color=TEXT)
+        btn_chute = ModernButton(text='🐂 Manga', bg_color=WARNING, font_size='20sp')
+        btn_chute.bind(on_press=lambda x: setattr(self.manager, 'current', 'chute'))
         top_bar.add_widget(btn_back)
         top_bar.add_widget(title)
+        top_bar.add_widget(btn_chute)
         self.layout.add_widget(top_bar)
         
         inst = Label(
@@ -1245,63 +1465,314 @@ class QuickLogScreen(Screen):
         popup.open()
     
     def process_command(self, command):
-        command = command.strip().lower()
-        
-        if not command:
+        if not command.strip():
             return
         
         try:
             db = App.get_running_app().db
-            
-            arete_match = re.search(r'(\d+)', command)
-            if not arete_match:
-                return
-            
-            arete = arete_match.group(1)
-            cattle_list = db.search_cattle(arete)
-            if not cattle_list:
-                return
-            
-            cattle = cattle_list[0]
-            cattle_id = cattle['id']
-            today = datetime.now().strftime('%Y-%m-%d')
-            
-            if 'vacun' in command:
-                db.add_vaccination(cattle_id, 'Vacuna general', today, today, '')
-                db.add_activity_log(cattle_id, 'vaccination', 'Vacunación')
-            
-            elif 'sec' in command:
-                db.add_event(cattle_id, 'drying', today, 'Secado')
-                db.add_activity_log(cattle_id, 'drying', 'Secado')
-            
-            elif 'pari' in command:
-                db.update_cattle(cattle_id, {
-                    'is_pregnant': 0,
-                    'last_birth_date': today,
-                    'pregnancy_date': None,
-                    'expected_birth_date': None
-                })
-                db.add_event(cattle_id, 'birth', today, 'Parto')
-                db.add_activity_log(cattle_id, 'birth', 'Parto')
-            
-            elif 'carg' in command:
-                expected_date = (datetime.now() + timedelta(days=283)).strftime('%Y-%m-%d')
-                db.update_cattle(cattle_id, {
-                    'is_pregnant': 1,
-                    'pregnancy_date': today,
-                    'expected_birth_date': expected_date
-                })
-                db.add_activity_log(cattle_id, 'pregnancy', f'Preñada ({expected_date})')
-            
+            db.apply_quick_command(command)
             self.load_activity_log()
         except Exception as e:
             print(f"[ERROR] process_command: {e}")
 
 
+class ChuteScreen(Screen):
+    """Modo manga: se elige la acción una vez y se teclea arete tras arete
+    
+    El teclado se construye una sola vez y queda fijo; el arete se resuelve
+    con el índice en memoria y la escritura corre en un hilo aparte (lo
+    acumulado se guarda con apply_batch, un lote por acción). Solo se agregan
+    las filas nuevas al registro.
+    """
+    
+    def __init__(self, **kwargs):
+        super().__init__(**kwargs)
+        self.action = CHUTE_ACTIONS[0][0]
+        self.tag_text = ''
+        self.done = 0
+        self.jobs = queue.Queue()
+        self.worker = None
+        self.layout = BoxLayout(orientation='vertical', padding=20, spacing=12)
+        
+        top_bar = BoxLayout(size_hint_y=None, height=80, spacing=10)
+        btn_back = ModernButton(text='← Rápido', bg_color=CARD, font_size='20sp')
+        btn_back.bind(on_press=lambda x: setattr(self.manager, 'current', 'quick_log'))
+        title = Label(text='[b]🐂 Manga[/b]', markup=True, font_size='26sp', color=TEXT)
+        self.counter = Label(text='0', font_size='26sp', color=SUCCESS, size_hint_x=0.5)
+        top_bar.add_widget(btn_back)
+        top_bar.add_widget(title)
+        top_bar.add_widget(self.counter)
+        self.layout.add_widget(top_bar)
+        
+        # Acción fija para toda la tanda
+        action_bar = BoxLayout(size_hint_y=None, height=70, spacing=8)
+        self.action_buttons = {}
+        for action, label in CHUTE_ACTIONS:
+            btn = ModernButton(text=label, bg_color=CARD, font_size='18sp')
+            btn.bind(on_press=lambda x, a=action: self.select_action(a))
+            self.action_buttons[action] = btn
+            action_bar.add_widget(btn)
+        self.layout.add_widget(action_bar)
+        
+        self.display = Label(text='', font_size='40sp', color=PRIMARY, size_hint_y=None, height=70)
+        self.status = Label(text='', font_size='18sp', color=TEXT_DIM, size_hint_y=None, height=35)
+        self.layout.add_widget(self.display)
+        self.layout.add_widget(self.status)
+        
+        self.scroll = ScrollView()
+        self.log_container = BoxLayout(orientation='vertical', spacing=6, size_hint_y=None, padding=[15, 5])
+        self.log_container.bind(minimum_height=self.log_container.setter('height'))
+        self.scroll.add_widget(self.log_container)
+        self.layout.add_widget(self.scroll)
+        
+        # Teclado permanente
+        keyboard = GridLayout(cols=3, spacing=10, size_hint_y=None, height=320)
+        for key in ['1', '2', '3', '4', '5', '6', '7', '8', '9', '←', '0', 'OK']:
+            btn = ModernButton(text=key, font_size='28sp',
+                               bg_color=SUCCESS if key == 'OK' else DANGER if key == '←' else PRIMARY)
+            btn.bind(on_press=lambda x, k=key: self.on_key(k))
+            keyboard.add_widget(btn)
+        self.layout.add_widget(keyboard)
+        
+        self.add_widget(self.layout)
+        self.select_action(self.action)
+    
+    def on_enter(self):
+        App.get_running_app().db.warm_tag_index()
+    
+    def select_action(self, action):
+        self.action = action
+        for name, btn in self.action_buttons.items():
+            btn.rect_color.rgba = PRIMARY if name == action else CARD
+    
+    def on_key(self, key):
+        if key == 'OK':
+            self.submit()
+            return
+        if key == '←':
+            self.tag_text = self.tag_text[:-1]
+        else:
+            self.tag_text += key
+        self.display.text = self.tag_text
+    
+    def submit(self):
+        tag = self.tag_text
+        if not tag:
+            return
+        self.tag_text = ''
+        self.display.text = ''
+        try:
+            db = App.get_running_app().db
+            cattle_id = db.find_tag(tag)
+        except Exception as e:
+            print(f"[ERROR] chute submit: {e}")
+            return
+        if cattle_id is None:
+            self.status.text = f'✗ Arete {tag} no existe'
+            self.status.color = DANGER
+            return
+        self.status.text = f'✓ {tag}'
+        self.status.color = SUCCESS
+        self.jobs.put((db, cattle_id, tag, self.action))
+        if self.worker is None:
+            self.worker = threading.Thread(target=self.run_jobs, daemon=True)
+            self.worker.start()
+    
+    def run_jobs(self):
+        # Un solo hilo: lo que llegó mientras guardaba se aplica en lotes, en orden
+        while True:
+            jobs = [self.jobs.get()]
+            while True:
+                try:
+                    jobs.append(self.jobs.get_nowait())
+                except queue.Empty:
+                    break
+            for db, action, group in self.group_jobs(jobs):
+                try:
+                    # Sin vacuna indicada: la más atrasada de cada vaca
+                    done = db.apply_batch(action, [(cattle_id, None) for cattle_id, tag in group],
+                                          None, describe=True)
+                except Exception as e:
+                    print(f"[ERROR] chute {action}: {e}")
+                    done = {}
+                Clock.schedule_once(lambda dt, g=group, d=done: self.append_logs(g, d))
+            for _ in jobs:
+                self.jobs.task_done()
+    
+    def drain(self):
+        # Espera a que se guarden las lecturas en cola (antes de cerrar el rancho)
+        self.jobs.join()
+    
+    @staticmethod
+    def group_jobs(jobs):
+        """Tandas seguidas de la misma acción y rancho; una vaca repetida abre otra tanda"""
+        groups = []
+        for db, cattle_id, tag, action in jobs:
+            if not groups or groups[-1][0] is not db or groups[-1][1] != action or cattle_id in groups[-1][3]:
+                groups.append((db, action, [], set()))
+            groups[-1][2].append((cattle_id, tag))
+            groups[-1][3].add(cattle_id)
+        return [(db, action, group) for db, action, group, seen in groups]
+    
+    def append_logs(self, group, done):
+        for cattle_id, tag in group:
+            self.append_log(tag, done.get(cattle_id))
+    
+    def append_log(self, tag, description):
+        if description is not None:
+            self.done += 1
+            self.counter.text = str(self.done)
+        row = Label(
+            text=f"{tag} - {description}" if description is not None else f"{tag} - ✗ no guardado",
+            font_size='20sp',
+            color=TEXT if description is not None else DANGER,
+            size_hint_y=None,
+            height=45,
+            halign='left'
+        )
+        row.bind(size=row.setter('text_size'))
+        # La más nueva arriba; se descartan las más viejas
+        self.log_container.add_widget(row, index=len(self.log_container.children))
+        if len(self.log_container.children) > CHUTE_LOG_ROWS:
+            self.log_container.remove_widget(self.log_container.children[0])
+
+
+class RanchSummaryScreen(Screen):
+    def __init__(self, **kwargs):
+        super().__init__(**kwargs)
+        self.layout = BoxLayout(orientation='vertical', padding=20, spacing=12)
+        
+        top_bar = BoxLayout(size_hint_y=None, height=80, spacing=10)
+        btn_back = ModernButton(text='← Inicio', bg_color=CARD, font_size='20sp')
+        btn_back.bind(on_press=lambda x: setattr(self.manager, 'current', 'home'))
+        title = Label(text='[b]🌐 Todos los Ranchos[/b]', markup=True, font_size='26sp', color=TEXT)
+        top_bar.add_widget(btn_back)
+        top_bar.add_widget(title)
+        self.layout.add_widget(top_bar)
+        
+        self.scroll = ScrollView()
+        self.summary_container = BoxLayout(orientation='vertical', spacing=12, size_hint_y=None, padding=[15, 15])
+        self.summary_container.bind(minimum_height=self.summary_container.setter('height'))
+        self.scroll.add_widget(self.summary_container)
+        self.layout.add_widget(self.scroll)
+        
+        self.add_widget(self.layout)
+    
+    def on_enter(self):
+        self.load_summary()
+    
+    def load_summary(self):
+        self.summary_container.clear_widgets()
+        
+        try:
+            App.get_running_app().db.flush_writes()
+            rollup = ranch_rollup()
+            
+            for r in rollup['ranches'] + [rollup['total']]:
+                name = 'TOTAL' if r is rollup['total'] else ranch_label(r['ranch'])
+                self.summary_container.add_widget(Label(
+                    text=f'[b]{name}[/b]',
+                    markup=True,
+                    size_hint_y=None,
+                    height=50,
+                    font_size='24sp',
+                    color=PRIMARY if r is rollup['total'] else WARNING
+                ))
+                
+                info = Label(
+                    text=(f"🐮 {r['total_cattle']}   🤰 {r['pregnant']}   ⚠️ {r['near_birth_60']}   "
+                          f"🚫 {r['to_dry']}   👶 {r['births_this_year']}   ⚖️ {r['avg_weight']} kg"),
+                    font_size='18sp',
+                    color=TEXT,
+                    size_hint_y=None,
+                    height=50,
+                    halign='left'
+                )
+                info.bind(size=info.setter('text_size'))
+                self.summary_container.add_widget(info)
+        except Exception as e:
+            print(f"[ERROR] load_summary: {e}")
+
+
 class CattleManagerApp(App):
+    def build_config(self, config):
+        config.setdefaults('ranch', {'current': DEFAULT_RANCH})
+        # URL del servidor local (sync_server.py); vacío = sin sincronizar
+        config.setdefaults('sync', {'server_url': ''})
+        # Respaldo automático en segundo plano (horas entre respaldos)
+        config.setdefaults('backup', {'every_hours': '24', 'keep': '7'})
+        # Huérfanas, integridad y estadísticas del planificador (horas entre corridas)
+        config.setdefaults('maintenance', {'every_hours': '168'})
+    
+    def open_backups(self):
+        # Un solo BackupManager por rancho: su hilo impide dos respaldos a la vez
+        self.backups = backup.BackupManager(self.db.db_path, keep=self.config.getint('backup', 'keep'))
+    
+    def backup_in_background(self):
+        # Respaldo por pasos en un hilo: la interfaz nunca espera
+        try:
+            manager = self.backups
+            if manager.is_running():
+                return
+            if manager.is_due(self.config.getint('backup', 'every_hours')):
+                self.db.flush_writes()
+                manager.start()
+        except Exception as e:
+            print(f"[ERROR] backup_in_background: {e}")
+    
+    def maintain_in_background(self):
+        db = self.db
+        every_hours = self.config.getint('maintenance', 'every_hours')
+        
+        def run():
+            try:
+                # Fotos diarias del hato hasta ayer (la primera vez reconstruye el historial)
+                db.update_snapshots()
+                if db.maintenance_due(every_hours):
+                    print(f"[MAINTENANCE] {db.maintain()}")
+            except Exception as e:
+                print(f"[ERROR] maintenance: {e}")
+        
+        threading.Thread(target=run, daemon=True).start()
+    
+    def sync_in_background(self):
+        server_url = self.config.get('sync', 'server_url')
+        if not server_url:
+            return
+        db = self.db
+        
+        def run():
+            try:
+                result = sync.SyncClient(db, server_url).sync()
+                print(f"[SYNC] {result}")
+            except Exception as e:
+                print(f"[ERROR] sync: {e}")
+        
+        threading.Thread(target=run, daemon=True).start()
+    
+    def drain_background(self):
+        # Manga y lotes de la lista escriben con self.db desde sus hilos: que terminen
+        for name in ('chute', 'cattle_list'):
+            try:
+                self.root.get_screen(name).drain()
+            except Exception as e:
+                print(f"[ERROR] drain {name}: {e}")
+    
+    def switch_ranch(self, ranch):
+        # Cerrar el rancho actual (hilos de escritura y su cola) antes de abrir el otro archivo
+        self.drain_background()
+        self.db.flush_writes()
+        self.db.close()
+        self.db = Database(ranch)
+        self.open_backups()
+        self.config.set('ranch', 'current', self.db.ranch)
+        self.config.write()
+    
     def build(self):
         try:
-            self.db = Database()
+            self.db = Database(self.config.get('ranch', 'current'))
+            self.open_backups()
+            self.reports = reports.ReportService()
             sm = ScreenManager()
             sm.add_widget(HomeScreen(name='home'))
             sm.add_widget(CattleListScreen(name='cattle_list'))
@@ -1309,12 +1780,45 @@ class CattleManagerApp(App):
             sm.add_widget(CattleDetailScreen(name='cattle_detail'))
             sm.add_widget(AgendaScreen(name='agenda'))
             sm.add_widget(QuickLogScreen(name='quick_log'))
+            sm.add_widget(ChuteScreen(name='chute'))
+            sm.add_widget(RanchSummaryScreen(name='ranches'))
             return sm
         except Exception as e:
             print(f"[ERROR] build: {e}")
             error = BoxLayout(orientation='vertical', padding=20)
             error.add_widget(Label(text=f'Error: {str(e)}', color=DANGER))
             return error
+    
+    def on_start(self):
+        self.sync_in_background()
+        self.backup_in_background()
+        self.maintain_in_background()
+    
+    def on_resume(self):
+        # Android puede perder el contexto GL en pausa: repintar la textura de gráficas
+        try:
+            self.root.get_screen('home').trends_panel.redraw()
+        except Exception as e:
+            print(f"[ERROR] on_resume: {e}")
+        self.sync_in_background()
+        self.maintain_in_background()
+    
+    def on_pause(self):
+        # Guardar la cola de escritura antes de que Android suspenda la app
+        try:
+            self.db.flush_writes()
+        except Exception as e:
+            print(f"[ERROR] on_pause: {e}")
+        self.backup_in_background()
+        return True
+    
+    def on_stop(self):
+        try:
+            self.reports.close()
+            self.drain_background()
+            self.db.close()
+        except Exception as e:
+            print(f"[ERROR] on_stop: {e}")
 
 
 if __name__ == '__main__':
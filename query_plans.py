@@ -0,0 +1,222 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Revisión de planes de consulta: ¿SQLite usa los índices?
+
+Ejecuta los métodos de Database sobre una copia de la base, registra cada
+sentencia que emiten y revisa su EXPLAIN QUERY PLAN. Falla (código 1) y
+muestra el plan si alguna recorre completa una tabla grande sin estar en
+ALLOWED_SCANS.
+
+Uso: python3 query_plans.py [archivo.db] [--ranch RANCHO] [-v]
+"""
+
+import argparse
+import os
+import re
+import sqlite3
+import sys
+import tempfile
+
+from database import Database, DEFAULT_RANCH, ORPHAN_TABLES, connect, ranch_db_path
+
+# Tablas que crecen con el hato o con el tiempo
+LARGE_TABLES = ('cattle', 'events', 'vaccination_history', 'activity_log',
+                'weights', 'weight_gain', 'calendar', 'change_log')
+
+# Recorridos completos esperados: (método, tabla) -> motivo
+ALLOWED_SCANS = {
+    ('get_statistics', 'cattle'): 'totales de todo el hato',
+    ('get_all_cattle', 'cattle'): 'devuelve todo el hato',
+    ('search_cattle', 'cattle'): "LIKE '%texto%' busca dentro del arete y del nombre",
+    ('find_tags', 'cattle'): 'carga el índice de aretes en memoria',
+    ('refresh_calendar', 'cattle'): 'regenera el calendario de todo el hato',
+    ('refresh_calendar', 'calendar'): 'sin vacas indicadas se borra el calendario completo',
+    ('refresh_calendar', 'vaccination_history'): 'vacunas sin protocolo de todo el hato',
+    ('get_herd_trends', 'cattle'): 'tendencias de todo el hato',
+    ('get_inventory', 'cattle'): 'existencias por categoría de todo el hato',
+    ('update_snapshots', 'cattle'): 'reconstruye el estado diario de todo el hato',
+}
+ALLOWED_SCANS.update({('init_database', table): 'migración única: filas huérfanas' for table in ORPHAN_TABLES})
+
+_TABLE_RE = re.compile(r'\b(?:FROM|JOIN|UPDATE|INTO)\s+(\w+)(?:\s+(?:AS\s+)?(\w+))?', re.IGNORECASE)
+_KEYWORDS = {'on', 'where', 'join', 'left', 'inner', 'cross', 'group', 'order', 'limit', 'set',
+             'using', 'values', 'select', 'union', 'natural', 'as'}
+
+
+class TracedDatabase(Database):
+    """Database que anota cada sentencia junto con el método que la ejecutó"""
+
+    def __init__(self, db_path):
+        self.trace_path = db_path
+        self.current = 'init_database'
+        self.statements = []
+        super().__init__()
+        self.db_path = db_path
+
+    def get_connection(self):
+        conn = connect(self.trace_path)
+        conn.set_trace_callback(lambda sql, name=self: name.statements.append((name.current, sql)))
+        return conn
+
+
+def table_aliases(sql):
+    aliases = {}
+    for table, alias in _TABLE_RE.findall(sql):
+        aliases[table] = table
+        if alias and alias.lower() not in _KEYWORDS:
+            aliases[alias] = table
+    return aliases
+
+
+def full_scans(plan, sql):
+    """Tablas grandes recorridas completas ('SCAN t' o 'SCAN t USING [COVERING] INDEX')
+    
+    Un índice recorrido en el orden del ORDER BY con LIMIT (sin B-tree temporal)
+    se detiene tras LIMIT filas: no cuenta como recorrido completo.
+    """
+    aliases = table_aliases(sql)
+    bounded = re.search(r'\bLIMIT\b', sql, re.IGNORECASE) and not any('TEMP B-TREE' in d for d in plan)
+    scans = set()
+    for detail in plan:
+        words = detail.split()
+        if len(words) >= 2 and words[0] == 'SCAN':
+            table = aliases.get(words[1], words[1])
+            if table in LARGE_TABLES and not (bounded and 'INDEX' in words):
+                scans.add(table)
+    return scans
+
+
+def refresh_all(db):
+    conn = db.get_connection()
+    db.refresh_calendar(conn.cursor())
+    conn.commit()
+    conn.close()
+
+
+def exercise(db):
+    """Llama a los métodos de lectura y escritura con datos reales de la copia"""
+    conn = sqlite3.connect(db.db_path)
+    row = conn.execute('SELECT id, tag_number FROM cattle ORDER BY id LIMIT 1').fetchone()
+    conn.close()
+    cattle_id, tag = row if row else (None, None)
+
+    checks = [
+        ('get_statistics', lambda: db.get_statistics()),
+        ('get_agenda_items', lambda: db.get_agenda_items(50)),
+        ('get_activity_log', lambda: db.get_activity_log(10)),
+        ('search_cattle', lambda: db.search_cattle(tag or '1', 20)),
+        ('get_all_cattle', lambda: db.get_all_cattle()),
+        ('get_cattle_page', lambda: db.get_cattle_page(tag, 50)),
+        ('get_data_version', lambda: db.get_data_version()),
+        ('get_vaccines_due', lambda: db.get_vaccines_due('2100-01-01')),
+        ('get_calendar', lambda: db.get_calendar('2000-01-01', '2100-01-01')),
+        ('get_weight_trend', lambda: db.get_weight_trend('2000-01-01', '2100-01-01')),
+        ('get_herd_trends', lambda: db.get_herd_trends()),
+        ('find_tags', lambda: db.find_tags(tag or '1')),
+        ('get_inventory', lambda: db.get_inventory()),
+        ('iter_births', lambda: list(db.iter_births('2024-01-01', '2024-01-31'))),
+        ('iter_vaccines_due', lambda: list(db.iter_vaccines_due('2024-01-31'))),
+        ('update_snapshots', lambda: db.update_snapshots()),
+        ('get_herd_snapshots', lambda: db.get_herd_snapshots('2024-01-01', '2024-01-31')),
+        ('get_snapshot', lambda: db.get_snapshot('2024-03-01')),
+    ]
+    if cattle_id is not None:
+        checks += [
+            ('get_cattle_by_id', lambda: db.get_cattle_by_id(cattle_id)),
+            ('get_cattle_detail', lambda: db.get_cattle_detail(cattle_id)),
+            ('get_events', lambda: db.get_events(cattle_id)),
+            ('get_vaccinations', lambda: db.get_vaccinations(cattle_id)),
+            ('get_history_page', lambda: db.get_history_page(cattle_id, 'events', ('2100-01-01', 2 ** 62))),
+            ('get_timeline', lambda: db.get_timeline(cattle_id, ('2100-01-01', 'vaccination', 2 ** 62))),
+            ('get_vaccines_due', lambda: db.get_vaccines_due('2100-01-01', cattle_id)),
+            ('get_weight_gain', lambda: db.get_weight_gain(cattle_id)),
+            ('get_weight_trend', lambda: db.get_weight_trend('2000-01-01', '2100-01-01', cattle_id=cattle_id)),
+            ('apply_quick_command', lambda: db.apply_quick_command(f'vacuné {tag}')),
+            ('apply_action', lambda: db.apply_action(cattle_id, 'pregnancy')),
+            ('apply_batch', lambda: db.apply_batch('birth', [(cattle_id, None)])),
+            ('add_weight', lambda: db.add_weight(cattle_id, 450)),
+            ('import_weights', lambda: db.import_weights([{'tag_number': tag, 'date': '2024-01-01', 'kg': 400}])),
+            ('update_cattle', lambda: db.update_cattle(cattle_id, {'notes': 'plan'})),
+            ('flush_writes', lambda: db.flush_writes()),
+            ('delete_cattle', lambda: db.delete_cattle(cattle_id)),
+        ]
+    checks.append(('refresh_calendar', lambda: refresh_all(db)))
+    for name, call in checks:
+        db.current = name
+        call()
+    db.current = 'close'
+    db.close()
+
+
+def check_plans(db_path, statements, verbose=False):
+    conn = sqlite3.connect(db_path)
+    seen = set()
+    failures = []
+    checked = 0
+    for name, sql in statements:
+        # Sin comentarios ni saltos de línea solo para comparar y mostrar
+        text = ' '.join(re.sub(r'--[^\n]*', '', sql).split())
+        head = text.split(' ', 1)[0].upper()
+        if head == 'CREATE' and ' TEMP ' in f' {text.upper()} ':
+            conn.execute(sql)
+            continue
+        if head not in ('SELECT', 'WITH', 'UPDATE', 'DELETE', 'INSERT'):
+            continue
+        if head == 'INSERT' and ' SELECT ' not in text.upper():
+            continue
+        if (name, text) in seen:
+            continue
+        seen.add((name, text))
+        try:
+            plan = [row[3] for row in conn.execute(f'EXPLAIN QUERY PLAN {sql}')]
+        except sqlite3.Error as e:
+            print(f"[ERROR] {name}: {e}\n  {text[:200]}")
+            continue
+        checked += 1
+        bad = {t for t in full_scans(plan, text) if (name, t) not in ALLOWED_SCANS}
+        if verbose or bad:
+            print(f"{'✗' if bad else '·'} {name}: {text[:160]}")
+            for detail in plan:
+                print(f"    {detail}")
+        if bad:
+            failures.append((name, sorted(bad)))
+    conn.close()
+    return checked, failures
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Revisa EXPLAIN QUERY PLAN de las consultas de Database')
+    parser.add_argument('file', nargs='?', help='base a revisar (se usa una copia)')
+    parser.add_argument('--ranch', default=DEFAULT_RANCH)
+    parser.add_argument('-v', '--verbose', action='store_true', help='mostrar todos los planes')
+    args = parser.parse_args(argv)
+
+    source_path = args.file or ranch_db_path(args.ranch)
+    handle, copy_path = tempfile.mkstemp(suffix='.db')
+    os.close(handle)
+    try:
+        # Copia consistente: los métodos de escritura no tocan la base real
+        source = sqlite3.connect(source_path)
+        target = sqlite3.connect(copy_path)
+        source.backup(target)
+        source.close()
+        target.close()
+
+        db = TracedDatabase(copy_path)
+        exercise(db)
+        checked, failures = check_plans(copy_path, db.statements, args.verbose)
+    finally:
+        os.remove(copy_path)
+
+    if failures:
+        print(f"✗ {len(failures)} de {checked} sentencias recorren tablas grandes completas:")
+        for name, tables in failures:
+            print(f"  {name}: {', '.join(tables)}")
+        return 1
+    print(f"✓ {checked} sentencias revisadas, sin recorridos completos inesperados")
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
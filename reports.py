@@ -0,0 +1,357 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Informes mensuales por rancho (HTML o PDF) en segundo plano
+
+Cada informe se arma en un intérprete aparte (este módulo, sin Kivy) sobre una
+foto de solo lectura de la base (una sola transacción de lectura, también para
+los KPIs) y escribe las filas a medida que las lee. El archivo queda guardado con la versión de datos en el nombre: pedir el
+mismo informe sin cambios en la base no vuelve a calcularlo.
+
+Uso: python3 cattle.py report [--month 2025-03] [--format html|pdf] [-o archivo]
+"""
+
+import html
+import os
+import sqlite3
+import subprocess
+import sys
+import threading
+from concurrent.futures import Future, ThreadPoolExecutor
+from datetime import datetime, timedelta
+from urllib.parse import quote
+
+from database import NoWrites, ReadOnlyDatabase, calculate_age, get_storage_dir, ranch_label
+
+FORMATS = ('html', 'pdf')
+
+STAT_LABELS = {
+    'total_cattle': 'Total de vacas',
+    'pregnant': 'Preñadas',
+    'near_birth_60': 'Partos en 60 días',
+    'to_dry': 'Para secar',
+    'recent_births': 'Partos últimos 30 días',
+    'births_this_year': 'Partos del año',
+    'avg_weight': 'Peso promedio (kg)',
+    'avg_daily_gain': 'Ganancia diaria (kg/día)',
+    'birth_rate_annual': 'Partos por año (%)',
+}
+KPI_LABELS = (
+    ('calving_interval', 'Intervalo entre partos (días)'),
+    ('days_open', 'Días abiertos'),
+    ('age_first_calving', 'Edad al primer parto (días)'),
+)
+
+
+class _SnapshotConnection(sqlite3.Connection):
+    # Todas las consultas comparten la transacción de lectura: close() no la termina
+    def close(self):
+        pass
+
+
+class SnapshotDatabase(ReadOnlyDatabase):
+    """Solo lectura y fija en una foto: todo el informe ve los mismos datos"""
+
+    def __init__(self, db_path):
+        self.db_path = db_path
+        self._init_caches()
+        self.write_queue = NoWrites()
+        self.conn = sqlite3.connect(f'file:{quote(db_path)}?mode=ro', uri=True, factory=_SnapshotConnection)
+        # En WAL la foto queda fijada con la primera lectura después de BEGIN
+        self.conn.execute('BEGIN')
+        self.conn.execute('SELECT COUNT(*) FROM sqlite_master').fetchone()
+
+    def get_connection(self):
+        return self.conn
+
+    def close(self):
+        self.conn.rollback()
+        sqlite3.Connection.close(self.conn)
+
+
+def month_range(month):
+    """'YYYY-MM' -> (primer día, último día)"""
+    start = datetime.strptime(f'{month}-01', '%Y-%m-%d')
+    end = (start + timedelta(days=32)).replace(day=1) - timedelta(days=1)
+    return start.strftime('%Y-%m-%d'), end.strftime('%Y-%m-%d')
+
+
+def reproductive_kpis(db):
+    """Filas de KPIs reproductivos; vacío si falta numpy"""
+    try:
+        report = db.get_reproductive_report()
+    except RuntimeError as e:
+        print(f"[ERROR] reproductive_kpis: {e}")
+        return [], []
+    kpis = [(label, report[key]['count'], report[key].get('mean', ''), report[key].get('median', ''),
+             report[key].get('p25', ''), report[key].get('p75', ''))
+            for key, label in KPI_LABELS]
+    cohorts = [(year, total, pregnant, rate)
+               for year, (total, pregnant, rate) in sorted(report['pregnancy_rate_by_cohort'].items())]
+    return kpis, cohorts
+
+
+def report_sections(db, month):
+    """Secciones del informe: (título, [(columna, ancho)], filas); las filas grandes son iteradores"""
+    start, end = month_range(month)
+    stats = db.get_statistics()
+    yield 'Resumen', [('Indicador', 28), ('Valor', 12)], \
+        [(STAT_LABELS.get(key, key), value) for key, value in stats.items()]
+    yield 'Inventario por categoría', [('Categoría', 16), ('Vacas', 8), ('Preñadas', 9), ('Peso prom. kg', 14)], \
+        [(r['category'], r['total'], r['pregnant'], r['avg_weight'] or '') for r in db.get_inventory()]
+    yield f'Partos de {month}', [('Fecha', 11), ('Arete', 14), ('Nombre', 18), ('Categoría', 12)], \
+        ((r['event_date'], r['tag_number'], r['name'] or '', r['category'] or '')
+         for r in db.iter_births(start, end))
+    yield f'Vacunas pendientes al {end}', [('Fecha', 11), ('Arete', 14), ('Vacuna', 18), ('Categoría', 12)], \
+        ((r['next_vaccination_date'], r['tag_number'], r['vaccine_name'], r['category'] or '')
+         for r in db.iter_vaccines_due(end))
+    kpis, cohorts = reproductive_kpis(db)
+    if kpis:
+        yield 'Indicadores reproductivos', [('Indicador', 30), ('n', 7), ('Promedio', 9), ('Mediana', 8),
+                                            ('P25', 7), ('P75', 7)], kpis
+        yield 'Preñez por año de nacimiento', [('Año', 6), ('Vacas', 8), ('Preñadas', 9), ('%', 6)], cohorts
+    yield 'Hato completo', [('Arete', 12), ('Nombre', 16), ('Categoría', 10), ('Edad', 8), ('Peso', 7),
+                            ('Preñada', 8), ('Parto esperado', 14)], \
+        ((c['tag_number'], c['name'] or '', c['category'] or '', calculate_age(c['birth_date']),
+          c['weight'] or '', 'Sí' if c['is_pregnant'] else '', c['expected_birth_date'] or '')
+         for c in db.iter_cattle())
+
+
+class HtmlWriter:
+    """HTML escrito fila por fila (una tabla por sección)"""
+
+    def __init__(self, out):
+        self.out = out
+        self.in_table = False
+
+    def begin(self, title, subtitle):
+        self.out.write('<!DOCTYPE html>\n<html lang="es"><head><meta charset="utf-8">'
+                       f'<title>{html.escape(title)}</title><style>'
+                       'body{font-family:sans-serif;margin:2em}table{border-collapse:collapse;margin-bottom:2em}'
+                       'th,td{border:1px solid #ccc;padding:3px 8px;text-align:left}th{background:#eee}'
+                       f'</style></head><body>\n<h1>{html.escape(title)}</h1>\n<p>{html.escape(subtitle)}</p>\n')
+
+    def section(self, title, columns):
+        self._close_table()
+        header = ''.join(f'<th>{html.escape(name)}</th>' for name, width in columns)
+        self.out.write(f'<h2>{html.escape(title)}</h2>\n<table><tr>{header}</tr>\n')
+        self.in_table = True
+
+    def row(self, values):
+        self.out.write('<tr>' + ''.join(f'<td>{html.escape(str(v))}</td>' for v in values) + '</tr>\n')
+
+    def end(self):
+        self._close_table()
+        self.out.write('</body></html>\n')
+
+    def _close_table(self):
+        if self.in_table:
+            self.out.write('</table>\n')
+            self.in_table = False
+
+
+class PdfWriter:
+    """PDF de texto mínimo (Courier, A4): cada página se escribe al llenarse"""
+
+    WIDTH, HEIGHT, MARGIN = 595, 842, 40
+    FONT_SIZE, LEADING = 8, 11
+
+    def __init__(self, out):
+        self.out = out
+        self.pos = 0
+        self.offsets = {}
+        self.pages = []
+        self.lines = []
+        self.header = None
+        # 1 catálogo, 2 árbol de páginas (al final), 3 y 4 fuentes
+        self.next_id = 5
+        self.per_page = (self.HEIGHT - 2 * self.MARGIN) // self.LEADING
+        self._write(b'%PDF-1.4\n%\xe2\xe3\xcf\xd3\n')
+        self._object(b'<< /Type /Font /Subtype /Type1 /BaseFont /Courier /Encoding /WinAnsiEncoding >>', 3)
+        self._object(b'<< /Type /Font /Subtype /Type1 /BaseFont /Courier-Bold /Encoding /WinAnsiEncoding >>', 4)
+
+    def begin(self, title, subtitle):
+        self._line(title, bold=True)
+        self._line(subtitle)
+
+    def section(self, title, columns):
+        self.header = None
+        self._line('')
+        self._line(title, bold=True)
+        self.widths = [width for name, width in columns]
+        header = [self._cells([name for name, width in columns]), ' '.join('-' * width for width in self.widths)]
+        for text in header:
+            self._line(text)
+        self.header = header
+
+    def row(self, values):
+        self._line(self._cells(values))
+
+    def end(self):
+        if self.lines or not self.pages:
+            self._flush_page()
+        kids = ' '.join(f'{page} 0 R' for page in self.pages)
+        self._object(f'<< /Type /Pages /Kids [{kids}] /Count {len(self.pages)} >>'.encode(), 2)
+        self._object(b'<< /Type /Catalog /Pages 2 0 R >>', 1)
+        xref = self.pos
+        count = self.next_id
+        entries = ''.join(f'{self.offsets.get(n, 0):010d} 00000 n \n' for n in range(1, count))
+        self._write(f'xref\n0 {count}\n0000000000 65535 f \n{entries}'
+                    f'trailer\n<< /Size {count} /Root 1 0 R >>\nstartxref\n{xref}\n%%EOF\n'.encode())
+
+    def _cells(self, values):
+        return ' '.join(str(v)[:w].ljust(w) for v, w in zip(values, self.widths)).rstrip()
+
+    def _line(self, text, bold=False):
+        if len(self.lines) >= self.per_page:
+            self._flush_page()
+            # La tabla cortada repite su encabezado en la página nueva
+            for header in self.header or ():
+                self.lines.append(('F1', header))
+        self.lines.append(('F2' if bold else 'F1', text))
+
+    def _flush_page(self):
+        top = self.HEIGHT - self.MARGIN + self.LEADING
+        ops = [f'BT {self.LEADING} TL {self.MARGIN} {top} Td'.encode()]
+        for font, text in self.lines:
+            escaped = (text.encode('cp1252', 'replace')
+                       .replace(b'\\', b'\\\\').replace(b'(', b'\\(').replace(b')', b'\\)'))
+            ops.append(f'/{font} {self.FONT_SIZE} Tf'.encode() + b' (' + escaped + b") '")
+        ops.append(b'ET')
+        stream = b'\n'.join(ops)
+        contents = self._object(b'<< /Length %d >>\nstream\n' % len(stream) + stream + b'\nendstream')
+        page = self._object((f'<< /Type /Page /Parent 2 0 R /MediaBox [0 0 {self.WIDTH} {self.HEIGHT}] '
+                             f'/Resources << /Font << /F1 3 0 R /F2 4 0 R >> >> /Contents {contents} 0 R >>').encode())
+        self.pages.append(page)
+        self.lines = []
+
+    def _object(self, body, number=None):
+        if number is None:
+            number = self.next_id
+            self.next_id += 1
+        self.offsets[number] = self.pos
+        self._write(f'{number} 0 obj\n'.encode() + body + b'\nendobj\n')
+        return number
+
+    def _write(self, data):
+        self.out.write(data)
+        self.pos += len(data)
+
+
+def render(db, ranch, month, fmt, out):
+    writer = HtmlWriter(out) if fmt == 'html' else PdfWriter(out)
+    writer.begin(f'Informe mensual - {ranch_label(ranch)} - {month}',
+                 f"Generado {datetime.now().strftime('%Y-%m-%d %H:%M')}")
+    for title, columns, rows in report_sections(db, month):
+        writer.section(title, columns)
+        for row in rows:
+            writer.row(row)
+    writer.end()
+
+
+def report_dir():
+    return os.path.join(get_storage_dir(), 'reports')
+
+
+def report_path(out_dir, db_path, month, fmt, version):
+    base = os.path.splitext(os.path.basename(db_path))[0]
+    return os.path.join(out_dir, f'{base}_{month}_{version}.{fmt}')
+
+
+def build_report(db_path, ranch, month, fmt, out_dir):
+    """Trabajo del pool: genera el informe (si no existe ya para la versión) y devuelve su ruta"""
+    month_range(month)
+    db = SnapshotDatabase(db_path)
+    try:
+        path = report_path(out_dir, db_path, month, fmt, db.get_data_version())
+        if os.path.exists(path):
+            return path
+        os.makedirs(out_dir, exist_ok=True)
+        partial = f'{path}.{os.getpid()}.part'
+        try:
+            with open(partial, 'w', encoding='utf-8') if fmt == 'html' else open(partial, 'wb') as out:
+                render(db, ranch, month, fmt, out)
+            os.replace(partial, path)
+        except BaseException:
+            if os.path.exists(partial):
+                os.remove(partial)
+            raise
+    finally:
+        db.close()
+    # Las versiones anteriores del mismo informe ya no sirven
+    prefix = os.path.basename(report_path(out_dir, db_path, month, fmt, ''))[:-len(fmt) - 1]
+    for name in os.listdir(out_dir):
+        old = os.path.join(out_dir, name)
+        if name.startswith(prefix) and name.endswith(f'.{fmt}') and old != path:
+            os.remove(old)
+    return path
+
+
+def spawn_report(db_path, ranch, month, fmt, out_dir):
+    """build_report en un intérprete nuevo que solo importa este módulo
+
+    Ni fork de la app (con hilos de GL, Clock y cola de escritura) ni el
+    multiprocessing 'spawn', que vuelve a ejecutar main.py en cada hijo.
+    """
+    env = dict(os.environ, PYTHONIOENCODING='utf-8')
+    result = subprocess.run([sys.executable, os.path.abspath(__file__), db_path, ranch, month, fmt, out_dir],
+                            capture_output=True, encoding='utf-8', env=env)
+    if result.returncode != 0:
+        lines = result.stderr.strip().splitlines()
+        raise RuntimeError(lines[-1] if lines else f'informe terminó con código {result.returncode}')
+    # La ruta es la última línea: antes pueden salir avisos ([ERROR] sin numpy)
+    return result.stdout.strip().splitlines()[-1]
+
+
+def _report_job():
+    # Android (python-for-android) no tiene un intérprete que lanzar: en hilos del pool
+    if 'ANDROID_ARGUMENT' in os.environ or not sys.executable or not os.access(sys.executable, os.X_OK):
+        return build_report
+    return spawn_report
+
+
+class ReportService:
+    """Pool de informes con caché por versión de datos"""
+
+    def __init__(self, workers=2, out_dir=None):
+        self.out_dir = out_dir or report_dir()
+        # Los hilos solo esperan al intérprete de cada informe
+        self.executor = ThreadPoolExecutor(max_workers=workers)
+        self.job = _report_job()
+        self.lock = threading.Lock()
+        self.in_flight = {}
+
+    def request(self, db, month=None, fmt='html'):
+        """Future con la ruta del informe: resuelto al instante si ya existe para esta versión"""
+        if fmt not in FORMATS:
+            raise ValueError(fmt)
+        month = month or datetime.now().strftime('%Y-%m')
+        month_range(month)
+        db.flush_writes()
+        key = report_path(self.out_dir, db.db_path, month, fmt, db.get_data_version())
+        if os.path.exists(key):
+            future = Future()
+            future.set_result(key)
+            return future
+        with self.lock:
+            # El mismo informe pedido dos veces mientras se genera: un solo trabajo
+            future = self.in_flight.get(key)
+            created = future is None
+            if created:
+                future = self.executor.submit(self.job, db.db_path, db.ranch, month, fmt, self.out_dir)
+                self.in_flight[key] = future
+        if created:
+            future.add_done_callback(lambda f, key=key: self._done(key))
+        return future
+
+    def _done(self, key):
+        with self.lock:
+            self.in_flight.pop(key, None)
+
+    def close(self):
+        self.executor.shutdown(wait=False, cancel_futures=True)
+
+
+if __name__ == '__main__':
+    # Trabajo de spawn_report: reports.py DB RANCHO MES FORMATO CARPETA -> ruta del informe
+    print(build_report(*sys.argv[1:6]))
@@ -0,0 +1,226 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Lectura continua de aretes electrónicos (EID/RFID) en la manga
+
+Uso: python3 rfid.py ACCION [FUENTE] [--ranch R] [--vaccine V] [--window 10] [--batch 200]
+     python3 rfid.py ACCION --simulate 100000     (lector simulado, mide lecturas/s)
+
+ACCION: vaccination, weight, pregnancy, drying, birth
+FUENTE: captura, tubería (- = stdin) o puerto serie como archivo (/dev/ttyUSB0)
+Cada lectura es una línea "arete" o "arete,kg"; una captura puede
+anteponer los segundos de la lectura: "12.5<TAB>arete[,kg]".
+"""
+
+import argparse
+import random
+import re
+import sys
+import threading
+import time
+
+from database import Database, DEFAULT_RANCH
+
+ACTIONS = ('vaccination', 'weight', 'pregnancy', 'drying', 'birth')
+DEDUP_WINDOW = 10.0      # s: el lector repite el arete mientras la vaca está en rango
+BATCH_SIZE = 200
+FLUSH_INTERVAL = 1.0     # s: máximo que una lectura espera su transacción
+
+# STX/ETX y demás caracteres de control que agregan algunos lectores
+_CONTROL_RE = re.compile(r'[\x00-\x1f\x7f]')
+
+
+def parse_read(line):
+    """'[segundos\\t]arete[,kg]' -> (segundos o None, arete, kg o None); None si no es lectura"""
+    at = None
+    if '\t' in line:
+        stamp, line = line.split('\t', 1)
+        if stamp.strip():
+            try:
+                at = float(stamp)
+            except ValueError:
+                return None
+    line = _CONTROL_RE.sub('', line).strip()
+    tag, _, kg = line.partition(',')
+    # "982 000123456789" y "982000123456789" son el mismo EID
+    tag = tag.replace(' ', '')
+    if not tag:
+        return None
+    try:
+        kg = float(kg) if kg.strip() else None
+    except ValueError:
+        kg = None
+    return at, tag, kg
+
+
+class Deduplicator:
+    """Descarta lecturas repetidas del mismo arete dentro de la ventana (s)"""
+
+    def __init__(self, window=DEDUP_WINDOW):
+        self.window = window
+        self.last_seen = {}
+        self.next_prune = 0.0
+
+    def is_new(self, tag, at):
+        last = self.last_seen.get(tag)
+        self.last_seen[tag] = at
+        if at >= self.next_prune:
+            # Olvidar los aretes fuera de la ventana para no crecer sin límite
+            self.last_seen = {t: s for t, s in self.last_seen.items() if at - s < self.window}
+            self.next_prune = at + self.window
+        return last is None or at - last >= self.window
+
+    def shift(self, delta):
+        # Pasa lo recordado a otra base de tiempo (segundos + delta)
+        self.last_seen = {t: s + delta for t, s in self.last_seen.items()}
+        self.next_prune += delta
+
+
+class TagReadPipeline:
+    """Lecturas -> sin repetidas -> cattle.id (índice exacto) -> transacciones por lotes"""
+
+    def __init__(self, db, action, vaccine_name=None, window=DEDUP_WINDOW,
+                 batch_size=BATCH_SIZE, flush_interval=FLUSH_INTERVAL):
+        if action not in ACTIONS:
+            raise ValueError(action)
+        self.db = db
+        self.action = action
+        # None: cada vaca recibe la vacuna más atrasada de su protocolo (como la manga)
+        self.vaccine_name = vaccine_name
+        self.dedup = Deduplicator(window)
+        # Segundos de la captura - time.monotonic(); None hasta la primera marca
+        self.clock_offset = None
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self.pending = []
+        self.lock = threading.Lock()
+        self.stats = {'reads': 0, 'duplicates': 0, 'unknown': 0, 'applied': 0, 'batches': 0}
+        self.unknown_tags = set()
+
+    def feed(self, tag, kg=None, at=None):
+        """Procesa una lectura: 'duplicate', 'unknown' o 'queued'"""
+        at = self.read_time(at)
+        self.stats['reads'] += 1
+        if not self.dedup.is_new(tag, at):
+            self.stats['duplicates'] += 1
+            return 'duplicate'
+        cattle_id = self.db.find_tag(tag)
+        if cattle_id is None:
+            self.stats['unknown'] += 1
+            self.unknown_tags.add(tag)
+            return 'unknown'
+        with self.lock:
+            self.pending.append((cattle_id, kg))
+            full = len(self.pending) >= self.batch_size
+        if full:
+            self.flush()
+        return 'queued'
+
+    def read_time(self, at):
+        """Una sola base de tiempo para el deduplicador aunque el flujo mezcle líneas con y sin marca
+
+        Con marcas manda el reloj de la captura: una línea sin marca recibe la
+        última marca más el tiempo real transcurrido desde que llegó.
+        """
+        now = time.monotonic()
+        if at is None:
+            return now + (self.clock_offset or 0.0)
+        offset = at - now
+        if self.clock_offset is None:
+            # Lo leído antes sin marcas pasa a la base de la captura
+            self.dedup.shift(offset)
+        self.clock_offset = offset
+        return at
+
+    def flush(self):
+        with self.lock:
+            batch, self.pending = self.pending, []
+            if not batch:
+                return 0
+            try:
+                applied = self.db.apply_batch(self.action, batch, self.vaccine_name)
+            except Exception:
+                # Nada se guardó: las lecturas vuelven a la cola para el siguiente intento
+                self.pending = batch + self.pending
+                raise
+            self.stats['applied'] += applied
+            self.stats['batches'] += 1
+        return applied
+
+    def run(self, lines):
+        """Consume la fuente hasta agotarla; un hilo guarda lo pendiente cada flush_interval"""
+        done = threading.Event()
+
+        def flusher():
+            while not done.wait(self.flush_interval):
+                try:
+                    self.flush()
+                except Exception as e:
+                    print(f"[ERROR] rfid flush: {e}")
+
+        thread = threading.Thread(target=flusher, daemon=True)
+        thread.start()
+        start = time.perf_counter()
+        try:
+            for line in lines:
+                read = parse_read(line)
+                if read is not None:
+                    at, tag, kg = read
+                    self.feed(tag, kg, at)
+        finally:
+            done.set()
+            thread.join()
+            self.flush()
+        self.stats['seconds'] = time.perf_counter() - start
+        return self.stats
+
+
+def simulate_reads(tags, count, repeats=4, seed=1):
+    """Lector simulado: cada vaca que pasa se lee varias veces seguidas (con segundos)"""
+    rng = random.Random(seed)
+    at = 0.0
+    produced = 0
+    while produced < count:
+        tag = rng.choice(tags)
+        kg = round(rng.uniform(250, 650), 1)
+        for _ in range(min(rng.randint(1, repeats), count - produced)):
+            at += rng.uniform(0.05, 0.3)
+            produced += 1
+            yield f'{at:.2f}\t{tag},{kg}\n'
+        at += rng.uniform(1, 4)
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Lectura continua de aretes electrónicos')
+    parser.add_argument('action', choices=ACTIONS)
+    parser.add_argument('source', nargs='?', default='-', help='captura, tubería o puerto (- = stdin)')
+    parser.add_argument('--ranch', default=DEFAULT_RANCH)
+    parser.add_argument('--vaccine', help='vacuna aplicada (por defecto la más atrasada del protocolo de cada vaca)')
+    parser.add_argument('--window', type=float, default=DEDUP_WINDOW, help='segundos sin repetir un arete')
+    parser.add_argument('--batch', type=int, default=BATCH_SIZE, help='lecturas por transacción')
+    parser.add_argument('--simulate', type=int, metavar='N', help='N lecturas de un lector simulado')
+    args = parser.parse_args()
+
+    db = Database(args.ranch)
+    try:
+        pipeline = TagReadPipeline(db, args.action, args.vaccine, args.window, args.batch)
+        if args.simulate:
+            conn = db.get_connection()
+            tags = [row[0] for row in conn.execute('SELECT tag_number FROM cattle')]
+            conn.close()
+            source = simulate_reads(tags, args.simulate) if tags else iter(())
+        elif args.source == '-':
+            source = sys.stdin
+        else:
+            source = open(args.source, encoding='utf-8', errors='replace')
+        try:
+            stats = pipeline.run(source)
+        finally:
+            if source is not sys.stdin and hasattr(source, 'close'):
+                source.close()
+    finally:
+        db.close()
+    seconds = stats['seconds'] or 1e-9
+    print(f"✓ {stats['reads']} lecturas en {seconds:.2f} s: {stats['reads'] / seconds:.0f} lecturas/s")
+    print(f"  aplicadas {stats['applied']} en {stats['batches']} transacciones, "
+          f"repetidas {stats['duplicates']}, desconocidas {stats['unknown']}")
@@ -0,0 +1,118 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Medición del desplazamiento de la lista de ganado, sin pantalla
+
+Dibuja la misma lista de tres formas y la recorre de arriba abajo cuadro por
+cuadro (sin tope de fps), midiendo cuánto tarda cada cuadro:
+  cards    tarjetas de antes: ModernCard + 2 Label + ModernButton por vaca
+  rows     CattleRow planas, una por vaca, en un ScrollView
+  recycle  CattleRow en el RecycleView de la lista (solo las visibles)
+
+Sin DISPLAY usa el video 'offscreen' de SDL: los tiempos sirven para comparar
+los modos entre sí, no como fps de un teléfono.
+
+Uso: python3 scroll_bench.py [--rows 1000] [--frames 300] [--modes cards,rows,recycle]
+"""
+
+import argparse
+import os
+import statistics
+import time
+
+os.environ.setdefault('KIVY_NO_ARGS', '1')
+os.environ.setdefault('KIVY_NO_CONSOLELOG', '1')
+if not os.environ.get('DISPLAY'):
+    os.environ.setdefault('SDL_VIDEODRIVER', 'offscreen')
+
+from kivy.config import Config
+
+# Antes de crear la ventana: tamaño de teléfono y sin esperar al siguiente cuadro
+Config.set('graphics', 'maxfps', '0')
+Config.set('graphics', 'width', '480')
+Config.set('graphics', 'height', '800')
+
+from kivy.base import EventLoop
+from kivy.core.window import Window
+from kivy.uix.boxlayout import BoxLayout
+from kivy.uix.label import Label
+from kivy.uix.scrollview import ScrollView
+
+import main
+
+MODES = ('cards', 'rows', 'recycle')
+FRAME_BUDGET = 1 / 60
+
+
+def legacy_card(cattle):
+    # La tarjeta que usaba la lista antes de CattleRow
+    card = main.ModernCard(orientation='vertical', size_hint_y=None, height=140, padding=25, spacing=12)
+    card.add_widget(Label(text=f"[b]{cattle['tag_number']}[/b]", markup=True, font_size='38sp',
+                          color=main.PRIMARY, size_hint_y=None, height=50))
+    card.add_widget(Label(text=cattle['name'], font_size='24sp', color=main.TEXT, size_hint_y=None, height=35))
+    card.add_widget(main.ModernButton(text='Ver Detalles', size_hint_y=None, height=55, font_size='18sp'))
+    return card
+
+
+def flat_row(rv, index, cattle):
+    row = main.CattleRow(size_hint_y=None, height=main.ROW_HEIGHT)
+    row.refresh_view_attrs(rv, index, {'cattle': cattle})
+    return row
+
+
+def build(mode, herd):
+    if mode == 'recycle':
+        view = main.CattleRecycleView(lambda cattle_id: None, set())
+        view.data = [{'cattle': cattle} for cattle in herd]
+        return view
+    view = ScrollView()
+    container = BoxLayout(orientation='vertical', spacing=15, size_hint_y=None, padding=[10, 10])
+    container.bind(minimum_height=container.setter('height'))
+    rv = main.CattleRecycleView(lambda cattle_id: None, set())
+    for index, cattle in enumerate(herd):
+        container.add_widget(legacy_card(cattle) if mode == 'cards' else flat_row(rv, index, cattle))
+    view.add_widget(container)
+    return view
+
+
+def measure(mode, herd, frames):
+    start = time.perf_counter()
+    view = build(mode, herd)
+    Window.add_widget(view)
+    for _ in range(3):
+        EventLoop.idle()
+    built = time.perf_counter() - start
+    widgets = sum(1 for _ in view.walk()) - 1
+    times = []
+    for frame in range(frames):
+        view.scroll_y = 1 - frame / (frames - 1)
+        t = time.perf_counter()
+        EventLoop.idle()
+        times.append(time.perf_counter() - t)
+    Window.remove_widget(view)
+    times.sort()
+    return {
+        'built': built,
+        'widgets': widgets,
+        'median': statistics.median(times),
+        'slow': sum(1 for t in times if t > FRAME_BUDGET),
+        'p95': times[int(len(times) * 0.95) - 1],
+        'worst': times[-1],
+    }
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Tiempo por cuadro al desplazar la lista de ganado')
+    parser.add_argument('--rows', type=int, default=1000, help='vacas en la lista')
+    parser.add_argument('--frames', type=int, default=300, help='cuadros para recorrerla completa')
+    parser.add_argument('--modes', default=','.join(MODES), help='cards, rows y/o recycle')
+    args = parser.parse_args()
+
+    EventLoop.ensure_window()
+    herd = [{'id': i, 'tag_number': str(i), 'name': f'Vaca {i}'} for i in range(1, args.rows + 1)]
+    print(f"{args.rows} vacas, {args.frames} cuadros, ventana {Window.size[0]}x{Window.size[1]}")
+    for mode in args.modes.split(','):
+        result = measure(mode, herd, args.frames)
+        print(f"✓ {mode:8} armado {result['built'] * 1000:7.0f} ms  widgets {result['widgets']:6}  "
+              f"cuadro: mediana {result['median'] * 1000:5.1f} ms  p95 {result['p95'] * 1000:5.1f} ms  "
+              f"peor {result['worst'] * 1000:6.1f} ms  >16.7 ms: {result['slow']}")
@@ -0,0 +1,129 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Memoria de las lecturas en flujo: pico de RSS al recorrer toda la tabla events
+
+Arma un rancho temporal (HOME aparte) con N eventos y mide cada forma de leerlo
+en un proceso nuevo; el pico es el ru_maxrss de ese proceso:
+  base      abrir la base y nada más
+  fetchall  fetchall + un dict por fila (como antes de iter_events)
+  iter      recorrer db.iter_events() de principio a fin
+  export    python3 cattle.py export eventos.csv --table events
+
+Uso: python3 stream_memory.py [--events 1000000] [--cattle 5000] [--modes base,fetchall,iter,export]
+(Linux o macOS: usa os.wait4)
+"""
+
+import argparse
+import os
+import shutil
+import subprocess
+import sys
+import tempfile
+import time
+
+from database import Database
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+MODES = ('base', 'fetchall', 'iter', 'export')
+
+
+def build_herd(events, cattle):
+    """Rancho principal del HOME actual con 'cattle' vacas y 'events' eventos"""
+    db = Database()
+    conn = db.get_connection()
+    try:
+        # Sin change_log: la marca 'applying' apaga los disparadores de sincronización
+        conn.execute("INSERT OR REPLACE INTO sync_state (key, value) VALUES ('applying', '1')")
+        conn.execute('''
+            WITH RECURSIVE n(i) AS (SELECT 1 UNION ALL SELECT i + 1 FROM n WHERE i < ?)
+            INSERT INTO cattle (tag_number, name, category) SELECT i, 'Vaca ' || i, 'Vaca' FROM n
+        ''', (cattle,))
+        conn.execute('''
+            WITH RECURSIVE n(i) AS (SELECT 1 UNION ALL SELECT i + 1 FROM n WHERE i < ?)
+            INSERT INTO events (cattle_id, event_type, event_date, notes, uid)
+            SELECT (i % ?) + 1,
+                   CASE i % 4 WHEN 0 THEN 'birth' WHEN 1 THEN 'drying' WHEN 2 THEN 'pregnancy' ELSE 'note' END,
+                   date('2015-01-01', '+' || (i % 3650) || ' days'),
+                   'Registro de prueba ' || i,
+                   lower(hex(randomblob(16)))
+            FROM n
+        ''', (events, cattle))
+        conn.execute("DELETE FROM sync_state WHERE key = 'applying'")
+        conn.commit()
+    finally:
+        conn.close()
+        db.close()
+    return db.db_path
+
+
+def child(mode):
+    """Lectura medida (en el proceso hijo): imprime las filas leídas"""
+    db = Database()
+    try:
+        count = 0
+        if mode == 'fetchall':
+            conn = db.get_connection()
+            cursor = conn.execute('SELECT * FROM events ORDER BY id')
+            columns = [desc[0] for desc in cursor.description]
+            rows = [dict(zip(columns, row)) for row in cursor.fetchall()]
+            conn.close()
+            count = len(rows)
+        elif mode == 'iter':
+            for _ in db.iter_events():
+                count += 1
+    finally:
+        db.close()
+    print(count)
+
+
+def measure(mode, env, out_dir):
+    """(pico de RSS en MB, segundos, salida) de un proceso nuevo"""
+    if mode == 'export':
+        cmd = [sys.executable, os.path.join(HERE, 'cattle.py'), 'export',
+               os.path.join(out_dir, 'eventos.csv'), '--table', 'events']
+    else:
+        cmd = [sys.executable, os.path.abspath(__file__), '--child', mode]
+    start = time.perf_counter()
+    proc = subprocess.Popen(cmd, env=env, stdout=subprocess.PIPE, text=True)
+    output = proc.stdout.read().strip()
+    proc.stdout.close()
+    _, status, usage = os.wait4(proc.pid, 0)
+    proc.returncode = os.waitstatus_to_exitcode(status)
+    elapsed = time.perf_counter() - start
+    if proc.returncode != 0:
+        raise RuntimeError(f'{mode} terminó con código {proc.returncode}')
+    if mode == 'export':
+        with open(cmd[3], encoding='utf-8') as f:
+            output = str(sum(1 for _ in f) - 1)
+    # ru_maxrss: KB en Linux, bytes en macOS
+    peak = usage.ru_maxrss / (1024 * 1024 if sys.platform == 'darwin' else 1024)
+    return peak, elapsed, output
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Pico de memoria al leer la tabla events completa')
+    parser.add_argument('--events', type=int, default=1000000)
+    parser.add_argument('--cattle', type=int, default=5000)
+    parser.add_argument('--modes', default=','.join(MODES), help='base, fetchall, iter y/o export')
+    parser.add_argument('--child', choices=MODES, help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.child:
+        child(args.child)
+        sys.exit(0)
+
+    home = tempfile.mkdtemp(prefix='stream_memory_')
+    env = dict(os.environ, HOME=home)
+    try:
+        os.environ['HOME'] = home
+        start = time.perf_counter()
+        path = build_herd(args.events, args.cattle)
+        size = os.path.getsize(path) / 1024 / 1024
+        print(f"✓ {args.events} eventos de {args.cattle} vacas ({size:.0f} MB) en {time.perf_counter() - start:.1f} s")
+        for mode in args.modes.split(','):
+            peak, elapsed, output = measure(mode, env, home)
+            rows = f", {output} filas" if output.isdigit() and mode != 'base' else ''
+            print(f"  {mode:9} pico de RSS {peak:6.0f} MB en {elapsed:5.1f} s{rows}")
+    finally:
+        shutil.rmtree(home, ignore_errors=True)
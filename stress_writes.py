@@ -0,0 +1,200 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Prueba de carga: escrituras de la app mientras otros procesos usan la base
+
+Sobre una copia de la base, varios hilos hacen lo que hace la app (altas,
+cambios, pesajes, manga, eventos en cola, bajas) mientras otro proceso toma
+la escritura en transacciones largas (como un import de cron) y otro lee
+tablas completas (como una exportación). Al final revisa que no se perdió nada.
+
+Uso: python3 stress_writes.py [archivo.db] [--ranch RANCHO] [--seconds 10]
+     [--threads 4] [--hold 0.3] [--timeout S] [--retries N]
+"""
+
+import argparse
+import multiprocessing
+import os
+import random
+import sqlite3
+import sys
+import tempfile
+import threading
+import time
+
+import database
+from database import Database, DEFAULT_RANCH, connect, is_locked_error, ranch_db_path
+
+
+class CopyDatabase(Database):
+    """Database sobre un archivo dado (la copia), no sobre el del rancho"""
+
+    def __init__(self, db_path):
+        self.copy_path = db_path
+        super().__init__()
+        self.db_path = db_path
+
+    def get_connection(self):
+        return connect(self.copy_path)
+
+
+def compete(db_path, stop, hold, done):
+    """Otro proceso: transacciones de escritura que duran 'hold' segundos"""
+    rng = random.Random(os.getpid())
+    conn = sqlite3.connect(db_path, timeout=60, isolation_level=None)
+    while not stop.is_set():
+        conn.execute('BEGIN IMMEDIATE')
+        conn.execute("INSERT OR REPLACE INTO sync_state (key, value) VALUES ('stress', ?)", (str(time.time()),))
+        time.sleep(rng.uniform(0.5, 1.5) * hold)
+        conn.execute('COMMIT')
+        with done.get_lock():
+            done.value += 1
+        time.sleep(rng.uniform(0, hold))
+    conn.close()
+
+
+def scan(db_path, stop, done):
+    """Otro proceso: lecturas completas de events, como una exportación"""
+    conn = sqlite3.connect(db_path, timeout=60)
+    while not stop.is_set():
+        for _ in conn.execute('SELECT * FROM events'):
+            pass
+        with done.get_lock():
+            done.value += 1
+    conn.close()
+
+
+def work(db, number, until, results):
+    """Un hilo de la app: operaciones al azar sobre sus propias vacas"""
+    rng = random.Random(number)
+    own = []
+    stats = {'ops': 0, 'failures': {}, 'latencies': [], 'alive': set(), 'deleted': set(), 'events': {}}
+    serial = 0
+    while time.monotonic() < until:
+        op = rng.choice(('add', 'add', 'update', 'weight', 'batch', 'event', 'delete')) if own else 'add'
+        cattle_id = rng.choice(own) if own else None
+        start = time.perf_counter()
+        try:
+            if op == 'add':
+                serial += 1
+                new_id = db.add_cattle({'tag_number': f'stress-{number}-{serial}', 'category': 'Vaca'})
+                own.append(new_id)
+                stats['alive'].add(new_id)
+            elif op == 'update':
+                db.update_cattle(cattle_id, {'notes': f'prueba {serial}'})
+            elif op == 'weight':
+                db.add_weight(cattle_id, rng.randint(250, 650))
+            elif op == 'batch':
+                db.apply_batch('pregnancy', [(c, None) for c in rng.sample(own, min(len(own), 20))])
+            elif op == 'event':
+                db.add_event(cattle_id, 'revision', '2025-01-01', 'stress')
+                db.flush_writes()
+                stats['events'][cattle_id] = stats['events'].get(cattle_id, 0) + 1
+            elif op == 'delete':
+                db.delete_cattle(cattle_id)
+                own.remove(cattle_id)
+                stats['alive'].discard(cattle_id)
+                stats['deleted'].add(cattle_id)
+                stats['events'].pop(cattle_id, None)
+        except sqlite3.OperationalError as e:
+            kind = 'locked' if is_locked_error(e) else str(e)
+            stats['failures'][kind] = stats['failures'].get(kind, 0) + 1
+            continue
+        stats['latencies'].append(time.perf_counter() - start)
+        stats['ops'] += 1
+    results[number] = stats
+
+
+def verify(db_path, results):
+    """Lo confirmado por la app debe estar en la base: vacas vivas, borradas y eventos"""
+    conn = sqlite3.connect(db_path)
+    problems = []
+    for number, stats in results.items():
+        for cattle_id in stats['alive']:
+            if conn.execute('SELECT 1 FROM cattle WHERE id = ?', (cattle_id,)).fetchone() is None:
+                problems.append(f'hilo {number}: falta la vaca {cattle_id}')
+        for cattle_id in stats['deleted']:
+            if conn.execute('SELECT 1 FROM cattle WHERE id = ?', (cattle_id,)).fetchone() is not None:
+                problems.append(f'hilo {number}: la vaca borrada {cattle_id} sigue')
+        for cattle_id, count in stats['events'].items():
+            saved = conn.execute("SELECT COUNT(*) FROM events WHERE cattle_id = ? AND notes = 'stress'",
+                                 (cattle_id,)).fetchone()[0]
+            if saved != count:
+                problems.append(f'hilo {number}: vaca {cattle_id} con {saved} de {count} eventos')
+    conn.close()
+    return problems
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Escrituras concurrentes sobre una copia de la base')
+    parser.add_argument('file', nargs='?', help='base de partida (se usa una copia)')
+    parser.add_argument('--ranch', default=DEFAULT_RANCH)
+    parser.add_argument('--seconds', type=float, default=10)
+    parser.add_argument('--threads', type=int, default=4, help='hilos de la app')
+    parser.add_argument('--hold', type=float, default=0.3, help='segundos que el otro proceso retiene la escritura')
+    parser.add_argument('--timeout', type=float, default=database.BUSY_TIMEOUT, help='BUSY_TIMEOUT a probar')
+    parser.add_argument('--retries', type=int, default=database.WRITE_RETRIES, help='WRITE_RETRIES a probar')
+    args = parser.parse_args(argv)
+    database.BUSY_TIMEOUT = args.timeout
+    database.WRITE_RETRIES = args.retries
+
+    source_path = args.file or ranch_db_path(args.ranch)
+    handle, copy_path = tempfile.mkstemp(suffix='.db')
+    os.close(handle)
+    try:
+        if os.path.exists(source_path):
+            source = sqlite3.connect(source_path)
+            target = sqlite3.connect(copy_path)
+            source.backup(target)
+            source.close()
+            target.close()
+        db = CopyDatabase(copy_path)
+
+        stop = multiprocessing.Event()
+        commits = multiprocessing.Value('i', 0)
+        scans = multiprocessing.Value('i', 0)
+        others = [multiprocessing.Process(target=compete, args=(copy_path, stop, args.hold, commits)),
+                  multiprocessing.Process(target=scan, args=(copy_path, stop, scans))]
+        for process in others:
+            process.start()
+
+        results = {}
+        until = time.monotonic() + args.seconds
+        threads = [threading.Thread(target=work, args=(db, n, until, results)) for n in range(args.threads)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        stop.set()
+        for process in others:
+            process.join()
+        db.close()
+        problems = verify(copy_path, results)
+    finally:
+        for path in (copy_path, copy_path + '-wal', copy_path + '-shm'):
+            if os.path.exists(path):
+                os.remove(path)
+
+    ops = sum(stats['ops'] for stats in results.values())
+    failures = {}
+    for stats in results.values():
+        for kind, count in stats['failures'].items():
+            failures[kind] = failures.get(kind, 0) + count
+    latencies = sorted(t for stats in results.values() for t in stats['latencies'])
+    if latencies:
+        p50 = latencies[len(latencies) // 2] * 1000
+        p99 = latencies[int(len(latencies) * 0.99)] * 1000
+        print(f"✓ {ops} escrituras en {args.seconds:.0f} s ({args.threads} hilos): "
+              f"p50 {p50:.0f} ms, p99 {p99:.0f} ms, máx {latencies[-1] * 1000:.0f} ms")
+    print(f"  otro proceso: {commits.value} transacciones de ~{args.hold} s, {scans.value} lecturas completas")
+    if failures:
+        print(f"✗ fallidas: {', '.join(f'{kind} {count}' for kind, count in failures.items())}")
+    for problem in problems:
+        print(f"✗ {problem}")
+    if not problems and not failures:
+        print('✓ sin errores de candado y sin escrituras perdidas')
+    return 1 if problems or failures else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,235 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Sincronización incremental con un servidor local
+Envía y recibe solo los cambios desde el último cursor (change_log)
+"""
+
+import json
+import uuid
+import zlib
+from urllib.parse import urlencode
+from urllib.request import Request, urlopen
+
+from database import retry_locked
+
+# Orden de aplicación: primero las vacas, luego lo que depende de ellas
+TABLE_ORDER = ['cattle', 'events', 'vaccination_history', 'activity_log']
+ROW_KEYS = {
+    'cattle': 'tag_number',
+    'events': 'uid',
+    'vaccination_history': 'uid',
+    'activity_log': 'uid',
+}
+PAGE_SIZE = 500
+
+
+def pack(data):
+    return zlib.compress(json.dumps(data, separators=(',', ':')).encode('utf-8'))
+
+
+def unpack(blob):
+    return json.loads(zlib.decompress(blob).decode('utf-8'))
+
+
+class SyncClient:
+    def __init__(self, db, server_url, timeout=15):
+        # db: Database de la app (db_path, get_connection, refresh_calendar, bump_data_version,
+        # invalidate_caches)
+        self.db = db
+        self.server_url = server_url.rstrip('/')
+        self.timeout = timeout
+        self.device_id = self._state('device_id') or self._new_device_id()
+
+    def _state(self, key, cursor=None):
+        own = cursor is None
+        conn = self.db.get_connection() if own else None
+        cursor = cursor or conn.cursor()
+        cursor.execute('SELECT value FROM sync_state WHERE key = ?', (key,))
+        row = cursor.fetchone()
+        if own:
+            conn.close()
+        return row[0] if row else None
+
+    def _set_state(self, cursor, key, value):
+        cursor.execute('INSERT OR REPLACE INTO sync_state (key, value) VALUES (?, ?)', (key, str(value)))
+
+    def _new_device_id(self):
+        device_id = uuid.uuid4().hex
+        conn = self.db.get_connection()
+        self._set_state(conn.cursor(), 'device_id', device_id)
+        conn.commit()
+        conn.close()
+        return device_id
+
+    def _request(self, path, body=None, **params):
+        url = f"{self.server_url}{path}"
+        if params:
+            url += '?' + urlencode(params)
+        req = Request(url, data=body, headers={'Content-Type': 'application/octet-stream'})
+        with urlopen(req, timeout=self.timeout) as resp:
+            return unpack(resp.read())
+
+    # --- Envío -----------------------------------------------------------
+
+    def collect_changes(self):
+        """Cambios locales pendientes, uno por fila (el último estado gana)"""
+        conn = self.db.get_connection()
+        cursor = conn.cursor()
+        pushed = int(self._state('push_seq', cursor) or 0)
+        cursor.execute('''
+            SELECT table_name, row_key, MAX(seq), MAX(changed_at)
+            FROM change_log
+            WHERE seq > ?
+            GROUP BY table_name, row_key
+        ''', (pushed,))
+        latest = cursor.fetchall()
+        changes = []
+        last_seq = pushed
+        for table, key, seq, changed_at in latest:
+            last_seq = max(last_seq, seq)
+            row = self._read_row(cursor, table, key)
+            changes.append({
+                'table': table,
+                'key': key,
+                'op': 'upsert' if row is not None else 'delete',
+                'changed_at': changed_at,
+                'row': row,
+            })
+        conn.close()
+        return changes, last_seq
+
+    def _read_row(self, cursor, table, key):
+        if table == 'cattle':
+            cursor.execute(f'SELECT * FROM cattle WHERE {ROW_KEYS[table]} = ?', (key,))
+        else:
+            # cattle_id local -> arete, que es la clave común entre dispositivos
+            cursor.execute(f'''
+                SELECT t.*, c.tag_number AS cattle_tag
+                FROM {table} t LEFT JOIN cattle c ON c.id = t.cattle_id
+                WHERE t.{ROW_KEYS[table]} = ?
+            ''', (key,))
+        values = cursor.fetchone()
+        if values is None:
+            return None
+        row = dict(zip([desc[0] for desc in cursor.description], values))
+        row.pop('id', None)
+        row.pop('cattle_id', None)
+        return row
+
+    def push(self):
+        changes, last_seq = self.collect_changes()
+        if not changes:
+            return 0
+        for start in range(0, len(changes), PAGE_SIZE):
+            self._request('/push', pack({
+                'device': self.device_id,
+                'changes': changes[start:start + PAGE_SIZE],
+            }))
+        conn = self.db.get_connection()
+        cursor = conn.cursor()
+        self._set_state(cursor, 'push_seq', last_seq)
+        # Lo enviado ya no hace falta localmente
+        cursor.execute('DELETE FROM change_log WHERE seq <= ?', (last_seq,))
+        conn.commit()
+        conn.close()
+        return len(changes)
+
+    # --- Recepción -------------------------------------------------------
+
+    def pull(self):
+        applied = 0
+        while True:
+            cursor_value = int(self._state('pull_cursor') or 0)
+            page = self._request('/pull', since=cursor_value, device=self.device_id, limit=PAGE_SIZE)
+            applied += self.apply_changes(page['changes'], page['cursor'])
+            if not page.get('more'):
+                return applied
+
+    @retry_locked
+    def apply_changes(self, changes, new_cursor):
+        """Aplica cambios remotos en una transacción (último en escribir gana)"""
+        conn = self.db.get_connection()
+        cursor = conn.cursor()
+        applied = 0
+        touched = set()
+        try:
+            self._set_state(cursor, 'applying', 1)
+            pushed = int(self._state('push_seq', cursor) or 0)
+            changes = sorted(changes, key=lambda c: TABLE_ORDER.index(c['table']))
+            for change in changes:
+                table, key = change['table'], change['key']
+                # Conflicto: un cambio local pendiente más nuevo se conserva
+                cursor.execute('''
+                    SELECT MAX(changed_at) FROM change_log
+                    WHERE table_name = ? AND row_key = ? AND seq > ?
+                ''', (table, key, pushed))
+                local = cursor.fetchone()[0]
+                if local is not None and local > change['changed_at']:
+                    continue
+                cursor.execute('''
+                    DELETE FROM change_log WHERE table_name = ? AND row_key = ? AND seq > ?
+                ''', (table, key, pushed))
+                cattle_id = self._apply_row(cursor, table, key, change)
+                if cattle_id is not None:
+                    touched.add(cattle_id)
+                applied += 1
+            if touched:
+                self.db.refresh_calendar(cursor, touched)
+            if applied:
+                # Los triggers no registran lo recibido: la versión sube aquí
+                self.db.bump_data_version(cursor)
+            cursor.execute("DELETE FROM sync_state WHERE key = 'applying'")
+            self._set_state(cursor, 'pull_cursor', new_cursor)
+            conn.commit()
+        except Exception:
+            conn.rollback()
+            raise
+        finally:
+            conn.close()
+        if applied:
+            self.db.invalidate_caches()
+        return applied
+
+    def _apply_row(self, cursor, table, key, change):
+        key_col = ROW_KEYS[table]
+        if change['op'] == 'delete':
+            if table == 'cattle':
+                cursor.execute('SELECT id FROM cattle WHERE tag_number = ?', (key,))
+                found = cursor.fetchone()
+                cursor.execute('DELETE FROM cattle WHERE tag_number = ?', (key,))
+                return found[0] if found else None
+            cursor.execute(f'SELECT cattle_id FROM {table} WHERE {key_col} = ?', (key,))
+            found = cursor.fetchone()
+            cursor.execute(f'DELETE FROM {table} WHERE {key_col} = ?', (key,))
+            return found[0] if found and table == 'vaccination_history' else None
+
+        row = dict(change['row'])
+        if table != 'cattle':
+            cursor.execute('SELECT id FROM cattle WHERE tag_number = ?', (row.pop('cattle_tag', None),))
+            found = cursor.fetchone()
+            if found is None:
+                return None
+            row['cattle_id'] = found[0]
+        cursor.execute(f'PRAGMA table_info({table})')
+        known = {col[1] for col in cursor.fetchall()}
+        row = {k: v for k, v in row.items() if k in known}
+        row[key_col] = key
+        columns = list(row)
+        updates = ', '.join(f'{c} = excluded.{c}' for c in columns if c != key_col)
+        cursor.execute(f'''
+            INSERT INTO {table} ({', '.join(columns)})
+            VALUES ({', '.join('?' * len(columns))})
+            ON CONFLICT ({key_col}) DO UPDATE SET {updates}
+        ''', [row[c] for c in columns])
+        if table == 'cattle':
+            cursor.execute('SELECT id FROM cattle WHERE tag_number = ?', (key,))
+            return cursor.fetchone()[0]
+        return row['cattle_id'] if table == 'vaccination_history' else None
+
+    def sync(self):
+        """Primero recibir (resolviendo conflictos) y luego enviar"""
+        self.db.flush_writes()
+        pulled = self.pull()
+        pushed = self.push()
+        return {'pulled': pulled, 'pushed': pushed}
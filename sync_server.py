@@ -0,0 +1,135 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Servidor de sincronización local (para la oficina o para pruebas)
+Guarda el último estado de cada fila y entrega deltas por cursor
+
+Uso: python3 sync_server.py [puerto] [archivo.db]
+"""
+
+import json
+import os
+import sqlite3
+import sys
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, urlparse
+
+from sync import pack, unpack
+
+
+class SyncStore:
+    def __init__(self, db_path):
+        self.db_path = db_path
+        self.lock = threading.Lock()
+        conn = sqlite3.connect(db_path)
+        conn.execute('''
+            CREATE TABLE IF NOT EXISTS changes (
+                seq INTEGER PRIMARY KEY AUTOINCREMENT,
+                table_name TEXT NOT NULL,
+                row_key TEXT NOT NULL,
+                op TEXT NOT NULL,
+                changed_at TEXT NOT NULL,
+                device TEXT,
+                payload TEXT,
+                UNIQUE (table_name, row_key)
+            )
+        ''')
+        conn.commit()
+        conn.close()
+
+    def push(self, device, changes):
+        accepted = 0
+        with self.lock:
+            conn = sqlite3.connect(self.db_path)
+            cursor = conn.cursor()
+            for change in changes:
+                cursor.execute('''
+                    SELECT changed_at FROM changes WHERE table_name = ? AND row_key = ?
+                ''', (change['table'], change['key']))
+                current = cursor.fetchone()
+                # Último en escribir gana; el cambio aceptado recibe un seq nuevo
+                if current is not None and current[0] >= change['changed_at']:
+                    continue
+                cursor.execute('DELETE FROM changes WHERE table_name = ? AND row_key = ?',
+                               (change['table'], change['key']))
+                cursor.execute('''
+                    INSERT INTO changes (table_name, row_key, op, changed_at, device, payload)
+                    VALUES (?, ?, ?, ?, ?, ?)
+                ''', (change['table'], change['key'], change['op'], change['changed_at'],
+                      device, json.dumps(change['row'])))
+                accepted += 1
+            conn.commit()
+            conn.close()
+        return accepted
+
+    def pull(self, device, since, limit):
+        conn = sqlite3.connect(self.db_path)
+        cursor = conn.cursor()
+        cursor.execute('''
+            SELECT seq, table_name, row_key, op, changed_at, device, payload
+            FROM changes
+            WHERE seq > ?
+            ORDER BY seq
+            LIMIT ?
+        ''', (since, limit + 1))
+        rows = cursor.fetchall()
+        conn.close()
+        more = len(rows) > limit
+        rows = rows[:limit]
+        changes = [{
+            'table': table,
+            'key': key,
+            'op': op,
+            'changed_at': changed_at,
+            'row': json.loads(payload) if payload else None,
+        } for seq, table, key, op, changed_at, origin, payload in rows if origin != device]
+        # El cursor avanza también sobre los cambios propios que se omiten
+        cursor_value = rows[-1][0] if rows else since
+        return {'changes': changes, 'cursor': cursor_value, 'more': more}
+
+
+class SyncHandler(BaseHTTPRequestHandler):
+    store = None
+
+    def _reply(self, data, status=200):
+        body = pack(data)
+        self.send_response(status)
+        self.send_header('Content-Type', 'application/octet-stream')
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def do_POST(self):
+        if urlparse(self.path).path != '/push':
+            return self._reply({'error': 'not found'}, 404)
+        length = int(self.headers.get('Content-Length', 0))
+        data = unpack(self.rfile.read(length))
+        self._reply({'accepted': self.store.push(data['device'], data['changes'])})
+
+    def do_GET(self):
+        url = urlparse(self.path)
+        if url.path != '/pull':
+            return self._reply({'error': 'not found'}, 404)
+        query = parse_qs(url.query)
+        self._reply(self.store.pull(
+            query.get('device', [''])[0],
+            int(query.get('since', ['0'])[0]),
+            min(int(query.get('limit', ['500'])[0]), 5000),
+        ))
+
+    def log_message(self, format, *args):
+        pass
+
+
+def make_server(db_path, host='127.0.0.1', port=8765):
+    handler = type('Handler', (SyncHandler,), {'store': SyncStore(db_path)})
+    return ThreadingHTTPServer((host, port), handler)
+
+
+if __name__ == '__main__':
+    port = int(sys.argv[1]) if len(sys.argv) > 1 else 8765
+    path = sys.argv[2] if len(sys.argv) > 2 else os.path.expanduser('~/cattle_sync_server.db')
+    server = make_server(path, '0.0.0.0', port)
+    print(f"✓ Servidor de sincronización en el puerto {port} ({path})")
+    server.serve_forever()
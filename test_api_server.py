@@ -0,0 +1,77 @@
+# -*- coding: utf-8 -*-
+"""Pruebas de api_server.py: un fallo inesperado responde 500 sin cerrar la conexión
+
+Uso: python3 -m unittest test_api_server
+"""
+
+import asyncio
+import json
+import os
+import shutil
+import tempfile
+import unittest
+from contextlib import redirect_stdout
+from io import StringIO
+
+from api_server import ApiServer
+from database import Database, ReadOnlyDatabase
+
+
+class BrokenDatabase(ReadOnlyDatabase):
+    """Una ruta que falla con un error que no es de SQLite"""
+
+    def get_cattle_by_id(self, cattle_id):
+        raise RuntimeError('falla de prueba')
+
+
+class ErrorResponseTest(unittest.TestCase):
+    def setUp(self):
+        self.home = tempfile.mkdtemp()
+        self.old_home = os.environ.get('HOME')
+        os.environ['HOME'] = self.home
+        db = Database()
+        db.add_cattle({'tag_number': '7', 'category': 'Vaca'})
+        db.close()
+        self.api = ApiServer(BrokenDatabase(), workers=1)
+
+    def tearDown(self):
+        self.api.executor.shutdown()
+        if self.old_home is None:
+            os.environ.pop('HOME', None)
+        else:
+            os.environ['HOME'] = self.old_home
+        shutil.rmtree(self.home)
+
+    def test_unexpected_error_is_500_json(self):
+        with redirect_stdout(StringIO()) as out:
+            status, etag, body = self.api.respond('/cattle/1', None)
+        self.assertEqual(status, 500)
+        self.assertEqual(json.loads(body), {'error': 'internal'})
+        self.assertIn('[ERROR] api /cattle/1', out.getvalue())
+
+    def test_keep_alive_survives_error(self):
+        async def two_requests():
+            server = await asyncio.start_server(self.api.handle, '127.0.0.1', 0)
+            port = server.sockets[0].getsockname()[1]
+            reader, writer = await asyncio.open_connection('127.0.0.1', port)
+            replies = []
+            for target in ('/cattle/1', '/stats'):
+                writer.write(f'GET {target} HTTP/1.1\r\nHost: x\r\n\r\n'.encode('latin-1'))
+                head = (await reader.readuntil(b'\r\n\r\n')).decode('latin-1')
+                length = int(head.lower().split('content-length:')[1].split('\r\n')[0])
+                replies.append((head.split(' ')[1], await reader.readexactly(length)))
+            writer.close()
+            server.close()
+            await server.wait_closed()
+            return replies
+
+        with redirect_stdout(StringIO()):
+            replies = asyncio.run(two_requests())
+        self.assertEqual(replies[0], ('500', b'{"error": "internal"}'))
+        # La segunda petición va por la misma conexión
+        self.assertEqual(replies[1][0], '200')
+        self.assertEqual(json.loads(replies[1][1])['total_cattle'], 1)
+
+
+if __name__ == '__main__':
+    unittest.main()
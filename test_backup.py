@@ -0,0 +1,53 @@
+# -*- coding: utf-8 -*-
+"""Pruebas de backup.py: restaurar con la base abierta no deja cachés del archivo anterior
+
+Uso: python3 -m unittest test_backup
+"""
+
+import os
+import shutil
+import tempfile
+import unittest
+
+from backup import BackupManager
+from database import Database
+
+
+class RestoreTest(unittest.TestCase):
+    def setUp(self):
+        self.home = tempfile.mkdtemp()
+        self.old_home = os.environ.get('HOME')
+        os.environ['HOME'] = self.home
+        self.db = Database()
+        self.first = self.db.add_cattle({'tag_number': '1', 'category': 'Vaca', 'name': 'Antes'})
+        self.manager = BackupManager(self.db.db_path, compress=False)
+
+    def tearDown(self):
+        self.db.close()
+        if self.old_home is None:
+            os.environ.pop('HOME', None)
+        else:
+            os.environ['HOME'] = self.old_home
+        shutil.rmtree(self.home)
+
+    def test_restore_invalidates_open_database(self):
+        saved = self.manager.backup()
+        second = self.db.add_cattle({'tag_number': '2', 'category': 'Vaca'})
+        self.db.update_cattle(self.first, {'name': 'Después'})
+        self.assertEqual(self.db.find_tag('2'), second)
+        self.assertEqual(self.db.get_cattle_detail(self.first)['cattle']['name'], 'Después')
+        self.assertTrue(self.manager.restore(saved, self.db))
+        self.assertIsNone(self.db.find_tag('2'))
+        self.assertEqual(self.db.get_cattle_detail(self.first)['cattle']['name'], 'Antes')
+
+    def test_restore_saves_queue_first(self):
+        saved = self.manager.backup()
+        self.db.add_event(self.first, 'note', '2026-01-01', 'en cola')
+        self.assertEqual(self.db.write_queue.pending_count(), 1)
+        self.assertTrue(self.manager.restore(saved, self.db))
+        # La fila en cola se escribió antes de copiar: no queda pendiente sobre el archivo restaurado
+        self.assertEqual(self.db.write_queue.pending_count(), 0)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,83 @@
+# -*- coding: utf-8 -*-
+"""Pruebas de database.py: las clases de solo lectura usan las mismas cachés que Database
+
+Uso: python3 -m unittest test_database
+"""
+
+import os
+import shutil
+import tempfile
+import unittest
+
+from database import Database, ReadOnlyDatabase
+from reports import SnapshotDatabase
+
+try:
+    import numpy
+except ImportError:
+    numpy = None
+
+
+class ReadOnlyCacheTest(unittest.TestCase):
+    def setUp(self):
+        self.home = tempfile.mkdtemp()
+        self.old_home = os.environ.get('HOME')
+        os.environ['HOME'] = self.home
+        self.db = Database()
+        self.ids = [self.db.add_cattle({'tag_number': tag, 'category': 'Vaca', 'is_pregnant': 0})
+                    for tag in ('12', '120', '7')]
+        self.db.flush_writes()
+
+    def tearDown(self):
+        self.db.close()
+        if self.old_home is None:
+            os.environ.pop('HOME', None)
+        else:
+            os.environ['HOME'] = self.old_home
+        shutil.rmtree(self.home)
+
+    def check_reads(self, db):
+        self.assertEqual(db.find_tag('12'), self.ids[0])
+        self.assertIsNone(db.find_tag('99'))
+        self.assertEqual(sorted(db.find_tags('12')), sorted(self.ids[:2]))
+        detail = db.get_cattle_detail(self.ids[2])
+        self.assertEqual(detail['cattle']['tag_number'], '7')
+        # Segunda lectura: sale de la caché LRU
+        self.assertIs(db.get_cattle_detail(self.ids[2]), detail)
+
+    def test_read_only_database(self):
+        self.check_reads(ReadOnlyDatabase())
+
+    def test_snapshot_database(self):
+        db = SnapshotDatabase(self.db.db_path)
+        try:
+            self.check_reads(db)
+        finally:
+            db.close()
+
+    def test_find_tags_natural_order(self):
+        # Igual que la lista sin filtro (ORDER BY tag_sort): "7" antes que "12"
+        self.assertEqual(self.db.find_tags(''), [self.ids[2], self.ids[0], self.ids[1]])
+        cattle_id = self.db.add_cattle({'tag_number': '13', 'category': 'Vaca'})
+        self.assertEqual(self.db.find_tags('1'), [self.ids[0], cattle_id, self.ids[1]])
+        self.assertEqual(self.db.find_tags('1', limit=2), [self.ids[0], cattle_id])
+        self.assertEqual(self.db.find_tags(''), [c['id'] for c in self.db.get_all_cattle()])
+
+    @unittest.skipIf(numpy is None, 'requiere numpy')
+    def test_snapshot_kpis(self):
+        cattle_id = self.ids[0]
+        self.db.add_event(cattle_id, 'birth', '2024-01-10')
+        self.db.flush_writes()
+        db = SnapshotDatabase(self.db.db_path)
+        try:
+            # Un parto escrito después de la foto no entra en los KPIs del informe
+            self.db.add_event(cattle_id, 'birth', '2025-01-10')
+            self.db.flush_writes()
+            self.assertEqual(db.get_reproductive_report()['calving_interval']['count'], 0)
+        finally:
+            db.close()
+        self.assertEqual(self.db.get_reproductive_report()['calving_interval']['count'], 1)
+
+
+if __name__ == '__main__':
+    unittest.main()
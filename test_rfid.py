@@ -0,0 +1,74 @@
+# -*- coding: utf-8 -*-
+"""Pruebas de rfid.py: vacuna del protocolo y una sola base de tiempo al descartar repetidas
+
+Uso: python3 -m unittest test_rfid
+"""
+
+import os
+import shutil
+import tempfile
+import unittest
+from unittest import mock
+
+import rfid
+from database import Database, GENERAL_VACCINE
+
+
+class PipelineTest(unittest.TestCase):
+    def setUp(self):
+        self.home = tempfile.mkdtemp()
+        self.old_home = os.environ.get('HOME')
+        os.environ['HOME'] = self.home
+        self.db = Database()
+        self.cow = self.db.add_cattle({'tag_number': '982000123', 'category': 'Vaca', 'birth_date': '2020-01-01'})
+
+    def tearDown(self):
+        self.db.close()
+        if self.old_home is None:
+            os.environ.pop('HOME', None)
+        else:
+            os.environ['HOME'] = self.old_home
+        shutil.rmtree(self.home)
+
+    def vaccines(self):
+        conn = self.db.get_connection()
+        try:
+            return [row[0] for row in conn.execute(
+                'SELECT vaccine_name FROM vaccination_history WHERE cattle_id = ?', (self.cow,))]
+        finally:
+            conn.close()
+
+    def test_default_vaccine_follows_protocol(self):
+        conn = self.db.get_connection()
+        try:
+            due = self.db.due_vaccines(conn.cursor(), [self.cow])[self.cow]
+        finally:
+            conn.close()
+        pipeline = rfid.TagReadPipeline(self.db, 'vaccination')
+        pipeline.run(['1.0\t982000123\n'])
+        self.db.flush_writes()
+        # La más atrasada del protocolo, no 'Vacuna general'
+        self.assertNotEqual(due, GENERAL_VACCINE)
+        self.assertEqual(self.vaccines(), [due])
+
+    def test_named_vaccine(self):
+        pipeline = rfid.TagReadPipeline(self.db, 'vaccination', GENERAL_VACCINE)
+        pipeline.run(['982000123\n'])
+        self.db.flush_writes()
+        self.assertEqual(self.vaccines(), [GENERAL_VACCINE])
+
+    def test_mixed_timestamps_share_clock(self):
+        pipeline = rfid.TagReadPipeline(self.db, 'weight', window=10)
+        with mock.patch('rfid.time.monotonic', return_value=5000.0):
+            # Sin marca (reloj del sistema) y enseguida con marca de la captura: la misma pasada
+            self.assertEqual(pipeline.feed('982000123', 400), 'queued')
+            self.assertEqual(pipeline.feed('982000123', 400, at=3.0), 'duplicate')
+        with mock.patch('rfid.time.monotonic', return_value=5004.0):
+            # Sin marca 4 s después de la marca 3.0: sigue dentro de la ventana
+            self.assertEqual(pipeline.feed('982000123', 400), 'duplicate')
+        with mock.patch('rfid.time.monotonic', return_value=5020.0):
+            self.assertEqual(pipeline.feed('982000123', 400), 'queued')
+
+
+if __name__ == '__main__':
+    unittest.main()
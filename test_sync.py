@@ -0,0 +1,138 @@
+# -*- coding: utf-8 -*-
+"""Pruebas de sync.py: lo recibido de otro dispositivo cambia la versión de datos
+y la ida y vuelta contra sync_server.py (el último en escribir gana)
+
+Uso: python3 -m unittest test_sync
+"""
+
+import os
+import shutil
+import tempfile
+import threading
+import time
+import unittest
+
+import sync
+import sync_server
+from api_server import ApiServer
+from database import Database, ReadOnlyDatabase
+
+
+class FakeServer(sync.SyncClient):
+    """SyncClient que recibe una página fija en lugar de hablar con el servidor"""
+
+    def __init__(self, db, changes):
+        self.changes = changes
+        super().__init__(db, 'http://localhost')
+
+    def _request(self, path, body=None, **params):
+        return {'changes': self.changes, 'cursor': 1, 'more': False}
+
+
+class PullVersionTest(unittest.TestCase):
+    def setUp(self):
+        self.home = tempfile.mkdtemp()
+        self.old_home = os.environ.get('HOME')
+        os.environ['HOME'] = self.home
+        self.db = Database()
+        self.db.add_cattle({'tag_number': '123', 'category': 'Vaca', 'is_pregnant': 0})
+
+    def tearDown(self):
+        self.db.close()
+        if self.old_home is None:
+            os.environ.pop('HOME', None)
+        else:
+            os.environ['HOME'] = self.old_home
+        shutil.rmtree(self.home)
+
+    def test_pull_changes_etag(self):
+        api = ApiServer(ReadOnlyDatabase(), workers=1)
+        status, etag, body = api.respond('/stats', None)
+        self.assertEqual(status, 200)
+        self.assertIn(b'"pregnant": 0', body)
+        row = {'tag_number': '123', 'category': 'Vaca', 'is_pregnant': 1,
+               'pregnancy_date': '2026-01-01', 'expected_birth_date': '2026-10-08'}
+        change = {'table': 'cattle', 'key': '123', 'op': 'upsert',
+                  'changed_at': '2999-01-01 00:00:00.000', 'row': row}
+        self.assertEqual(FakeServer(self.db, [change]).pull(), 1)
+        status, new_etag, body = api.respond('/stats', etag)
+        self.assertEqual(status, 200)
+        self.assertNotEqual(new_etag, etag)
+        self.assertIn(b'"pregnant": 1', body)
+        api.executor.shutdown()
+
+    def test_empty_pull_keeps_version(self):
+        version = self.db.get_data_version()
+        self.assertEqual(FakeServer(self.db, []).pull(), 0)
+        self.assertEqual(self.db.get_data_version(), version)
+
+
+class RoundTripTest(unittest.TestCase):
+    """Dos ranchos del mismo HOME hacen de campo y oficina contra un sync_server en un hilo"""
+
+    def setUp(self):
+        self.home = tempfile.mkdtemp()
+        self.old_home = os.environ.get('HOME')
+        os.environ['HOME'] = self.home
+        self.server = sync_server.make_server(os.path.join(self.home, 'servidor.db'), port=0)
+        threading.Thread(target=self.server.serve_forever, daemon=True).start()
+        url = f"http://127.0.0.1:{self.server.server_address[1]}"
+        self.field = Database('campo')
+        self.office = Database('oficina')
+        self.field_sync = sync.SyncClient(self.field, url)
+        self.office_sync = sync.SyncClient(self.office, url)
+
+    def tearDown(self):
+        self.server.shutdown()
+        self.server.server_close()
+        self.field.close()
+        self.office.close()
+        if self.old_home is None:
+            os.environ.pop('HOME', None)
+        else:
+            os.environ['HOME'] = self.old_home
+        shutil.rmtree(self.home)
+
+    def logged(self, db):
+        conn = db.get_connection()
+        try:
+            return conn.execute('SELECT COUNT(*) FROM change_log').fetchone()[0]
+        finally:
+            conn.close()
+
+    def name(self, db, tag):
+        return db.get_cattle_detail(db.find_tag(tag))['cattle']['name']
+
+    def test_push_pull_and_conflict(self):
+        cow = self.field.add_cattle({'tag_number': '500', 'category': 'Vaca', 'name': 'Campo'})
+        self.assertEqual(self.field_sync.sync(), {'pulled': 0, 'pushed': 1})
+        self.assertEqual(self.logged(self.field), 0)
+
+        self.assertEqual(self.office_sync.sync(), {'pulled': 1, 'pushed': 0})
+        self.assertEqual(self.name(self.office, '500'), 'Campo')
+        # Lo aplicado desde el servidor no vuelve a change_log (marca 'applying')
+        self.assertEqual(self.logged(self.office), 0)
+        self.assertEqual(self.office_sync.sync(), {'pulled': 0, 'pushed': 0})
+
+        # Conflicto: los dos editan la misma vaca; la oficina escribe después
+        self.field.update_cattle(cow, {'name': 'Lucera'})
+        time.sleep(0.01)
+        self.office.update_cattle(self.office.find_tag('500'), {'name': 'Estrella'})
+        self.assertEqual(self.field_sync.sync(), {'pulled': 0, 'pushed': 1})
+        # La oficina recibe el cambio más viejo, conserva el suyo y lo envía
+        self.assertEqual(self.office_sync.sync(), {'pulled': 0, 'pushed': 1})
+        self.assertEqual(self.name(self.office, '500'), 'Estrella')
+        self.assertEqual(self.field_sync.sync(), {'pulled': 1, 'pushed': 0})
+        self.assertEqual(self.name(self.field, '500'), 'Estrella')
+        self.assertEqual(self.logged(self.field), 0)
+
+        # El servidor también descarta un envío más viejo que lo que ya tiene
+        stale = {'table': 'cattle', 'key': '500', 'op': 'upsert',
+                 'changed_at': '2000-01-01 00:00:00.000', 'row': {'tag_number': '500', 'name': 'Vieja'}}
+        self.assertEqual(self.server.RequestHandlerClass.store.push('otro', [stale]), 0)
+        self.assertEqual(self.office_sync.sync(), {'pulled': 0, 'pushed': 0})
+        self.assertEqual(self.name(self.office, '500'), 'Estrella')
+
+
+if __name__ == '__main__':
+    unittest.main()